@@ -0,0 +1,496 @@
+"""
+圖片匹配效能基準測試
+以合成的桌面截圖（已知模板位置）量測辨識速度與準確度
+
+四組測試：
+- pyramid：比較原解析度匹配與金字塔粗到細匹配（只需 OpenCV）
+- suite：透過記憶體中的截圖後端（取代 ImageGrab）量測 CoreRecorder 的辨識 API
+    find_image_on_screen / _match_template_on_screen / find_images_in_snapshot / find_image_by_features
+    各策略回報 p50 / p90 / p99 延遲、每秒次數與命中準確度，以及截圖緩衝區配置次數
+    （CoreRecorder 需要 Windows 相依套件，無法匯入時略過並說明原因）
+- capture：比較每次截圖新配置陣列與重複使用緩衝區的記憶體配置量（tracemalloc）
+- startup：載入 200 張模板的時間（無磁碟快取 / 第一次寫入快取 / 從快取以 mmap 載入）
+
+使用方式:
+    python benchmark_image_matching.py
+    python benchmark_image_matching.py --rounds 20 --downscale 8
+    python benchmark_image_matching.py --mode suite --json baseline.json
+    python benchmark_image_matching.py --mode suite --baseline baseline.json
+    python benchmark_image_matching.py --mode capture
+    python benchmark_image_matching.py --mode startup
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+# 加入專案路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'main'))
+
+from image_matcher import PyramidMatcher, match_at_scale, scale_template, DEFAULT_SCALES
+from screen_capture import ArrayBackend, ScreenCapturer
+from template_bank import TemplateBank
+from template_disk_cache import TemplateDiskCache, cache_directory
+
+
+RESOLUTIONS = [(1920, 1080), (2560, 1440)]
+TEMPLATE_SIZES = [(32, 32), (64, 48), (120, 40)]
+
+
+def make_desktop(width, height, seed=0):
+    """產生類似桌面的合成截圖（漸層背景 + 視窗 + 文字 + 圖示），回傳 BGR"""
+    rng = np.random.default_rng(seed)
+    # 漸層背景
+    xs = np.linspace(0, 1, width, dtype=np.float32)
+    ys = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    base = (60 + 80 * xs[None, :] + 40 * ys).astype(np.uint8)
+    screen = np.dstack([base, (base * 0.8).astype(np.uint8), (base * 0.6).astype(np.uint8)]).copy()
+
+    # 視窗（含標題列）
+    for _ in range(12):
+        w, h = int(rng.integers(200, width // 2)), int(rng.integers(150, height // 2))
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        color = tuple(int(c) for c in rng.integers(180, 255, 3))
+        cv2.rectangle(screen, (x, y), (x + w, y + h), color, -1)
+        cv2.rectangle(screen, (x, y), (x + w, y + 24), tuple(int(c) for c in rng.integers(30, 120, 3)), -1)
+        cv2.rectangle(screen, (x, y), (x + w, y + h), (40, 40, 40), 1)
+
+    # 文字
+    for _ in range(150):
+        text = "".join(chr(int(c)) for c in rng.integers(65, 90, int(rng.integers(3, 12))))
+        org = (int(rng.integers(0, width - 100)), int(rng.integers(20, height)))
+        cv2.putText(screen, text, org, cv2.FONT_HERSHEY_SIMPLEX, float(rng.uniform(0.4, 0.8)),
+                    tuple(int(c) for c in rng.integers(0, 100, 3)), 1, cv2.LINE_AA)
+
+    # 圖示（隨機色塊 + 圓形）
+    for _ in range(60):
+        s = int(rng.integers(16, 48))
+        x, y = int(rng.integers(0, width - s)), int(rng.integers(0, height - s))
+        cv2.rectangle(screen, (x, y), (x + s, y + s), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        cv2.circle(screen, (x + s // 2, y + s // 2), s // 3, tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    return screen
+
+
+def pick_template(screen_gray, size, rng):
+    """從截圖中挑一塊有紋理且唯一的區域作為模板，回傳 (template, 中心點)"""
+    height, width = screen_gray.shape
+    tw, th = size
+    for _ in range(200):
+        x, y = int(rng.integers(0, width - tw)), int(rng.integers(0, height - th))
+        patch = screen_gray[y:y + th, x:x + tw]
+        if patch.std() < 25:
+            continue
+        # 排除在畫面上重複出現的圖案（例如同一條標題列的不同位置）
+        result = cv2.matchTemplate(screen_gray, patch, cv2.TM_CCOEFF_NORMED)
+        result[max(0, y - th // 2):y + th // 2 + 1, max(0, x - tw // 2):x + tw // 2 + 1] = -1.0
+        if result.max() < 0.9:
+            break
+    return patch.copy(), (x + tw // 2, y + th // 2)
+
+
+def full_resolution_match(screen, template, scales):
+    """目前的路徑：每個尺度都在原解析度全圖上 matchTemplate"""
+    best = None
+    for scale in scales:
+        scaled, _ = scale_template(template, None, scale)
+        th, tw = scaled.shape[:2]
+        if tw > screen.shape[1] or th > screen.shape[0]:
+            continue
+        score, (x, y) = match_at_scale(screen, scaled)
+        if best is None or score > best[2]:
+            best = (x + tw // 2, y + th // 2, score)
+    return best
+
+
+def timed(func, rounds):
+    """執行 rounds 次並回傳 (結果, 中位數毫秒)"""
+    durations = []
+    result = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return result, float(np.median(durations))
+
+
+def run_pyramid_comparison(rounds, downscale, tolerance):
+    matcher = PyramidMatcher(downscale=downscale, top_k=5)
+    rng = np.random.default_rng(42)
+    all_pass = True
+
+    print(f"{'解析度':<12}{'模板':<10}{'尺度':<8}{'原解析度(ms)':>14}{'金字塔(ms)':>12}{'加速':>8}{'中心誤差':>10}")
+    print("-" * 76)
+    for width, height in RESOLUTIONS:
+        screen_gray = cv2.cvtColor(make_desktop(width, height, seed=width), cv2.COLOR_BGR2GRAY)
+        for size in TEMPLATE_SIZES:
+            template, expected = pick_template(screen_gray, size, rng)
+            for label, scales in (("1.0", [1.0]), ("9x", DEFAULT_SCALES)):
+                base, base_ms = timed(lambda: full_resolution_match(screen_gray, template, scales), rounds)
+                hit, pyr_ms = timed(lambda: matcher.match(screen_gray, template, scales=scales), rounds)
+
+                if hit is None:
+                    error = float('inf')
+                else:
+                    error = max(abs(hit[0] - base[0]), abs(hit[1] - base[1]))
+                ok = error <= tolerance and max(abs(base[0] - expected[0]), abs(base[1] - expected[1])) <= tolerance
+                all_pass &= ok
+                print(f"{f'{width}x{height}':<12}{f'{size[0]}x{size[1]}':<10}{label:<8}"
+                      f"{base_ms:>14.1f}{pyr_ms:>12.1f}{base_ms / max(pyr_ms, 1e-6):>7.1f}x"
+                      f"{error:>9}{'' if ok else ' ❌'}")
+
+    print("-" * 76)
+    print(f"結果: {'全部在容許誤差內 ✅' if all_pass else '有超出容許誤差的結果 ❌'}（容許 {tolerance}px）")
+    return all_pass
+
+
+# ==================== 辨識 API 基準測試 ====================
+
+SUITE_RESOLUTIONS = [(1280, 720), (1920, 1080)]
+
+
+def make_icon(width, height, seed):
+    """產生有紋理的合成圖示（色塊 + 圓形 + 文字），回傳 BGR"""
+    rng = np.random.default_rng(seed)
+    icon = np.zeros((height, width, 3), dtype=np.uint8)
+    icon[:] = tuple(int(c) for c in rng.integers(0, 255, 3))
+    for _ in range(6):
+        x1, y1 = int(rng.integers(0, width - 4)), int(rng.integers(0, height - 4))
+        x2, y2 = int(rng.integers(x1 + 2, width)), int(rng.integers(y1 + 2, height))
+        cv2.rectangle(icon, (x1, y1), (x2, y2), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+    cv2.circle(icon, (width // 2, height // 2), min(width, height) // 3,
+               tuple(int(c) for c in rng.integers(0, 255, 3)), 2)
+    text = "".join(chr(int(c)) for c in rng.integers(65, 90, 3))
+    cv2.putText(icon, text, (2, height - 4), cv2.FONT_HERSHEY_SIMPLEX, height / 60.0,
+                tuple(int(c) for c in rng.integers(0, 255, 3)), 1, cv2.LINE_AA)
+    return icon
+
+
+def build_scene(width, height, seed):
+    """產生含已知模板位置的合成畫面
+
+    Returns:
+        (screen_bgr, templates)
+        templates: {name: (模板圖片 BGR/BGRA, 預期中心點 或 None, 說明)}
+    """
+    rng = np.random.default_rng(seed)
+    screen = make_desktop(width, height, seed=seed)
+    templates = {}
+    boxes = []
+
+    def place(image, alpha=None):
+        """貼到不與其他模板重疊的隨機位置，回傳中心點"""
+        h, w = image.shape[:2]
+        for _ in range(100):
+            x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+            if all(x + w <= bx or bx + bw <= x or y + h <= by or by + bh <= y for bx, by, bw, bh in boxes):
+                break
+        boxes.append((x, y, w, h))
+        target = screen[y:y + h, x:x + w]
+        if alpha is None:
+            target[:] = image
+        else:
+            target[alpha > 0] = image[alpha > 0]
+        return (x + w // 2, y + h // 2)
+
+    # 原尺寸貼上
+    for i, (w, h) in enumerate([(48, 48), (96, 32)]):
+        icon = make_icon(w, h, seed * 10 + i)
+        templates[f"plain{i}"] = (icon, place(icon), "原尺寸")
+
+    # 放大 1.1 倍貼上（需要多尺度）
+    icon = make_icon(80, 60, seed * 10 + 5)
+    scaled = cv2.resize(icon, None, fx=1.1, fy=1.1, interpolation=cv2.INTER_CUBIC)
+    templates["scaled"] = (icon, place(scaled), "縮放1.1")
+
+    # 較大的模板放大 1.15 倍（特徵點匹配需要足夠大的模板才有特徵點）
+    icon = make_icon(200, 140, seed * 10 + 6)
+    scaled = cv2.resize(icon, None, fx=1.15, fy=1.15, interpolation=cv2.INTER_CUBIC)
+    templates["large"] = (icon, place(scaled), "大圖縮放1.15")
+
+    # 透明遮罩（只有圓形區域不透明，背景隨位置變化）
+    icon = make_icon(64, 64, seed * 10 + 7)
+    alpha = np.zeros((64, 64), dtype=np.uint8)
+    cv2.circle(alpha, (32, 32), 28, 255, -1)
+    templates["masked"] = (np.dstack([icon, alpha]), place(icon, alpha), "透明遮罩")
+
+    # 不在畫面上的模板（預期找不到）
+    templates["absent"] = (make_icon(48, 48, seed * 10 + 9), None, "不存在")
+    return screen, templates
+
+
+class LatencyStats:
+    """收集單一案例的延遲與命中結果"""
+
+    def __init__(self):
+        self.durations = []
+        self.correct = 0
+        self.total = 0
+
+    def add(self, duration_ms, correct, total=1):
+        self.durations.append(duration_ms)
+        self.total += total
+        self.correct += int(correct)
+
+    def summary(self):
+        values = np.array(self.durations)
+        return {
+            'p50': float(np.percentile(values, 50)),
+            'p90': float(np.percentile(values, 90)),
+            'p99': float(np.percentile(values, 99)),
+            'per_sec': float(1000.0 / max(values.mean(), 1e-6)),
+            'accuracy': self.correct / self.total if self.total else 0.0,
+            'samples': self.total,
+        }
+
+
+def _hit_ok(pos, expected, tolerance):
+    """結果是否正確：預期存在時中心點在容許誤差內，預期不存在時必須回傳 None"""
+    if expected is None:
+        return pos is None
+    return pos is not None and max(abs(pos[0] - expected[0]), abs(pos[1] - expected[1])) <= tolerance
+
+
+def load_core_recorder():
+    """匯入 CoreRecorder，失敗時回傳 (None, 原因)"""
+    try:
+        from recorder import CoreRecorder
+        return CoreRecorder, None
+    except Exception as e:  # Windows 專用模組（keyboard、win32api…）不存在等
+        return None, e
+
+
+def run_suite(rounds, tolerance, recorder_class=None):
+    """透過注入的截圖來源量測 CoreRecorder 的辨識 API
+
+    Args:
+        rounds: 每個案例重複次數
+        tolerance: 中心點容許誤差（像素）
+        recorder_class: CoreRecorder 類別，None = 自動匯入
+
+    Returns:
+        {案例名稱: summary}，無法執行時回傳 None
+    """
+    if recorder_class is None:
+        recorder_class, error = load_core_recorder()
+        if recorder_class is None:
+            print(f"略過辨識 API 基準測試：無法匯入 CoreRecorder（{error}）")
+            return None
+
+    from PIL import Image
+
+    stats = {}
+    pruned = {}  # 候選區域篩選省略的搜尋面積比例 {解析度: ratio}
+    capture_stats = {}  # 截圖緩衝區統計 {解析度: stats}
+
+    def record(case, duration_ms, correct, total=1):
+        stats.setdefault(case, LatencyStats()).add(duration_ms, correct, total)
+
+    def measure(func):
+        start = time.perf_counter()
+        result = func()
+        return result, (time.perf_counter() - start) * 1000
+
+    for width, height in SUITE_RESOLUTIONS:
+        screen_bgr, templates = build_scene(width, height, seed=width)
+        screen_rgb = cv2.cvtColor(screen_bgr, cv2.COLOR_BGR2RGB)
+        screen_gray = cv2.cvtColor(screen_bgr, cv2.COLOR_BGR2GRAY)
+
+        def screen_source(bbox):
+            if bbox is None:
+                return Image.fromarray(screen_rgb)
+            x1, y1, x2, y2 = bbox
+            return Image.fromarray(np.ascontiguousarray(screen_rgb[y1:y2, x1:x2]))
+
+        with tempfile.TemporaryDirectory() as images_dir:
+            for name, (image, _, _) in templates.items():
+                cv2.imwrite(os.path.join(images_dir, f"{name}.png"), image)
+
+            recorder = recorder_class(logger=lambda msg: None)
+            recorder.set_images_directory(images_dir)
+            recorder.set_capture_backend(ArrayBackend(screen_rgb))
+            res = f"{width}x{height}"
+
+            # find_image_on_screen：各策略（關閉位置記憶 = 每次完整搜尋）
+            for strategy in ("fast", "pyramid", "standard", "fast+roi"):
+                recorder.set_roi_tracking(strategy.endswith("+roi"))
+                for name, (_, expected, label) in templates.items():
+                    for _ in range(rounds):
+                        pos, ms = measure(lambda: recorder.find_image_on_screen(
+                            name, threshold=0.85, strategy=strategy.split("+")[0]))
+                        record(f"find_image_on_screen/{strategy}/{res}", ms, _hit_ok(pos, expected, tolerance))
+            recorder.set_roi_tracking(True)
+            capture_stats[res] = recorder.get_capture_stats()
+
+            # _match_template_on_screen：直接對灰階截圖匹配（不含截圖成本）
+            for strategy, fast_mode in (("fast", True), ("fast+prefilter", True), ("pyramid", True),
+                                        ("multi-scale", False)):
+                recorder.set_match_prefilter(strategy.endswith("+prefilter"))
+                for name, (_, expected, label) in templates.items():
+                    entry = recorder._get_template(name)
+                    for _ in range(rounds):
+                        pos, ms = measure(lambda: recorder._match_template_on_screen(
+                            screen_gray, entry, None, threshold=0.85, fast_mode=fast_mode,
+                            strategy="pyramid" if strategy == "pyramid" else None, screen_color=screen_rgb))
+                        record(f"_match_template_on_screen/{strategy}/{res}", ms, _hit_ok(pos, expected, tolerance))
+                if strategy.endswith("+prefilter"):
+                    pruned[res] = recorder.get_prefilter_stats()['pruned_ratio']
+            recorder.set_match_prefilter(False)
+
+            # find_images_in_snapshot：所有模板一次批次匹配
+            template_list = [{'name': name, 'threshold': 0.85} for name in templates]
+            for strategy in ("fast", "pyramid"):
+                for _ in range(rounds):
+                    snapshot = screen_source(None)
+                    results, ms = measure(lambda: recorder.find_images_in_snapshot(
+                        snapshot, template_list, threshold=0.85, strategy=strategy))
+                    correct = sum(_hit_ok(results.get(name), expected, tolerance)
+                                  for name, (_, expected, _) in templates.items())
+                    record(f"find_images_in_snapshot/{strategy}/{res}", ms, correct, len(templates))
+
+            # find_image_by_features：縮放後的大模板（整張截圖 / 候選位置附近）
+            entry = recorder._get_template("large")
+            expected = templates["large"][1]
+            # 特徵點定位只求落在目標中央區域內（放大後模板短邊的 1/4）
+            feature_tolerance = int(min(entry.gray.shape) * 1.15) // 4
+            near = (expected[0] - 250, expected[1] - 200, expected[0] + 250, expected[1] + 200)
+            for label, region in (("full", None), ("region", near)):
+                for _ in range(rounds):
+                    (x, y, _), ms = measure(lambda: recorder.find_image_by_features(entry, screen_gray, region=region))
+                    record(f"find_image_by_features/{label}/{res}", ms,
+                           _hit_ok((x, y) if x is not None else None, expected, feature_tolerance))
+
+    summaries = {case: value.summary() for case, value in stats.items()}
+    print(f"{'案例':<52}{'p50(ms)':>9}{'p90(ms)':>9}{'p99(ms)':>9}{'次/秒':>9}{'準確度':>8}")
+    print("-" * 96)
+    for case, summary in summaries.items():
+        print(f"{case:<52}{summary['p50']:>9.1f}{summary['p90']:>9.1f}{summary['p99']:>9.1f}"
+              f"{summary['per_sec']:>9.1f}{summary['accuracy']:>8.0%}")
+    for res, ratio in pruned.items():
+        print(f"候選區域篩選 {res}：省略 {ratio:.0%} 的搜尋面積")
+    for res, capture in capture_stats.items():
+        print(f"截圖緩衝區 {res}：{capture['captures']} 次截圖，緩衝區配置 {capture['allocations']} 次"
+              f"（共 {capture['allocated_bytes'] / 1024 / 1024:.1f} MB）")
+    return summaries
+
+
+def _allocated_bytes(func, rounds):
+    """以 tracemalloc 量測 func 平均每次呼叫配置的記憶體（位元組，含呼叫後即釋放的暫存陣列）"""
+    func()  # 暖身（讓重複使用的緩衝區先配置好）
+    total = 0
+    for _ in range(rounds):
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        total += peak
+    return total / rounds
+
+
+def run_capture_allocations(rounds):
+    """比較截圖 + 灰階轉換的記憶體配置：每次新配置 vs 重複使用緩衝區"""
+    print(f"{'解析度':<12}{'方式':<28}{'每次配置(MB)':>14}{'耗時(ms)':>10}")
+    print("-" * 64)
+    for width, height in RESOLUTIONS + [(5120, 1440)]:  # 最後一組模擬雙螢幕
+        screen_rgb = cv2.cvtColor(make_desktop(width, height, seed=1), cv2.COLOR_BGR2RGB)
+        capturer = ScreenCapturer(ArrayBackend(screen_rgb))
+        region = (width // 4, height // 4, width // 2, height // 2)
+
+        cases = {
+            # 舊流程：截圖產生新影像 → np.array 複製 → cvtColor 配置灰階
+            "每次配置（全螢幕）": lambda: cv2.cvtColor(np.array(screen_rgb.copy()), cv2.COLOR_RGB2GRAY),
+            "緩衝區（全螢幕）": lambda: capturer.grab_gray(),
+            "緩衝區（1/4 範圍）": lambda: capturer.grab_gray(region),
+        }
+        for label, func in cases.items():
+            allocated = _allocated_bytes(func, rounds)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                func()
+            ms = (time.perf_counter() - start) * 1000 / rounds
+            print(f"{f'{width}x{height}':<12}{label:<28}{allocated / 1024 / 1024:>14.2f}{ms:>10.2f}")
+        print(f"{'':<12}緩衝區配置次數：{capturer.stats()['allocations']}（截圖 {capturer.stats()['captures']} 次）")
+
+
+def run_template_startup(count=200):
+    """比較開啟引用 count 張模板的腳本時，載入所有模板的時間"""
+    print(f"{'模板大小':<12}{'無快取(ms)':>12}{'寫入快取(ms)':>14}{'從快取載入(ms)':>16}{'加速':>8}")
+    print("-" * 62)
+    for width, height in [(64, 48), (300, 200)]:
+        with tempfile.TemporaryDirectory() as images_dir:
+            paths = []
+            for i in range(count):
+                path = os.path.join(images_dir, f"pic{i:03d}.png")
+                cv2.imwrite(path, make_icon(width, height, seed=i))
+                paths.append(path)
+
+            def load_all(disk_cache):
+                bank = TemplateBank(disk_cache=disk_cache)
+                start = time.perf_counter()
+                for i, path in enumerate(paths):
+                    bank.load(f"pic{i:03d}", path)
+                return (time.perf_counter() - start) * 1000
+
+            plain = load_all(None)
+            cold = load_all(TemplateDiskCache(cache_directory(images_dir)))
+            # 新的快取物件（模擬重新啟動程式，檔案雜湊需重新計算）
+            warm = load_all(TemplateDiskCache(cache_directory(images_dir)))
+            print(f"{f'{width}x{height}':<12}{plain:>12.0f}{cold:>14.0f}{warm:>16.0f}{plain / warm:>7.1f}x")
+
+
+def compare_with_baseline(summaries, baseline_path):
+    """與先前儲存的基準結果比較 p50 延遲與準確度"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    print(f"\n與基準比較（{baseline_path}）")
+    print(f"{'案例':<52}{'基準p50':>9}{'目前p50':>9}{'變化':>9}{'準確度變化':>12}")
+    print("-" * 94)
+    regressions = 0
+    for case, summary in summaries.items():
+        old = baseline.get(case)
+        if old is None:
+            continue
+        change = summary['p50'] / max(old['p50'], 1e-6)
+        accuracy_delta = summary['accuracy'] - old['accuracy']
+        regressions += int(accuracy_delta < 0)
+        print(f"{case:<52}{old['p50']:>9.1f}{summary['p50']:>9.1f}{change:>8.2f}x{accuracy_delta:>+12.0%}")
+    return regressions == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="圖片匹配效能基準測試")
+    parser.add_argument("--mode", choices=["pyramid", "suite", "capture", "startup", "all"], default="all", help="執行哪一組測試")
+    parser.add_argument("--rounds", type=int, default=5, help="每個案例重複次數")
+    parser.add_argument("--downscale", type=int, default=4, help="金字塔縮小倍率（4 或 8）")
+    parser.add_argument("--tolerance", type=int, default=1, help="中心點容許誤差（像素）")
+    parser.add_argument("--json", help="將辨識 API 測試結果存為 JSON（作為之後比較的基準）")
+    parser.add_argument("--baseline", help="與先前存下的 JSON 基準比較")
+    args = parser.parse_args()
+
+    ok = True
+    if args.mode in ("pyramid", "all"):
+        ok &= run_pyramid_comparison(args.rounds, args.downscale, args.tolerance)
+    if args.mode in ("suite", "all"):
+        print()
+        summaries = run_suite(args.rounds, max(args.tolerance, 2))
+        if summaries:
+            if args.json:
+                with open(args.json, 'w', encoding='utf-8') as f:
+                    json.dump(summaries, f, ensure_ascii=False, indent=2)
+                print(f"已儲存基準：{args.json}")
+            if args.baseline:
+                ok &= compare_with_baseline(summaries, args.baseline)
+    if args.mode in ("capture", "all"):
+        print()
+        run_capture_allocations(args.rounds)
+    if args.mode in ("startup", "all"):
+        print()
+        run_template_startup()
+    sys.exit(0 if ok else 1)
@@ -22,6 +22,7 @@ from ttkbootstrap.constants import *
 import tkinter as tk
 from tkinter import messagebox
 import threading, time, json, os, datetime
+import multiprocessing
 import keyboard, mouse
 import ctypes
 import win32api
@@ -44,6 +45,7 @@ def is_admin():
 # 新增：匯入 Recorder / 語言 / script IO 函式（使用健壯的 fallback）
 try:
     from recorder import CoreRecorder
+    from overlay_manager import get_overlay_manager
 except Exception as e:
     print(f"無法匯入 CoreRecorder: {e}")
 
@@ -842,6 +844,11 @@ class RecorderApp(tb.Window):
         if self.script_var.get():
             self.on_script_selected()
         # self._init_language(saved_lang)  # 此方法不存在，已移除
+        try:
+            # 辨識邊框等 _delayed_init 掛到主視窗，期間不另建 Tk 執行緒
+            get_overlay_manager().expect_attach()
+        except Exception as e:
+            print(f"覆蓋視窗初始化失敗: {e}")
         self.after(1500, self._delayed_init)
 
     def _show_admin_warning(self):
@@ -896,6 +903,10 @@ class RecorderApp(tb.Window):
     def _delayed_init(self):
         # 初始化 core_recorder（需要在 self.log 可用之後）
         self.core_recorder = CoreRecorder(logger=self.log)
+        self.core_recorder.attach_overlay(self)  # 辨識邊框在主視窗的 UI 執行緒繪製
+        if self.user_config.get("frame_bus", False):
+            # 共用截圖匯流排（選用）：所有辨識共用單一背景截圖執行緒
+            self.core_recorder.enable_frame_bus(fps=self.user_config.get("frame_bus_fps", 10))
         
         # ✅ v2.6.5: 強化焦點獲取和快捷鍵註冊時序
         self.after(50, self._force_focus)   # 主動獲得焦點
@@ -4479,5 +4490,7 @@ def format_time(ts):
     return datetime.datetime.fromtimestamp(ts).strftime("%H:%M:%S")
 
 if __name__ == "__main__":
+    # 打包後的執行檔由分塊 OCR 的程序池啟動子程序時，直接進入子程序流程而不開啟主視窗
+    multiprocessing.freeze_support()
     app = RecorderApp()
     app.mainloop()
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+AnytimeMatch - 有時間預算的圖片辨識
+依成本由低到高執行各匹配策略，任何時候停止都能回傳目前最佳的候選位置與信心度，
+讓有即時性要求的腳本能預期辨識的最長耗時
+
+階段（實際成本由低到高）：
+1. roi: 位置記憶的搜尋視窗（記憶的最佳尺度，原解析度）
+2. pyramid: 全畫面金字塔粗到細匹配（記憶的最佳尺度）
+3. fast: 全畫面原解析度匹配（記憶的最佳尺度，補足縮小後特徵不明顯的模板）
+4. multiscale: 其餘尺度逐一以金字塔匹配
+5. features: ORB 特徵點匹配（只在目前最佳候選附近偵測）
+
+matchTemplate 無法中途打斷，因此每個階段開始前以過去的實際耗時（每百萬像素的毫秒數，
+指數移動平均）估計成本，剩餘預算不足時略過該階段。第一個階段一定會執行，
+確保預算為 0 時仍有候選位置可回傳。
+
+使用方式:
+    from anytime_match import AnytimeMatcher
+
+    matcher = AnytimeMatcher(feature_matcher=FeatureMatcher())
+    result = matcher.match(entry, screen_gray, threshold=0.9, budget_ms=50, scales=[1.1, 1.0, 0.9])
+    if result.found:
+        print(result.center, result.confidence, result.stage)
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from image_matcher import DEFAULT_SCALES, PyramidMatcher, match_at_scale, template_shape, template_variant
+
+# 階段名稱（執行順序）
+STAGES = ('roi', 'pyramid', 'fast', 'multiscale', 'features')
+
+# 成本估計的平滑係數（越大越偏重最近一次的耗時）
+_COST_ALPHA = 0.3
+
+
+class AnytimeResult:
+    """有時間預算的辨識結果
+
+    屬性：
+        found: 信心度是否達到閾值（或特徵點匹配成功）
+        x, y, width, height: 最佳候選的左上角與大小（沒有任何候選時為 None）
+        confidence: 最佳候選的信心度（模板匹配分數，特徵點匹配為相符特徵點比例）
+        stage: 產生最佳候選的階段
+        scale: 最佳候選的尺度
+        elapsed_ms: 總耗時
+        exhausted: 是否因預算不足而略過部分階段
+        stages: 實際執行的階段
+    """
+    __slots__ = ('found', 'x', 'y', 'width', 'height', 'confidence', 'stage', 'scale',
+                 'elapsed_ms', 'exhausted', 'stages')
+
+    def __init__(self, found: bool = False, x: Optional[int] = None, y: Optional[int] = None,
+                 width: int = 0, height: int = 0, confidence: float = 0.0, stage: Optional[str] = None,
+                 scale: float = 1.0, elapsed_ms: float = 0.0, exhausted: bool = False,
+                 stages: Optional[List[str]] = None):
+        self.found = found
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.confidence = confidence
+        self.stage = stage
+        self.scale = scale
+        self.elapsed_ms = elapsed_ms
+        self.exhausted = exhausted
+        self.stages = stages or []
+
+    @property
+    def center(self) -> Optional[Tuple[int, int]]:
+        """最佳候選的中心點（沒有候選時為 None）"""
+        if self.x is None:
+            return None
+        return (self.x + self.width // 2, self.y + self.height // 2)
+
+    def offset(self, dx: int, dy: int) -> 'AnytimeResult':
+        """平移座標（搜尋範圍 → 螢幕座標）"""
+        if self.x is not None:
+            self.x += dx
+            self.y += dy
+        return self
+
+
+class AnytimeMatcher:
+    """有時間預算的匹配器（執行緒安全）"""
+
+    def __init__(self, pyramid_matcher: Optional[PyramidMatcher] = None, feature_matcher=None,
+                 min_feature_matches: int = 15):
+        """
+        Args:
+            pyramid_matcher: 金字塔匹配器，None = PyramidMatcher(downscale=4, top_k=5)
+            feature_matcher: 特徵點匹配器（FeatureMatcher），None = 不執行特徵點階段
+            min_feature_matches: 特徵點匹配成功所需的最少相符點數
+        """
+        self.pyramid = pyramid_matcher or PyramidMatcher(downscale=4, top_k=5)
+        self.feature_matcher = feature_matcher
+        self.min_feature_matches = min_feature_matches
+        self._cost: Dict[str, float] = {}  # {階段: 每百萬像素的毫秒數}
+        self._lock = threading.Lock()
+
+        # 統計
+        self.calls = 0
+        self.found = 0
+        self.exhausted = 0
+        self.wins: Dict[str, int] = {stage: 0 for stage in STAGES}
+
+    # ==================== 成本估計 ====================
+
+    def estimate_ms(self, stage: str, pixels: int) -> Optional[float]:
+        """估計階段在指定搜尋面積下的耗時，沒有記錄時回傳 None"""
+        with self._lock:
+            per_mpx = self._cost.get(stage)
+        return None if per_mpx is None else per_mpx * pixels / 1e6
+
+    def _record(self, stage: str, elapsed_ms: float, pixels: int) -> None:
+        if pixels <= 0:
+            return
+        per_mpx = elapsed_ms * 1e6 / pixels
+        with self._lock:
+            previous = self._cost.get(stage)
+            self._cost[stage] = per_mpx if previous is None else previous + _COST_ALPHA * (per_mpx - previous)
+
+    # ==================== 匹配 ====================
+
+    def match(self, entry, screen_gray: np.ndarray, threshold: float = 0.9, budget_ms: Optional[float] = None,
+              scales: Optional[Sequence[float]] = None,
+              windows: Sequence[Tuple[int, int, int, int]] = ()) -> AnytimeResult:
+        """在時間預算內尋找模板
+
+        Args:
+            entry: 模板庫的 CompiledTemplate（或灰階模板陣列）
+            screen_gray: 灰階螢幕截圖
+            threshold: 匹配閾值，任一階段達到即停止
+            budget_ms: 時間預算（毫秒），None = 不限制（依序執行所有階段直到找到）
+            scales: 依優先順序排列的尺度，第一個為記憶的最佳尺度，None = DEFAULT_SCALES 由 1.0 向外
+            windows: 優先搜尋的視窗 (x1, y1, x2, y2)（相對於 screen_gray，由小到大）
+
+        Returns:
+            AnytimeResult（座標相對於 screen_gray）
+        """
+        start = time.perf_counter()
+        if scales is None:
+            scales = sorted(DEFAULT_SCALES, key=lambda scale: (abs(scale - 1.0), scale))
+        scales = list(scales) or [1.0]
+        mask = getattr(entry, 'mask', None)
+        screen_h, screen_w = screen_gray.shape[:2]
+        screen_pixels = screen_w * screen_h
+        best = AnytimeResult()
+        stages: List[str] = []
+        exhausted = False
+
+        def elapsed() -> float:
+            return (time.perf_counter() - start) * 1000
+
+        def affordable(stage: str, pixels: int) -> bool:
+            """剩餘預算是否足夠執行此階段（第一個階段一定執行）"""
+            nonlocal exhausted
+            if budget_ms is None or not stages:
+                return True
+            remaining = budget_ms - elapsed()
+            estimate = self.estimate_ms(stage, pixels)
+            if remaining <= 0 or (estimate is not None and estimate > remaining):
+                exhausted = True
+                return False
+            return True
+
+        def consider(stage: str, score: float, x: int, y: int, w: int, h: int, scale: float) -> None:
+            if np.isfinite(score) and (best.x is None or score > best.confidence):
+                best.x, best.y, best.width, best.height = int(x), int(y), int(w), int(h)
+                best.confidence, best.stage, best.scale = float(score), stage, scale
+
+        def run(stage: str, pixels: int, func) -> None:
+            if stage not in stages:
+                stages.append(stage)
+            stage_start = time.perf_counter()
+            func()
+            self._record(stage, (time.perf_counter() - stage_start) * 1000, pixels)
+
+        hint_scale = scales[0]
+        hint_template, hint_mask = template_variant(entry, mask, hint_scale)
+        th, tw = hint_template.shape[:2]
+
+        # 1. 位置記憶的搜尋視窗
+        def roi_stage(x1, y1, x2, y2):
+            score, (rx, ry) = match_at_scale(screen_gray[y1:y2, x1:x2], hint_template, hint_mask)
+            consider('roi', score, x1 + rx, y1 + ry, tw, th, hint_scale)
+
+        for x1, y1, x2, y2 in windows:
+            x1, y1 = max(0, int(x1)), max(0, int(y1))
+            x2, y2 = min(screen_w, int(x2)), min(screen_h, int(y2))
+            if x2 - x1 < tw or y2 - y1 < th:
+                continue
+            if best.confidence >= threshold or not affordable('roi', (x2 - x1) * (y2 - y1)):
+                break
+            run('roi', (x2 - x1) * (y2 - y1), lambda: roi_stage(x1, y1, x2, y2))
+
+        # 2. 全畫面金字塔匹配（記憶的最佳尺度）
+        def pyramid_stage(scale, stage):
+            hit = self.pyramid.match(screen_gray, entry, mask, threshold=0.0, scales=[scale])
+            if hit:
+                cx, cy, score, (w, h) = hit
+                consider(stage, score, cx - w // 2, cy - h // 2, w, h, scale)
+
+        if best.confidence < threshold and affordable('pyramid', screen_pixels):
+            run('pyramid', screen_pixels, lambda: pyramid_stage(hint_scale, 'pyramid'))
+
+        # 3. 全畫面原解析度匹配（記憶的最佳尺度）
+        def fast_stage():
+            score, (x, y) = match_at_scale(screen_gray, hint_template, hint_mask)
+            consider('fast', score, x, y, tw, th, hint_scale)
+
+        if (best.confidence < threshold and tw <= screen_w and th <= screen_h
+                and affordable('fast', screen_pixels)):
+            run('fast', screen_pixels, fast_stage)
+
+        # 4. 其餘尺度（每個尺度開始前各自檢查預算）
+        for scale in scales[1:]:
+            if best.confidence >= threshold or not affordable('multiscale', screen_pixels):
+                break
+            run('multiscale', screen_pixels, lambda: pyramid_stage(scale, 'multiscale'))
+
+        # 5. 特徵點匹配（在目前最佳候選附近）
+        if best.confidence < threshold and self.feature_matcher is not None:
+            region = None
+            if best.x is not None:
+                margin = max(best.width, best.height)
+                region = (best.x - margin, best.y - margin,
+                          best.x + best.width + margin, best.y + best.height + margin)
+            pixels = screen_pixels if region is None else (region[2] - region[0]) * (region[3] - region[1])
+            if affordable('features', pixels):
+                run('features', pixels, lambda: self._features_stage(entry, screen_gray, region, best))
+
+        best.found = best.found or best.confidence >= threshold
+        best.elapsed_ms = elapsed()
+        best.exhausted = exhausted
+        best.stages = stages
+        with self._lock:
+            self.calls += 1
+            if best.found:
+                self.found += 1
+                self.wins[best.stage] += 1
+            if exhausted:
+                self.exhausted += 1
+        return best
+
+    def _features_stage(self, entry, screen_gray, region, best: AnytimeResult) -> None:
+        """特徵點匹配，成功時以特徵點位置取代目前的候選"""
+        x, y, count = self.feature_matcher.match(entry, screen_gray, region=region,
+                                                 min_match_count=self.min_feature_matches)
+        if x is None or count < self.min_feature_matches:
+            return
+        _, descriptors = self.feature_matcher.template_features(entry)
+        h, w = template_shape(entry)[:2]
+        best.x, best.y, best.width, best.height = x - w // 2, y - h // 2, w, h
+        best.confidence = min(1.0, count / max(1, len(descriptors)))
+        best.stage, best.scale, best.found = 'features', 1.0, True
+
+    def stats(self) -> dict:
+        """取得統計（wins = 各階段產生成功結果的次數，cost_ms_per_mpx = 各階段的成本估計）"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'found': self.found,
+                'exhausted': self.exhausted,
+                'exhausted_ratio': self.exhausted / self.calls if self.calls else 0.0,
+                'wins': dict(self.wins),
+                'cost_ms_per_mpx': dict(self._cost),
+            }
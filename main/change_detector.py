@@ -0,0 +1,122 @@
+"""
+ChangeDetector - 畫面變化偵測
+等待 / 重試迴圈中，畫面沒有變化時直接沿用上一次的辨識結果，完全跳過 matchTemplate
+
+原理：
+- 將截圖切成 tile×tile 的區塊，以原解析度計算每個區塊的 CRC32 校驗碼
+- 與上一次的校驗碼完全相同才視為「畫面未變化」，任何一個像素改變（例如勾選框、小圖示）都會重新匹配
+- 1920x1080 灰階截圖約 3ms（校驗碼為線性掃描），遠低於一次模板匹配
+
+使用方式:
+    from change_detector import ChangeDetector
+
+    detector = ChangeDetector()
+    fingerprint = detector.fingerprint(frame)
+    unchanged, result = detector.lookup(key, fingerprint)
+    if not unchanged:
+        result = expensive_match(frame)
+        detector.store(key, fingerprint, result)
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+import numpy as np
+
+# 指紋：(截圖形狀, 各區塊的校驗碼)
+Fingerprint = Tuple[Tuple[int, ...], np.ndarray]
+
+
+class ChangeDetector:
+    """畫面變化偵測與辨識結果沿用（執行緒安全）"""
+
+    def __init__(self, tile: int = 64, max_keys: int = 64):
+        """初始化偵測器
+
+        Args:
+            tile: 校驗區塊大小（像素）
+            max_keys: 最多保留幾組辨識結果
+        """
+        self.tile = max(8, int(tile))
+        self.max_keys = max_keys
+        self._entries: 'OrderedDict[Hashable, Tuple[Fingerprint, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計
+        self.skipped = 0
+        self.evaluated = 0
+
+    def fingerprint(self, frame: np.ndarray) -> Fingerprint:
+        """計算截圖的區塊校驗碼指紋（原解析度，不縮小）
+
+        Args:
+            frame: 截圖（灰階或彩色 numpy 陣列）
+
+        Returns:
+            (截圖形狀, 各區塊的 CRC32 校驗碼陣列)
+        """
+        frame = np.asarray(frame)
+        h, w = frame.shape[:2]
+        tile = self.tile
+        checksums = []
+        for y in range(0, h, tile):
+            band = frame[y:y + tile]
+            for x in range(0, w, tile):
+                checksums.append(zlib.crc32(np.ascontiguousarray(band[:, x:x + tile])))
+        return frame.shape, np.array(checksums, dtype=np.uint32)
+
+    def unchanged(self, previous: Optional[Fingerprint], current: Fingerprint) -> bool:
+        """判斷兩個指紋是否為相同畫面（形狀相同且每個區塊的校驗碼都相同）"""
+        if previous is None or previous[0] != current[0]:
+            return False
+        return bool(np.array_equal(previous[1], current[1]))
+
+    def changed_tiles(self, previous: Fingerprint, current: Fingerprint) -> int:
+        """兩個指紋之間改變的區塊數（形狀不同時視為全部改變）"""
+        if previous[0] != current[0]:
+            return len(current[1])
+        return int(np.count_nonzero(previous[1] != current[1]))
+
+    def lookup(self, key: Hashable, fingerprint: Fingerprint) -> Tuple[bool, Any]:
+        """查詢畫面未變化時可沿用的結果
+
+        Args:
+            key: 辨識條件（圖片名稱、閾值、範圍等組成的 tuple）
+            fingerprint: 本次截圖的指紋
+
+        Returns:
+            (是否沿用, 上一次的結果)；不可沿用時結果為 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.unchanged(entry[0], fingerprint):
+                self._entries.move_to_end(key)
+                self.skipped += 1
+                return True, entry[1]
+            self.evaluated += 1
+            return False, None
+
+    def store(self, key: Hashable, fingerprint: Fingerprint, result: Any) -> None:
+        """記錄本次辨識結果"""
+        with self._lock:
+            self._entries[key] = (fingerprint, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """清除所有記錄的結果"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """取得統計（skip_rate = 跳過匹配的比例）"""
+        with self._lock:
+            total = self.skipped + self.evaluated
+            return {
+                'skipped': self.skipped,
+                'evaluated': self.evaluated,
+                'skip_rate': self.skipped / total if total else 0.0,
+            }
@@ -37,6 +37,8 @@ class ConfigManager:
         "language": "繁體中文",
         "first_run": True,
         "auto_mini_mode": False,
+        "frame_bus": False,       # 共用截圖匯流排（所有辨識共用單一背景截圖執行緒）
+        "frame_bus_fps": 10,
         "hotkey_map": {
             "start": "F10",
             "pause": "F11",
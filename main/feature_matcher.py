@@ -0,0 +1,181 @@
+"""
+FeatureMatcher - 特徵點匹配（模板匹配失敗時的備案）
+以 ORB 特徵點 + 單應性矩陣定位圖片，容許縮放、輕微旋轉與部分遮擋
+
+效能設計：
+- ORB 偵測器建立一次後重複使用（每個執行緒各一個，避免共用狀態）
+- 模板的特徵點與描述子在第一次使用時計算，之後快取在模板庫的 CompiledTemplate 上
+- 只在指定範圍內偵測螢幕特徵點（例如模板匹配的候選位置附近），不必掃描整個螢幕
+- 螢幕特徵點數量依搜尋面積放大（固定密度），整張 1080p 以上的截圖也能在模板位置留下足夠的特徵點
+- 螢幕描述子數量多時改用 FLANN LSH 索引，少時使用暴力匹配（小資料量反而較快）
+
+使用方式:
+    from feature_matcher import FeatureMatcher
+
+    matcher = FeatureMatcher()
+    x, y, count = matcher.match(entry, screen_gray, region=(x1, y1, x2, y2))
+"""
+
+import threading
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 特徵資料：(關鍵點座標 Nx2 float32, 描述子 NxD uint8)
+Features = Tuple[np.ndarray, Optional[np.ndarray]]
+
+# FLANN LSH 索引參數（ORB 為二進位描述子）
+FLANN_INDEX_LSH = 6
+
+
+class FeatureMatcher:
+    """ORB 特徵點匹配器（執行緒安全）"""
+
+    def __init__(self, nfeatures: int = 2000, ratio: float = 0.7, use_flann: bool = True,
+                 flann_min_descriptors: int = 1000, density_area: int = 640 * 360, max_features: int = 40000):
+        """初始化匹配器
+
+        Args:
+            nfeatures: 模板最多偵測的特徵點數量；螢幕每 density_area 像素偵測的特徵點數量
+            ratio: Lowe's ratio test 閾值 (0-1)
+            use_flann: 螢幕描述子數量多時是否使用 FLANN LSH 索引
+            flann_min_descriptors: 螢幕描述子超過此數量才使用 FLANN
+            density_area: 螢幕特徵點密度的基準面積（像素）
+            max_features: 螢幕特徵點數量上限（限制整張大截圖的耗時）
+        """
+        self.nfeatures = nfeatures
+        self.density_area = density_area
+        self.max_features = max_features
+        self.ratio = ratio
+        self.use_flann = use_flann
+        self.flann_min_descriptors = flann_min_descriptors
+        self._local = threading.local()
+
+    def _detector(self, nfeatures: Optional[int] = None):
+        """取得目前執行緒的 ORB 偵測器（每個執行緒建立一次）
+
+        Args:
+            nfeatures: 本次最多偵測的特徵點數量，None = nfeatures
+        """
+        orb = getattr(self._local, 'orb', None)
+        if orb is None:
+            orb = cv2.ORB_create(nfeatures=self.nfeatures)
+            self._local.orb = orb
+        orb.setMaxFeatures(nfeatures or self.nfeatures)
+        return orb
+
+    def screen_budget(self, width: int, height: int) -> int:
+        """依搜尋範圍面積計算螢幕特徵點數量
+
+        ORB 只保留整張影像反應最強的 N 個特徵點；固定 N 時搜尋範圍越大，
+        模板位置分到的特徵點越少（1920x1080 整張截圖只剩個位數匹配），因此維持固定密度
+        """
+        scaled = int(self.nfeatures * width * height / max(1, self.density_area))
+        return max(self.nfeatures, min(self.max_features, scaled))
+
+    def _matcher(self, train_count: int):
+        """依描述子數量選擇匹配器（每個執行緒建立一次）"""
+        if self.use_flann and train_count >= self.flann_min_descriptors:
+            flann = getattr(self._local, 'flann', None)
+            if flann is None:
+                index_params = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+                flann = cv2.FlannBasedMatcher(index_params, dict(checks=50))
+                self._local.flann = flann
+            return flann
+        bf = getattr(self._local, 'bf', None)
+        if bf is None:
+            bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
+            self._local.bf = bf
+        return bf
+
+    def detect(self, gray: np.ndarray, nfeatures: Optional[int] = None) -> Features:
+        """偵測特徵點與描述子
+
+        Args:
+            gray: 灰階影像
+            nfeatures: 最多偵測的特徵點數量，None = nfeatures
+
+        Returns:
+            (關鍵點座標 Nx2, 描述子)；沒有特徵點時描述子為 None
+        """
+        keypoints, descriptors = self._detector(nfeatures).detectAndCompute(gray, None)
+        points = np.float32([kp.pt for kp in keypoints]).reshape(-1, 2)
+        return points, descriptors
+
+    def template_features(self, template) -> Features:
+        """取得模板特徵（CompiledTemplate 會快取在 entry.features，之後不再計算）
+
+        Args:
+            template: 模板庫的 CompiledTemplate 或灰階 numpy 陣列
+        """
+        if isinstance(template, np.ndarray):
+            return self.detect(template)
+        features = template.features
+        if features is None:
+            features = self.detect(template.gray)
+            template.features = features
+        return features
+
+    def match(self, template, screen_gray: np.ndarray, region: Optional[Tuple[int, int, int, int]] = None,
+              min_match_count: int = 10, ratio: Optional[float] = None) -> Tuple[Optional[int], Optional[int], int]:
+        """在螢幕上以特徵點尋找模板
+
+        Args:
+            template: 模板庫的 CompiledTemplate 或灰階模板
+            screen_gray: 灰階螢幕截圖
+            region: 只在此範圍 (x1, y1, x2, y2) 內偵測螢幕特徵點，None = 整張截圖
+                （整張截圖的特徵點數量依面積放大，耗時較高；已知候選位置時應傳入範圍）
+            min_match_count: 最小匹配點數量
+            ratio: Lowe's ratio test 閾值，None = 使用預設值
+
+        Returns:
+            (center_x, center_y, match_count)，找不到時座標為 None
+        """
+        ratio = self.ratio if ratio is None else ratio
+        template_points, template_des = self.template_features(template)
+        if template_des is None or len(template_des) < 2:
+            return None, None, 0
+
+        offset_x, offset_y = 0, 0
+        search = screen_gray
+        if region is not None:
+            x1, y1, x2, y2 = region
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(screen_gray.shape[1], x2), min(screen_gray.shape[0], y2)
+            if x2 <= x1 or y2 <= y1:
+                return None, None, 0
+            search = screen_gray[y1:y2, x1:x2]
+            offset_x, offset_y = x1, y1
+
+        screen_points, screen_des = self.detect(search, self.screen_budget(search.shape[1], search.shape[0]))
+        if screen_des is None or len(screen_des) < 2:
+            return None, None, 0
+
+        pairs = self._matcher(len(screen_des)).knnMatch(template_des, screen_des, k=2)
+
+        # 🔥 Lowe's ratio test 篩選優質匹配（LSH 可能回傳少於 2 個鄰居）
+        good = [pair[0] for pair in pairs if len(pair) == 2 and pair[0].distance < ratio * pair[1].distance]
+        match_count = len(good)
+        if match_count < max(4, min_match_count):
+            return None, None, match_count
+
+        # 🔥 使用 RANSAC 計算單應性矩陣
+        src_pts = template_points[[m.queryIdx for m in good]].reshape(-1, 1, 2)
+        dst_pts = screen_points[[m.trainIdx for m in good]].reshape(-1, 1, 2)
+        homography, _ = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+        if homography is None:
+            return None, None, match_count
+
+        # 模板四個角點在螢幕上的位置 → 中心點
+        gray = template if isinstance(template, np.ndarray) else template.gray
+        h, w = gray.shape[:2]
+        corners = np.float32([[0, 0], [0, h - 1], [w - 1, h - 1], [w - 1, 0]]).reshape(-1, 1, 2)
+        projected = cv2.perspectiveTransform(corners, homography)
+        center_x = int(np.mean(projected[:, 0, 0]))
+        center_y = int(np.mean(projected[:, 0, 1]))
+
+        # 中心點必須在搜尋範圍內
+        if not (0 <= center_x < search.shape[1] and 0 <= center_y < search.shape[0]):
+            return None, None, match_count
+        return center_x + offset_x, center_y + offset_y, match_count
@@ -0,0 +1,323 @@
+"""
+FrameBus - 共用截圖匯流排
+單一背景執行緒以固定 FPS 截取螢幕，圖片辨識、OCR、監看器等所有消費者共用最新畫面，
+不論同時有多少個辨識器在執行，截圖成本都不會超過設定的 FPS
+
+特性：
+- 截圖寫入預先配置、重複使用的 NumPy 緩衝區（環狀，預設 3 個）
+- 每張畫面帶有序號與截取時間，消費者可等待比手上更新的畫面
+- borrow() 直接借用緩衝區（零複製，借用期間不會被覆寫）；latest() / grab() 回傳複本
+- 一段時間沒有消費者讀取時暫停截圖，下次讀取時自動恢復
+- 匯流排未啟動或範圍超出主螢幕時，capture() 直接呼叫 ImageGrab（行為與過去相同）
+
+使用方式:
+    from frame_bus import get_frame_bus, capture
+
+    bus = get_frame_bus()
+    bus.start(fps=10)
+
+    image = capture((0, 0, 400, 300))          # PIL.Image，來自最新畫面
+    with bus.borrow() as frame:                 # 零複製讀取整張畫面
+        process(frame.array)
+    newer = bus.wait_for_newer(frame.seq)       # 等待下一張畫面
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageGrab
+
+Region = Tuple[int, int, int, int]
+
+
+def _grab_full_screen() -> np.ndarray:
+    """預設截圖函式：整個主螢幕（RGB）"""
+    return np.asarray(ImageGrab.grab())
+
+
+class Frame:
+    """一張畫面
+
+    屬性：
+        seq: 序號（每截取一張 +1）
+        timestamp: 開始截取的時間（time.time()）
+        array: RGB 畫面（borrow() 取得的是共用緩衝區，請勿修改）
+    """
+    __slots__ = ('seq', 'timestamp', 'array')
+
+    def __init__(self, seq: int, timestamp: float, array: np.ndarray):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.array = array
+
+    @property
+    def age(self) -> float:
+        """畫面距今的秒數"""
+        return time.time() - self.timestamp
+
+    def covers(self, region: Optional[Region] = None) -> bool:
+        """範圍是否完全落在這張畫面內（畫面為主螢幕，原點 (0, 0)；
+        主螢幕左側或上方的螢幕座標為負數，不在畫面內）"""
+        if region is None:
+            return True
+        x1, y1, x2, y2 = (int(v) for v in region)
+        h, w = self.array.shape[:2]
+        return 0 <= x1 <= x2 <= w and 0 <= y1 <= y2 <= h
+
+    def crop(self, region: Optional[Region] = None) -> np.ndarray:
+        """取出範圍 (x1, y1, x2, y2) 的複本，None = 整張"""
+        if region is None:
+            return self.array.copy()
+        x1, y1, x2, y2 = region
+        h, w = self.array.shape[:2]
+        x1, y1 = max(0, int(x1)), max(0, int(y1))
+        x2, y2 = min(w, int(x2)), min(h, int(y2))
+        return self.array[y1:max(y1, y2), x1:max(x1, x2)].copy()
+
+
+class FrameBus:
+    """共用截圖匯流排（執行緒安全）"""
+
+    def __init__(self, fps: float = 10.0, grabber: Optional[Callable[[], object]] = None,
+                 buffers: int = 3, idle_timeout: Optional[float] = 5.0):
+        """初始化匯流排（尚未開始截圖）
+
+        Args:
+            fps: 每秒截圖次數上限
+            grabber: 截圖函式，回傳 RGB numpy 陣列或 PIL.Image，None = ImageGrab 全螢幕
+            buffers: 環狀緩衝區數量（至少 2）
+            idle_timeout: 超過此秒數沒有消費者讀取時暫停截圖，None = 不暫停
+        """
+        self.fps = max(0.1, float(fps))
+        self.idle_timeout = idle_timeout
+        self._grabber = grabber or _grab_full_screen
+        self._buffer_count = max(2, int(buffers))
+        self._buffers: List[np.ndarray] = []
+        self._pins: List[int] = []
+        self._latest: Optional[Tuple[int, int, float]] = None  # (緩衝區索引, 序號, 截取時間)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_demand = time.monotonic()
+
+        # 統計
+        self.captures = 0
+        self.skipped = 0
+        self.errors = 0
+        self._capture_seconds = 0.0
+
+    # ==================== 生命週期 ====================
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, fps: Optional[float] = None) -> None:
+        """啟動截圖執行緒（已啟動時只更新 FPS）"""
+        if fps is not None:
+            self.fps = max(0.1, float(fps))
+        with self._cond:
+            if self.running:
+                self._cond.notify_all()
+                return
+            self._stop.clear()
+            self._last_demand = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="FrameBus", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """停止截圖執行緒（保留最後一張畫面）"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+
+    # ==================== 截圖執行緒 ====================
+
+    def _idle(self) -> bool:
+        return (self.idle_timeout is not None
+                and time.monotonic() - self._last_demand > self.idle_timeout)
+
+    def _free_buffer(self, shape: Tuple[int, ...], dtype) -> Optional[int]:
+        """找一個沒有被借用、也不是最新畫面的緩衝區（畫面大小改變時重新配置）"""
+        if not self._buffers or self._buffers[0].shape != shape or self._buffers[0].dtype != dtype:
+            if any(self._pins):
+                return None
+            self._buffers = [np.empty(shape, dtype=dtype) for _ in range(self._buffer_count)]
+            self._pins = [0] * self._buffer_count
+            self._latest = None
+        latest_index = self._latest[0] if self._latest else -1
+        for offset in range(1, self._buffer_count + 1):
+            index = (latest_index + offset) % self._buffer_count
+            if index != latest_index and self._pins[index] == 0:
+                return index
+        return None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # 沒有消費者時暫停，等待下一次讀取喚醒
+            with self._cond:
+                while self._idle() and not self._stop.is_set():
+                    self._cond.wait()
+            if self._stop.is_set():
+                break
+
+            timestamp = time.time()
+            start = time.perf_counter()
+            try:
+                array = np.asarray(self._grabber())
+                if array.ndim == 3 and array.shape[2] == 4:
+                    array = array[:, :, :3]
+            except Exception:
+                self.errors += 1
+                self._stop.wait(1.0 / self.fps)
+                continue
+
+            with self._cond:
+                index = self._free_buffer(array.shape, array.dtype)
+                if index is None:
+                    self.skipped += 1
+                else:
+                    # 複製期間以 -1 標記，讀取端不會借到寫到一半的緩衝區
+                    self._pins[index] = -1
+            if index is not None:
+                np.copyto(self._buffers[index], array)
+                with self._cond:
+                    self._pins[index] = 0
+                    self._seq += 1
+                    self._latest = (index, self._seq, timestamp)
+                    self.captures += 1
+                    self._capture_seconds += time.perf_counter() - start
+                    self._cond.notify_all()
+
+            elapsed = time.perf_counter() - start
+            self._stop.wait(max(0.0, 1.0 / self.fps - elapsed))
+
+    # ==================== 消費者 ====================
+
+    def _acquire(self, max_age: Optional[float], timeout: float,
+                 after_seq: Optional[int]) -> Optional[Tuple[int, int, float]]:
+        """借用符合條件的最新畫面（呼叫端負責 _release）"""
+        request_time = time.time()
+        if max_age is None and self.idle_timeout is not None:
+            # 暫停前留下的畫面已過時
+            max_age = self.idle_timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._last_demand = time.monotonic()
+            self._cond.notify_all()
+            while True:
+                latest = self._latest
+                if latest is not None:
+                    index, seq, timestamp = latest
+                    fresh = max_age is None or timestamp >= request_time - max_age
+                    if fresh and (after_seq is None or seq > after_seq):
+                        self._pins[index] += 1
+                        return latest
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.running:
+                    return None
+                self._cond.wait(remaining)
+
+    def _release(self, index: int) -> None:
+        with self._cond:
+            self._pins[index] -= 1
+
+    @contextmanager
+    def borrow(self, max_age: Optional[float] = None, timeout: float = 1.0,
+               after_seq: Optional[int] = None) -> Iterator[Optional[Frame]]:
+        """借用最新畫面（零複製，區塊結束前不會被覆寫）
+
+        Args:
+            max_age: 畫面最多可以是幾秒前開始截取的，0 = 必須在呼叫之後才開始截取，
+                     None = 不限（但不接受暫停截圖前留下的畫面）
+            timeout: 等待符合條件畫面的最長秒數
+            after_seq: 只接受序號大於此值的畫面
+
+        Yields:
+            Frame，逾時或匯流排未啟動時為 None
+        """
+        latest = self._acquire(max_age, timeout, after_seq)
+        if latest is None:
+            yield None
+            return
+        index, seq, timestamp = latest
+        try:
+            yield Frame(seq, timestamp, self._buffers[index])
+        finally:
+            self._release(index)
+
+    def latest(self, max_age: Optional[float] = None, timeout: float = 1.0) -> Optional[Frame]:
+        """取得最新畫面的複本（參數同 borrow）"""
+        with self.borrow(max_age, timeout) as frame:
+            return Frame(frame.seq, frame.timestamp, frame.array.copy()) if frame else None
+
+    def wait_for_newer(self, seq: int, timeout: float = 1.0) -> Optional[Frame]:
+        """等待序號大於 seq 的畫面，回傳複本（逾時回傳 None）"""
+        with self.borrow(timeout=timeout, after_seq=seq) as frame:
+            return Frame(frame.seq, frame.timestamp, frame.array.copy()) if frame else None
+
+    def grab(self, region: Optional[Region] = None, max_age: Optional[float] = None,
+             timeout: float = 1.0) -> Optional[np.ndarray]:
+        """取得最新畫面中指定範圍的複本（只複製該範圍）
+
+        Returns:
+            RGB numpy 陣列，逾時、匯流排未啟動或範圍超出畫面（其他螢幕）時回傳 None
+        """
+        with self.borrow(max_age, timeout) as frame:
+            return frame.crop(region) if frame and frame.covers(region) else None
+
+    def stats(self) -> dict:
+        """取得統計（avg_capture_ms = 平均每次截圖耗時）"""
+        with self._cond:
+            return {
+                'running': self.running,
+                'fps': self.fps,
+                'seq': self._seq,
+                'captures': self.captures,
+                'skipped': self.skipped,
+                'errors': self.errors,
+                'avg_capture_ms': self._capture_seconds * 1000 / self.captures if self.captures else 0.0,
+            }
+
+
+# ==================== 共用實例 ====================
+
+_shared_bus: Optional[FrameBus] = None
+_shared_lock = threading.Lock()
+
+
+def get_frame_bus() -> FrameBus:
+    """取得全程式共用的匯流排（第一次呼叫時建立，需自行 start()）"""
+    global _shared_bus
+    with _shared_lock:
+        if _shared_bus is None:
+            _shared_bus = FrameBus()
+        return _shared_bus
+
+
+def capture(region: Optional[Region] = None, max_age: Optional[float] = None) -> Image.Image:
+    """截取螢幕（共用匯流排執行中時取自最新畫面，否則直接呼叫 ImageGrab）
+
+    Args:
+        region: 截取範圍 (x1, y1, x2, y2)，None = 全螢幕
+        max_age: 可接受的畫面最大秒數，0 = 必須是呼叫之後才開始截取的畫面
+
+    Returns:
+        PIL.Image（RGB）
+    """
+    bus = _shared_bus
+    if bus is not None and bus.running:
+        array = bus.grab(region, max_age=max_age)
+        if array is not None:
+            return Image.fromarray(array)
+    if region:
+        return ImageGrab.grab(bbox=tuple(region))
+    return ImageGrab.grab()
@@ -0,0 +1,120 @@
+"""
+ImageCatalog - 圖片目錄索引
+將圖片顯示名稱 O(1) 解析為檔案路徑，取代每次快取未命中都 os.listdir 的線性搜尋
+
+解析規則（依序）：
+1. 完整檔名（含副檔名）：pic01.png
+2. 完全相同的顯示名稱（不含副檔名）：pic01 -> pic01.png
+3. 不分大小寫的顯示名稱：PIC01 -> pic01.png
+4. 前綴 + 分隔符號：pic01 -> pic01_確定.png
+   （前綴後面必須接非英數字元，因此 pic1 不會誤配 pic10）
+
+同名不同副檔名時，依 .png > .jpg > .jpeg > .bmp 決定，結果固定不受 listdir 順序影響。
+目錄的修改時間 (mtime) 改變時才重建索引。
+
+使用方式:
+    from image_catalog import ImageCatalog
+
+    catalog = ImageCatalog("scripts/images")
+    path = catalog.resolve("pic01")  # 'scripts/images/pic01.png' 或 None
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+class ImageCatalog:
+    """圖片目錄索引（執行緒安全）"""
+
+    def __init__(self, images_dir: Optional[str]):
+        """初始化索引（延遲到第一次查詢時才掃描目錄）
+
+        Args:
+            images_dir: 圖片目錄路徑
+        """
+        self.images_dir = images_dir
+        self._lock = threading.Lock()
+        self._mtime_ns = None
+        self._by_filename: Dict[str, str] = {}
+        self._by_stem: Dict[str, str] = {}
+        self._by_stem_folded: Dict[str, str] = {}
+        self._prefixes: Dict[str, str] = {}
+
+    def _directory_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.images_dir).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+
+    def _rebuild(self, mtime_ns: Optional[int]) -> None:
+        """掃描目錄並重建所有索引"""
+        by_filename, by_stem, by_stem_folded, prefixes = {}, {}, {}, {}
+        entries: List[Tuple[int, str, str]] = []
+
+        if mtime_ns is not None:
+            for filename in os.listdir(self.images_dir):
+                stem, ext = os.path.splitext(filename)
+                ext = ext.lower()
+                if ext in IMAGE_EXTENSIONS:
+                    entries.append((IMAGE_EXTENSIONS.index(ext), stem, filename))
+
+        # 依副檔名優先順序與檔名排序，確保同名時的選擇固定
+        entries.sort(key=lambda item: (item[0], item[2]))
+        # 前綴索引：較短的檔名優先
+        prefix_order = sorted(entries, key=lambda item: (len(item[1]), item[0], item[2]))
+
+        for _, stem, filename in entries:
+            path = os.path.join(self.images_dir, filename)
+            by_filename[filename] = path
+            by_stem.setdefault(stem, path)
+            by_stem_folded.setdefault(stem.casefold(), path)
+
+        for _, stem, filename in prefix_order:
+            path = os.path.join(self.images_dir, filename)
+            # 每個「前綴 + 分隔符號」的位置都建立索引：pic01_確定 -> pic01
+            for i, char in enumerate(stem):
+                if i > 0 and not char.isalnum():
+                    prefixes.setdefault(stem[:i], path)
+
+        self._by_filename = by_filename
+        self._by_stem = by_stem
+        self._by_stem_folded = by_stem_folded
+        self._prefixes = prefixes
+        self._mtime_ns = mtime_ns
+
+    def _ensure_fresh(self) -> None:
+        mtime_ns = self._directory_mtime()
+        if mtime_ns != self._mtime_ns or (mtime_ns is None and self._by_filename):
+            self._rebuild(mtime_ns)
+
+    def resolve(self, name: str) -> Optional[str]:
+        """將顯示名稱解析為圖片路徑
+
+        Args:
+            name: 圖片顯示名稱或檔名
+
+        Returns:
+            圖片完整路徑，找不到回傳 None
+        """
+        with self._lock:
+            self._ensure_fresh()
+            return (self._by_filename.get(name)
+                    or self._by_stem.get(name)
+                    or self._by_stem_folded.get(name.casefold())
+                    or self._prefixes.get(name))
+
+    def invalidate(self) -> None:
+        """強制下次查詢時重新掃描目錄"""
+        with self._lock:
+            self._mtime_ns = None
+            self._by_filename = {}
+
+    def names(self) -> List[str]:
+        """列出目錄中所有圖片的顯示名稱"""
+        with self._lock:
+            self._ensure_fresh()
+            return sorted(self._by_stem)
@@ -0,0 +1,356 @@
+"""
+ImageMatcher - 圖片匹配核心演算法
+提供 CoreRecorder 圖片辨識使用的模板匹配函式（純 OpenCV / NumPy，無 Windows 依賴）
+
+特性：
+- 單一尺度模板匹配（支援透明遮罩）
+- 金字塔粗到細匹配：先在 1/4 或 1/8 縮小的螢幕上找出前 K 個候選，
+  再只在候選附近的小範圍 (ROI) 以原解析度精修
+- 找出所有相符位置：結果圖只做一次閾值與局部極大值篩選，再以向量化非極大值抑制去除重疊
+
+使用方式:
+    from image_matcher import PyramidMatcher, match_all
+
+    matcher = PyramidMatcher(downscale=4, top_k=5)
+    hit = matcher.match(screen_gray, template_gray, threshold=0.9)
+    if hit:
+        center_x, center_y, score, (w, h) = hit
+
+    hits = match_all(screen_gray, template_gray, threshold=0.9, order="position")
+"""
+
+import cv2
+import numpy as np
+from typing import Optional, Sequence, Tuple, List
+
+
+# 多尺度搜尋的預設尺度範圍（與 CoreRecorder 標準模式一致）
+DEFAULT_SCALES = [0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]
+
+# 匹配結果：(center_x, center_y, score, (width, height))
+MatchHit = Tuple[int, int, float, Tuple[int, int]]
+
+
+def match_at_scale(
+    screen: np.ndarray,
+    template: np.ndarray,
+    mask: Optional[np.ndarray] = None
+) -> Tuple[float, Tuple[int, int]]:
+    """在單一尺度下進行模板匹配
+
+    Args:
+        screen: 螢幕截圖（灰階或 BGR，需與 template 相同通道數）
+        template: 模板圖片
+        mask: 透明遮罩（可選）
+
+    Returns:
+        (score, (x, y)) 最佳匹配分數與左上角座標
+    """
+    if mask is not None:
+        # 有透明遮罩：TM_CCORR_NORMED 支援遮罩
+        result = cv2.matchTemplate(screen, template, cv2.TM_CCORR_NORMED, mask=mask)
+    else:
+        result = cv2.matchTemplate(screen, template, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(result)
+    return float(max_val), max_loc
+
+
+def scale_template(
+    template: np.ndarray,
+    mask: Optional[np.ndarray],
+    scale: float
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """依比例縮放模板與遮罩（模板用 INTER_CUBIC，遮罩用 INTER_NEAREST）"""
+    if scale == 1.0:
+        return template, mask
+    width = int(template.shape[1] * scale)
+    height = int(template.shape[0] * scale)
+    scaled_template = cv2.resize(template, (width, height), interpolation=cv2.INTER_CUBIC)
+    scaled_mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST) if mask is not None else None
+    return scaled_template, scaled_mask
+
+
+def template_variant(template, mask, scale: float) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """取得指定尺度的 (模板, 遮罩)
+
+    template 可為 numpy 陣列或 TemplateBank 的 CompiledTemplate；
+    後者直接取用預先縮放好的版本。傳入 mask=None 表示不使用遮罩。
+    """
+    if hasattr(template, 'variant'):
+        scaled_template, scaled_mask = template.variant(scale)
+        return scaled_template, (scaled_mask if mask is not None else None)
+    return scale_template(template, mask, scale)
+
+
+def template_shape(template) -> Tuple[int, ...]:
+    """取得模板形狀（支援 numpy 陣列與 CompiledTemplate）"""
+    return template.gray.shape if hasattr(template, 'gray') else template.shape
+
+
+def _top_k_peaks(result: np.ndarray, k: int, suppress_w: int, suppress_h: int) -> List[Tuple[float, Tuple[int, int]]]:
+    """從匹配結果圖取出前 K 個峰值（每取一個就抑制其鄰近區域）"""
+    work = result.copy()
+    # 遮罩匹配可能產生 NaN / Inf，先排除
+    work[~np.isfinite(work)] = -1.0
+    peaks = []
+    for _ in range(k):
+        _, max_val, _, max_loc = cv2.minMaxLoc(work)
+        if max_val <= -1.0:
+            break
+        peaks.append((float(max_val), max_loc))
+        x, y = max_loc
+        x1, y1 = max(0, x - suppress_w), max(0, y - suppress_h)
+        work[y1:y + suppress_h + 1, x1:x + suppress_w + 1] = -1.0
+    return peaks
+
+
+class PyramidMatcher:
+    """金字塔粗到細模板匹配器
+
+    流程：
+    1. 螢幕與模板同時縮小 downscale 倍（INTER_AREA）
+    2. 在縮小圖上匹配，取前 top_k 個候選位置
+    3. 在原解析度下，只對每個候選附近的小 ROI 精修
+
+    全螢幕 matchTemplate 的運算量約降為 1/downscale⁴，
+    精修後回傳的中心點與原解析度全圖匹配一致（誤差在 1 像素內）。
+    """
+
+    def __init__(self, downscale: int = 4, top_k: int = 5, min_template_size: int = 8):
+        """初始化匹配器
+
+        Args:
+            downscale: 縮小倍率（建議 4 或 8）
+            top_k: 保留的候選數量
+            min_template_size: 縮小後模板的最小邊長，不足時自動降低倍率
+        """
+        self.downscale = max(1, int(downscale))
+        self.top_k = max(1, int(top_k))
+        self.min_template_size = min_template_size
+
+    def _effective_factor(self, template_shape: Tuple[int, ...]) -> int:
+        """依模板大小決定實際縮小倍率（模板太小時逐步減半）"""
+        factor = self.downscale
+        min_side = min(template_shape[0], template_shape[1])
+        while factor > 1 and min_side // factor < self.min_template_size:
+            factor //= 2
+        return factor
+
+    def match(
+        self,
+        screen: np.ndarray,
+        template: np.ndarray,
+        mask: Optional[np.ndarray] = None,
+        threshold: float = 0.0,
+        scales: Sequence[float] = (1.0,),
+        stop_score: Optional[float] = None
+    ) -> Optional[MatchHit]:
+        """在螢幕上尋找模板
+
+        Args:
+            screen: 螢幕截圖（灰階或 BGR）
+            template: 模板圖片（與 screen 相同通道數）或 CompiledTemplate
+            mask: 透明遮罩（可選）
+            threshold: 匹配閾值，低於此分數回傳 None
+            scales: 要嘗試的模板尺度（依序嘗試）
+            stop_score: 任一尺度的分數達到此值即停止嘗試其餘尺度，None = 全部嘗試
+
+        Returns:
+            (center_x, center_y, score, (w, h)) 或 None
+        """
+        screen_h, screen_w = screen.shape[:2]
+        best = None  # (score, loc, (w, h))
+
+        # 相同倍率的縮小螢幕只計算一次
+        small_screens = {}
+
+        for scale in scales:
+            scaled_template, scaled_mask = template_variant(template, mask, scale)
+            th, tw = scaled_template.shape[:2]
+            if tw > screen_w or th > screen_h or (scale != 1.0 and (tw < 10 or th < 10)):
+                continue
+
+            factor = self._effective_factor(scaled_template.shape)
+            if factor <= 1:
+                # 模板太小，直接原解析度匹配
+                score, loc = match_at_scale(screen, scaled_template, scaled_mask)
+                if np.isfinite(score) and (best is None or score > best[0]):
+                    best = (score, loc, (tw, th))
+                if stop_score is not None and best is not None and best[0] >= stop_score:
+                    break
+                continue
+
+            if factor not in small_screens:
+                small_screens[factor] = cv2.resize(
+                    screen, (screen_w // factor, screen_h // factor), interpolation=cv2.INTER_AREA
+                )
+            small_screen = small_screens[factor]
+            small_w, small_h = max(1, tw // factor), max(1, th // factor)
+            if hasattr(template, 'downsampled'):
+                # 模板庫已保留縮小版本
+                small_template, small_mask = template.downsampled(scale, factor)
+                small_mask = small_mask if scaled_mask is not None else None
+            else:
+                small_template = cv2.resize(scaled_template, (small_w, small_h), interpolation=cv2.INTER_AREA)
+                small_mask = None
+                if scaled_mask is not None:
+                    small_mask = cv2.resize(scaled_mask, (small_w, small_h), interpolation=cv2.INTER_NEAREST)
+
+            # 🔥 階段1：縮小圖上找候選
+            if small_mask is not None:
+                coarse = cv2.matchTemplate(small_screen, small_template, cv2.TM_CCORR_NORMED, mask=small_mask)
+            else:
+                coarse = cv2.matchTemplate(small_screen, small_template, cv2.TM_CCOEFF_NORMED)
+            candidates = _top_k_peaks(coarse, self.top_k, max(1, small_w // 2), max(1, small_h // 2))
+
+            # 🔥 階段2：原解析度 ROI 精修（邊界留 factor 倍的餘量吸收取樣誤差）
+            margin = factor * 2
+            for _, (cx, cy) in candidates:
+                x1 = max(0, cx * factor - margin)
+                y1 = max(0, cy * factor - margin)
+                x2 = min(screen_w, cx * factor + tw + margin)
+                y2 = min(screen_h, cy * factor + th + margin)
+                if x2 - x1 < tw or y2 - y1 < th:
+                    continue
+                roi = screen[y1:y2, x1:x2]
+                score, (rx, ry) = match_at_scale(roi, scaled_template, scaled_mask)
+                if np.isfinite(score) and (best is None or score > best[0]):
+                    best = (score, (x1 + rx, y1 + ry), (tw, th))
+
+            if stop_score is not None and best is not None and best[0] >= stop_score:
+                break
+
+        if best is None or best[0] < threshold:
+            return None
+        score, (x, y), (w, h) = best
+        return (x + w // 2, y + h // 2, score, (w, h))
+
+
+# ==================== 找出所有相符位置 ====================
+
+def result_peaks(result: np.ndarray, threshold: float, max_candidates: int = 2000) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """從匹配結果圖取出所有超過閾值的局部極大值（一次向量化運算，不逐一抑制）
+
+    Args:
+        result: cv2.matchTemplate 的結果圖
+        threshold: 分數閾值
+        max_candidates: 候選數量上限（超過時只保留分數最高的部分）
+
+    Returns:
+        (xs, ys, scores) 左上角座標與分數
+    """
+    valid = np.where(np.isfinite(result), result, -1.0).astype(np.float32, copy=False)
+    # 3×3 鄰域內的最大值（平坦區域的多個等值點交給非極大值抑制處理）
+    local_max = cv2.dilate(valid, np.ones((3, 3), np.uint8))
+    ys, xs = np.nonzero((valid >= threshold) & (valid >= local_max))
+    scores = valid[ys, xs]
+    if scores.size > max_candidates:
+        top = np.argpartition(-scores, max_candidates - 1)[:max_candidates]
+        xs, ys, scores = xs[top], ys[top], scores[top]
+    return xs, ys, scores
+
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, overlap: float = 0.3,
+                        max_results: Optional[int] = None) -> np.ndarray:
+    """向量化非極大值抑制：依分數由高到低保留，與已保留框重疊率 (IoU) 超過 overlap 的框被移除
+
+    Args:
+        boxes: N×4 陣列 (x, y, w, h)
+        scores: N 個分數
+        overlap: 最大允許重疊率 (0-1)
+        max_results: 最多保留幾個，None = 不限
+
+    Returns:
+        保留的索引（依分數由高到低）
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    boxes = boxes.astype(np.float64, copy=False)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    areas = boxes[:, 2] * boxes[:, 3]
+
+    order = np.argsort(-np.asarray(scores), kind='stable')
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if max_results is not None and len(keep) >= max_results:
+            break
+        rest = order[1:]
+        # 與目前最高分的框同時計算所有剩餘框的重疊率
+        inter_w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[i] + areas[rest] - inter)
+        order = rest[iou <= overlap]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def sort_hits(hits: List[MatchHit], order: str = "score") -> List[MatchHit]:
+    """排序匹配結果
+
+    Args:
+        hits: match_all 的結果
+        order: "score" = 分數由高到低；"position" = 由上到下、由左到右
+               （中心點高度相差不到半個模板高度視為同一列）
+    """
+    if order != "position" or not hits:
+        return sorted(hits, key=lambda hit: -hit[2])
+    rows = []
+    for hit in sorted(hits, key=lambda hit: hit[1]):
+        if rows and hit[1] - rows[-1][0][1] < max(1, hit[3][1] // 2):
+            rows[-1].append(hit)
+        else:
+            rows.append([hit])
+    return [hit for row in rows for hit in sorted(row, key=lambda hit: hit[0])]
+
+
+def match_all(
+    screen: np.ndarray,
+    template: np.ndarray,
+    mask: Optional[np.ndarray] = None,
+    threshold: float = 0.9,
+    scales: Sequence[float] = (1.0,),
+    overlap: float = 0.3,
+    max_results: Optional[int] = None,
+    order: str = "score"
+) -> List[MatchHit]:
+    """找出螢幕上所有與模板相符的位置（每個尺度只做一次 matchTemplate）
+
+    Args:
+        screen: 螢幕截圖（灰階或 BGR）
+        template: 模板圖片（與 screen 相同通道數）或 CompiledTemplate
+        mask: 透明遮罩（可選）
+        threshold: 匹配閾值
+        scales: 要嘗試的模板尺度（各尺度的結果合併後一起去除重疊）
+        overlap: 兩個結果的最大允許重疊率，超過時只保留分數較高者
+        max_results: 最多回傳幾個（依分數保留），None = 不限
+        order: "score" 或 "position"，見 sort_hits
+
+    Returns:
+        [(center_x, center_y, score, (w, h)), ...]
+    """
+    screen_h, screen_w = screen.shape[:2]
+    boxes, scores = [], []
+    for scale in scales:
+        scaled_template, scaled_mask = template_variant(template, mask, scale)
+        th, tw = scaled_template.shape[:2]
+        if tw > screen_w or th > screen_h or (scale != 1.0 and (tw < 10 or th < 10)):
+            continue
+        if scaled_mask is not None:
+            result = cv2.matchTemplate(screen, scaled_template, cv2.TM_CCORR_NORMED, mask=scaled_mask)
+        else:
+            result = cv2.matchTemplate(screen, scaled_template, cv2.TM_CCOEFF_NORMED)
+        xs, ys, peak_scores = result_peaks(result, threshold)
+        boxes.append(np.column_stack([xs, ys, np.full(xs.size, tw), np.full(xs.size, th)]))
+        scores.append(peak_scores)
+
+    if not boxes:
+        return []
+    boxes = np.concatenate(boxes)
+    scores = np.concatenate(scores)
+    keep = non_max_suppression(boxes, scores, overlap, max_results)
+    hits = [(int(x + w // 2), int(y + h // 2), float(scores[i]), (int(w), int(h)))
+            for i, (x, y, w, h) in zip(keep, boxes[keep])]
+    return sort_hits(hits, order)
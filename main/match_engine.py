@@ -0,0 +1,186 @@
+"""
+MatchEngine - 平行多模板匹配引擎
+多張模板（及其各尺度）同時對同一張唯讀截圖進行 matchTemplate
+
+cv2.matchTemplate 執行時會釋放 GIL，因此以執行緒池即可真正平行運算，
+不需要複製截圖到其他行程。
+
+使用方式:
+    from match_engine import ParallelMatchEngine
+
+    engine = ParallelMatchEngine(max_workers=4)
+    results = engine.match_templates(screen_gray, [
+        ("pic01", template1, None, 0.9, [1.0]),
+        ("pic02", template2, mask2, 0.9, [0.9, 1.0, 1.1]),
+    ], first_hit=True)
+    # {'pic01': (x, y, score, (w, h)), 'pic02': None}
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from image_matcher import MatchHit, match_at_scale, template_variant
+
+# 匹配工作：(名稱, 模板, 遮罩, 閾值, 尺度列表)
+MatchJob = Tuple[str, np.ndarray, Optional[np.ndarray], float, Sequence[float]]
+
+
+class ParallelMatchEngine:
+    """平行多模板匹配引擎
+
+    功能：
+    - 以 (模板, 尺度) 為單位分派到執行緒池
+    - 共用同一張唯讀截圖（不複製）
+    - first_hit 模式：模板依列表順序為優先順序，通過閾值時只取消排在後面的工作，
+      等前面的模板都完成後回傳（結果與執行緒完成順序無關）
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """初始化引擎
+
+        Args:
+            max_workers: 工作執行緒數量，None = 依 CPU 核心數（最多 8）
+        """
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def set_max_workers(self, max_workers: int) -> None:
+        """調整工作執行緒數量（下次匹配時以新數量重建執行緒池）"""
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="match"
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        """關閉執行緒池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    @staticmethod
+    def _match_one(screen, template, mask, scale, cancel_event):
+        """單一 (模板, 尺度) 的匹配工作，回傳 (score, loc, (w, h)) 或 None"""
+        if cancel_event.is_set():
+            return None
+        scaled_template, scaled_mask = template_variant(template, mask, scale)
+        th, tw = scaled_template.shape[:2]
+        if tw > screen.shape[1] or th > screen.shape[0] or (scale != 1.0 and (tw < 10 or th < 10)):
+            return None
+        score, loc = match_at_scale(screen, scaled_template, scaled_mask)
+        if not np.isfinite(score):
+            return None
+        return score, loc, (tw, th)
+
+    def match_templates(
+        self,
+        screen: np.ndarray,
+        jobs: List[MatchJob],
+        first_hit: bool = False,
+        match_func: Any = None
+    ) -> Dict[str, Optional[MatchHit]]:
+        """平行匹配多張模板
+
+        Args:
+            screen: 共用的唯讀截圖
+            jobs: 匹配工作列表 [(name, template, mask, threshold, scales), ...]
+                  template 可為 CompiledTemplate（直接使用預先縮放的版本）
+            first_hit: True = 模板通過閾值時取消排在後面的工作，前面的模板都完成後回傳
+                       （jobs 的順序即優先順序，回傳排在最前面的命中）
+            match_func: 自訂整張模板的匹配函式（例如金字塔匹配），
+                        簽名: match_func(screen, template, mask, threshold, scales) -> MatchHit 或 None；
+                        None = 依尺度拆分工作，使用 match_at_scale
+
+        Returns:
+            {name: (center_x, center_y, score, (w, h)) 或 None}
+            first_hit 模式下，只有排在最前面的命中有結果，其餘模板回傳 None
+        """
+        results = {name: None for name, *_ in jobs}
+        if not jobs:
+            return results
+
+        executor = self._get_executor()
+        futures = {}
+        pending = {}  # name -> 尚未完成的尺度數
+        best = {}  # name -> (score, loc, (w, h))
+        thresholds = {}
+        rank = {}  # name -> 優先順序（jobs 中的位置）
+        cancels = {}  # name -> 取消事件（已在執行的工作開始前會檢查）
+
+        for name, template, mask, threshold, scales in jobs:
+            thresholds[name] = threshold
+            rank.setdefault(name, len(rank))
+            cancel_event = cancels.setdefault(name, threading.Event())
+            if match_func is not None:
+                future = executor.submit(match_func, screen, template, mask, threshold, scales)
+                futures[future] = name
+                pending[name] = pending.get(name, 0) + 1
+            else:
+                pending[name] = pending.get(name, 0) + len(scales)
+                for scale in scales:
+                    future = executor.submit(self._match_one, screen, template, mask, scale, cancel_event)
+                    futures[future] = name
+
+        hit_rank = len(rank)  # 目前命中的最前面順序
+
+        def cancel_after(position):
+            # 只取消排在命中之後的模板
+            for future, name in futures.items():
+                if rank[name] > position:
+                    cancels[name].set()
+                    future.cancel()
+
+        def settled():
+            # 排在命中之前的模板都已完成
+            return all(pending[name] == 0 for name in rank if rank[name] < hit_rank)
+
+        for future in as_completed(futures):
+            name = futures[future]
+            pending[name] -= 1
+            if future.cancelled():
+                continue
+            try:
+                outcome = future.result()
+            except Exception:
+                outcome = None
+
+            if match_func is not None:
+                # 自訂函式已回傳最終結果（已套用閾值）
+                if outcome is not None:
+                    results[name] = outcome
+            else:
+                if outcome is not None and (name not in best or outcome[0] > best[name][0]):
+                    best[name] = outcome
+                if pending[name] == 0 and name in best:
+                    score, (x, y), (w, h) = best[name]
+                    if score >= thresholds[name]:
+                        results[name] = (x + w // 2, y + h // 2, score, (w, h))
+
+            if first_hit and results[name] is not None and pending[name] == 0 and rank[name] < hit_rank:
+                hit_rank = rank[name]
+                cancel_after(hit_rank)
+            if first_hit and hit_rank < len(rank) and settled():
+                break
+
+        if first_hit:
+            cancel_after(hit_rank)
+            # 排在命中之後、已經完成的結果也捨棄，回傳內容不受完成順序影響
+            for name in results:
+                if rank[name] > hit_rank:
+                    results[name] = None
+
+        return results
@@ -0,0 +1,237 @@
+"""
+MatchPrefilter - 模板匹配前的候選區域篩選
+以積分影像找出完全平坦（單一顏色）的區域並略過，只對剩下的區域執行 cv2.matchTemplate
+
+TM_CCOEFF_NORMED 不受亮度與對比影響（視窗整體變亮 +30 或對比縮放後分數仍為 1.0），
+因此不能以視窗的平均值或標準差排除候選位置；唯一能證明不可能相符的是平坦視窗：
+變異數為 0 的視窗 matchTemplate 一律給 0 分。
+
+特性：
+- 整張截圖的積分影像只計算一次，所有模板、所有尺度共用
+- 候選位置以 stride 分成格子，格子內所有位置的視窗聯集完全平坦時才排除整格
+  （以整數運算判斷變異數為 0，沒有浮點誤差）
+- 全圖最佳分數大於 0 時（任何有意義的閾值），回傳的位置與全圖匹配相同（分數只有浮點誤差）
+- 選用的顏色分布篩選（hist_tolerance）屬於估計，亮度改變時可能排除真正的位置，預設關閉
+- 篩選效果不佳（保留面積太大或區塊太零碎）時自動改回全圖匹配
+
+使用方式:
+    from match_prefilter import MatchPrefilter, ScreenIntegrals
+
+    prefilter = MatchPrefilter()
+    integrals = ScreenIntegrals(screen_gray, screen_rgb)
+    score, loc, report = prefilter.match(integrals, template_gray, template_rgb)
+    print(report.pruned_ratio)
+"""
+
+import threading
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 粗略顏色分布：R/G/B 各以 128 分成高低兩段，共 8 種顏色
+COLOR_BINS = 8
+
+
+def _color_bin_index(rgb: np.ndarray) -> np.ndarray:
+    """每個像素的顏色分類 (0-7)"""
+    return ((rgb[:, :, 0] >> 7) << 2) | ((rgb[:, :, 1] >> 7) << 1) | (rgb[:, :, 2] >> 7)
+
+
+def _window_sums(integral: np.ndarray, w: int, h: int, rows: int, cols: int, step: int = 1) -> np.ndarray:
+    """由積分影像取得 rows×cols 個格點（間隔 step）的 w×h 視窗總和"""
+    y_end, x_end = h + (rows - 1) * step + 1, w + (cols - 1) * step + 1
+    bottom = integral[h:y_end:step]
+    top = integral[0:(rows - 1) * step + 1:step]
+    return (bottom[:, w:x_end:step] - top[:, w:x_end:step]
+            - bottom[:, 0:(cols - 1) * step + 1:step] + top[:, 0:(cols - 1) * step + 1:step])
+
+
+class ScreenIntegrals:
+    """截圖的積分影像（灰階總和、平方和、各顏色數量），同一張截圖只計算一次"""
+
+    def __init__(self, gray: np.ndarray, rgb: Optional[np.ndarray] = None, stride: int = 4):
+        """
+        Args:
+            gray: 灰階截圖
+            rgb: 同一張截圖的彩色版本（RGB），None = 不使用顏色篩選
+            stride: 候選位置與顏色取樣的間隔（像素）
+        """
+        self.gray = gray
+        self.rgb = rgb
+        self.stride = max(1, int(stride))
+        self.sum, self.sqsum = cv2.integral2(gray, sdepth=cv2.CV_32S, sqdepth=cv2.CV_64F)
+        self._color_integrals: Optional[List[np.ndarray]] = None
+
+    @property
+    def has_color(self) -> bool:
+        return self.rgb is not None
+
+    def color_integrals(self) -> List[np.ndarray]:
+        """各顏色分類的數量積分影像（以 stride 間隔取樣的像素計算，第一次使用時計算）"""
+        if self._color_integrals is None:
+            index = _color_bin_index(self.rgb[::self.stride, ::self.stride])
+            self._color_integrals = [cv2.integral((index == b).view(np.uint8)) for b in range(COLOR_BINS)]
+        return self._color_integrals
+
+
+
+class PrefilterReport:
+    """篩選結果統計
+
+    屬性：
+        positions: 全圖候選位置數量（= matchTemplate 結果圖的面積）
+        searched: 實際執行 matchTemplate 的位置數量
+        regions: 實際搜尋的區塊數量（0 = 改回全圖匹配或全部排除）
+    """
+    __slots__ = ('positions', 'searched', 'regions')
+
+    def __init__(self, positions: int, searched: int, regions: int):
+        self.positions = positions
+        self.searched = searched
+        self.regions = regions
+
+    @property
+    def pruned_ratio(self) -> float:
+        """省略的搜尋面積比例"""
+        return 1.0 - self.searched / self.positions if self.positions else 0.0
+
+
+class MatchPrefilter:
+    """matchTemplate 前的平坦區域篩選（TM_CCOEFF_NORMED，不支援遮罩，執行緒安全）"""
+
+    def __init__(self, hist_tolerance: Optional[float] = None, max_regions: int = 32,
+                 max_search_ratio: float = 0.6):
+        """初始化篩選器
+
+        Args:
+            hist_tolerance: 顏色分布交集最少需達 1 - hist_tolerance；None = 不篩選顏色
+                （估計值，亮度或色調改變時可能排除真正的位置，啟用後結果不保證與全圖匹配相同）
+            max_regions: 保留區塊超過此數量時改回全圖匹配
+            max_search_ratio: 需搜尋面積超過全圖此比例時改回全圖匹配
+        """
+        self.hist_tolerance = hist_tolerance
+        self.max_regions = max_regions
+        self.max_search_ratio = max_search_ratio
+        self._lock = threading.Lock()
+
+        # 統計（累計所有匹配）
+        self.calls = 0
+        self.positions = 0
+        self.searched = 0
+
+    def candidate_grid(self, integrals: ScreenIntegrals, template_gray: np.ndarray,
+                       template_rgb: Optional[np.ndarray] = None) -> np.ndarray:
+        """計算每個格子（左上角位置 (gx * stride, gy * stride) 起 stride x stride 個候選位置）是否可能相符
+
+        Returns:
+            bool 陣列 [gy, gx]；False = 格子內所有位置的視窗都完全平坦（matchTemplate 分數為 0）
+        """
+        step = integrals.stride
+        screen_h, screen_w = integrals.gray.shape[:2]
+        h, w = template_gray.shape[:2]
+        result_h, result_w = screen_h - h + 1, screen_w - w + 1
+        rows, cols = -(-result_h // step), -(-result_w // step)
+        area = float(w * h)
+
+        # 格子內所有位置的視窗聯集（超出截圖的部分裁掉）
+        x1 = np.arange(cols) * step
+        y1 = np.arange(rows) * step
+        x2 = np.minimum(x1 + step - 1 + w, screen_w)
+        y2 = np.minimum(y1 + step - 1 + h, screen_h)
+
+        def union_sums(integral):
+            return (integral[np.ix_(y2, x2)] - integral[np.ix_(y1, x2)]
+                    - integral[np.ix_(y2, x1)] + integral[np.ix_(y1, x1)])
+
+        # 變異數 * 面積^2 = 面積 * 平方和 - 總和^2，以 int64 計算（4K 全螢幕也不會溢位），0 = 完全平坦
+        counts = np.outer(y2 - y1, x2 - x1).astype(np.int64)
+        sums = union_sums(integrals.sum).astype(np.int64)
+        sqsums = union_sums(integrals.sqsum).astype(np.int64)
+        grid = counts * sqsums - sums * sums > 0
+
+        if self.hist_tolerance is not None and template_rgb is not None and integrals.has_color and grid.any():
+            t_hist = np.bincount(_color_bin_index(template_rgb).ravel(), minlength=COLOR_BINS) / area
+            # 取樣後的視窗大小（每 step 像素取一個）
+            sample_h, sample_w = -(-h // step), -(-w // step)
+            sample_area = float(sample_w * sample_h)
+            overlap = np.zeros(grid.shape, dtype=np.float64)
+            for b, integral in enumerate(integrals.color_integrals()):
+                if t_hist[b] > 0:
+                    bin_counts = _window_sums(integral, sample_w, sample_h, rows, cols)
+                    overlap += np.minimum(bin_counts / sample_area, t_hist[b])
+            grid &= overlap >= 1.0 - self.hist_tolerance
+        return grid
+
+    def _regions(self, grid: np.ndarray, step: int, result_w: int, result_h: int) -> Optional[List[Tuple[int, int, int, int]]]:
+        """將通過的格子合併為位置範圍 (x1, y1, x2, y2)，太零碎時回傳 None"""
+        count, _, stats, _ = cv2.connectedComponentsWithStats(grid.view(np.uint8), connectivity=8)
+        if count - 1 > self.max_regions:
+            return None
+        regions = []
+        for gx, gy, gw, gh, _ in stats[1:]:
+            x2 = min(result_w, (gx + gw) * step)
+            y2 = min(result_h, (gy + gh) * step)
+            regions.append((int(gx * step), int(gy * step), int(x2), int(y2)))
+        return regions
+
+    def match(self, integrals: ScreenIntegrals, template_gray: np.ndarray,
+              template_rgb: Optional[np.ndarray] = None) -> Tuple[float, Tuple[int, int], PrefilterReport]:
+        """篩選後匹配
+
+        Args:
+            integrals: 截圖的積分影像
+            template_gray: 灰階模板
+            template_rgb: 彩色模板（RGB，與灰階模板同大小），只在啟用顏色篩選時使用
+
+        Returns:
+            (最高分數, 左上角位置, 篩選統計)；全部位置都被排除時分數為 -1
+            （被排除的位置分數為 0，全圖最佳分數大於 0 時結果與全圖匹配相同）
+        """
+        screen = integrals.gray
+        h, w = template_gray.shape[:2]
+        result_h, result_w = screen.shape[0] - h + 1, screen.shape[1] - w + 1
+        positions = result_h * result_w
+
+        grid = self.candidate_grid(integrals, template_gray, template_rgb)
+        if not grid.any():
+            return -1.0, (0, 0), self._record(PrefilterReport(positions, 0, 0))
+
+        regions = self._regions(grid, integrals.stride, result_w, result_h)
+        searched = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) if regions is not None else positions
+        if regions is None or searched > positions * self.max_search_ratio:
+            # 篩選效果不佳，全圖匹配
+            result = cv2.matchTemplate(screen, template_gray, cv2.TM_CCOEFF_NORMED)
+            _, score, _, loc = cv2.minMaxLoc(result)
+            return float(score), loc, self._record(PrefilterReport(positions, positions, 0))
+
+        best_score, best_loc = -1.0, (0, 0)
+        for x1, y1, x2, y2 in regions:
+            roi = screen[y1:y2 + h - 1, x1:x2 + w - 1]
+            result = cv2.matchTemplate(roi, template_gray, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (rx, ry) = cv2.minMaxLoc(result)
+            if score > best_score:
+                best_score, best_loc = float(score), (x1 + rx, y1 + ry)
+        return best_score, best_loc, self._record(PrefilterReport(positions, searched, len(regions)))
+
+    def _record(self, report: PrefilterReport) -> PrefilterReport:
+        with self._lock:
+            self.calls += 1
+            self.positions += report.positions
+            self.searched += report.searched
+        return report
+
+    def reset_stats(self) -> None:
+        """清除累計統計"""
+        with self._lock:
+            self.calls = self.positions = self.searched = 0
+
+    def stats(self) -> dict:
+        """取得累計統計（pruned_ratio = 省略的搜尋面積比例）"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'positions': self.positions,
+                'searched': self.searched,
+                'pruned_ratio': 1.0 - self.searched / self.positions if self.positions else 0.0,
+            }
@@ -0,0 +1,221 @@
+"""
+MatchVerifier - 模板匹配結果的進階驗證
+對模板匹配找到的區域做像素級複核，降低相似圖案造成的誤判
+
+驗證項目（依成本由低到高，超過時間預算時停止並以已完成的項目計分）：
+1. 直方圖相關係數（有彩色截圖時使用 8x8x8 彩色直方圖，否則 32 階灰階直方圖）
+2. 邊緣重疊率（Canny 邊緣，模板邊緣預先膨脹 1 像素以容許取樣誤差）
+3. 結構相似度 SSIM（7x7 均勻視窗，與 scikit-image 預設值相同，以 OpenCV 濾波一次算完）
+
+模板端的統計（直方圖、邊緣、SSIM 用的平均值與變異數）在第一次驗證時計算後保留，
+之後每次驗證只需處理截圖區域。不需要 scikit-image。
+
+判斷規則（標準模式，皆以 0-1 的主要方法分數 primary 計算：無遮罩為相關係數法，有遮罩為遮罩相關法）：
+- primary < 閾值 * FEATURE_RATIO：不嘗試特徵點匹配
+- primary >= 閾值 * VERIFY_RATIO：進行驗證，combined_score() >= 閾值時接受
+- 舊版以三種方法的加權平均（完全相符時最高 0.8）計分，綜合分數上限 0.88，
+  無遮罩的多尺度匹配在預設閾值 0.92 下永遠不會通過；改以 primary 計分後完全相符時綜合分數為 1.0
+
+使用方式:
+    from match_verifier import MatchVerifier
+
+    verifier = MatchVerifier(budget_ms=20)
+    result = verifier.verify(entry, scale, region_gray, region_bgr)
+    print(result.score, result.metrics)
+"""
+
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 各驗證項目的權重
+WEIGHTS = {'hist': 1.0, 'edge': 0.8, 'ssim': 1.5}
+
+# 綜合分數中模板主要方法分數的權重（其餘為驗證分數）
+PRIMARY_WEIGHT = 0.6
+
+# 主要方法分數達閾值此比例才進行驗證 / 才嘗試特徵點匹配
+VERIFY_RATIO = 0.85
+FEATURE_RATIO = 0.7
+
+# SSIM 常數（data_range = 255）
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+_SSIM_WINDOW = (7, 7)
+
+
+def _normalized_correlation(a: np.ndarray, b: np.ndarray) -> float:
+    """兩個向量的相關係數（等同 cv2.HISTCMP_CORREL）"""
+    a = a - a.mean()
+    b = b - b.mean()
+    denom = np.sqrt(float(np.dot(a, a)) * float(np.dot(b, b)))
+    return float(np.dot(a, b) / denom) if denom > 0 else 0.0
+
+
+def _gray_histogram(gray: np.ndarray, mask: Optional[np.ndarray]) -> np.ndarray:
+    values = gray[mask > 0] if mask is not None else gray.ravel()
+    return np.bincount(values >> 3, minlength=32).astype(np.float64)
+
+
+def _color_histogram(bgr: np.ndarray, mask: Optional[np.ndarray]) -> np.ndarray:
+    quantized = bgr >> 5
+    index = (quantized[:, :, 0].astype(np.int32) << 6) | (quantized[:, :, 1].astype(np.int32) << 3) | quantized[:, :, 2]
+    values = index[mask > 0] if mask is not None else index.ravel()
+    return np.bincount(values, minlength=512).astype(np.float64)
+
+
+def combined_score(primary: float, verification: Optional[float]) -> float:
+    """模板主要方法分數與驗證分數的綜合分數（沒有驗證分數時為主要方法分數）
+
+    Args:
+        primary: 模板匹配主要方法分數（0-1）
+        verification: VerificationResult.score，None = 未完成任何驗證項目
+    """
+    if verification is None:
+        return primary
+    return primary * PRIMARY_WEIGHT + verification * (1.0 - PRIMARY_WEIGHT)
+
+
+class _TemplateStats:
+    """單一尺度模板的預先計算統計"""
+    __slots__ = ('gray', 'mask', 'gray_hist', 'color_hist', 'edges', 'edge_count',
+                 'gray_f', 'mu', 'sigma_sq')
+
+    def __init__(self, gray: np.ndarray, mask: Optional[np.ndarray], bgr: Optional[np.ndarray]):
+        self.gray = gray
+        self.mask = mask
+        self.gray_hist = _gray_histogram(gray, mask)
+        self.color_hist = _color_histogram(bgr, mask) if bgr is not None else None
+
+        edges = cv2.Canny(gray, 50, 150)
+        if mask is not None:
+            edges[mask == 0] = 0
+        self.edge_count = int(np.count_nonzero(edges))
+        self.edges = cv2.dilate(edges, np.ones((3, 3), np.uint8)) > 0
+
+        self.gray_f = gray.astype(np.float32)
+        self.mu = cv2.blur(self.gray_f, _SSIM_WINDOW)
+        self.sigma_sq = cv2.blur(self.gray_f * self.gray_f, _SSIM_WINDOW) - self.mu * self.mu
+
+
+class VerificationResult:
+    """驗證結果
+
+    屬性：
+        score: 加權平均分數（0-1），沒有完成任何項目時為 None
+        metrics: 已完成的項目 {'hist': ..., 'edge': ..., 'ssim': ...}
+        elapsed_ms: 驗證耗時
+        partial: 是否因超過時間預算而略過部分項目
+    """
+    __slots__ = ('score', 'metrics', 'elapsed_ms', 'partial')
+
+    def __init__(self, metrics: Dict[str, float], elapsed_ms: float, partial: bool):
+        self.metrics = metrics
+        self.elapsed_ms = elapsed_ms
+        self.partial = partial
+        total_weight = sum(WEIGHTS[name] for name in metrics)
+        self.score = (sum(value * WEIGHTS[name] for name, value in metrics.items()) / total_weight
+                      if total_weight else None)
+
+
+class MatchVerifier:
+    """模板匹配結果驗證器"""
+
+    def __init__(self, budget_ms: Optional[float] = 20.0):
+        """初始化驗證器
+
+        Args:
+            budget_ms: 每次驗證的時間預算（毫秒），None = 不限制
+        """
+        self.budget_ms = budget_ms
+        # 模板被模板庫淘汰後，統計也跟著釋放
+        self._stats: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+    def template_stats(self, entry, scale: float) -> _TemplateStats:
+        """取得（必要時計算）模板在指定尺度的統計"""
+        per_scale = self._stats.get(entry)
+        if per_scale is None:
+            per_scale = {}
+            self._stats[entry] = per_scale
+        stats = per_scale.get(scale)
+        if stats is None:
+            gray, mask = entry.variant(scale)
+            bgr = entry.bgr
+            if bgr.shape[:2] != gray.shape[:2]:
+                bgr = cv2.resize(bgr, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_CUBIC)
+            stats = _TemplateStats(gray, mask, bgr)
+            per_scale[scale] = stats
+        return stats
+
+    def verify(self, entry, scale: float, region_gray: np.ndarray, region_bgr: Optional[np.ndarray] = None,
+               budget_ms: Optional[float] = None) -> VerificationResult:
+        """驗證截圖區域是否與模板相符
+
+        Args:
+            entry: 模板庫的 CompiledTemplate
+            scale: 匹配到的尺度
+            region_gray: 截圖中匹配到的區域（灰階，大小與該尺度的模板相同）
+            region_bgr: 同一區域的彩色版本（BGR），None = 只用灰階比較直方圖
+            budget_ms: 本次的時間預算，None = 使用預設值
+
+        Returns:
+            VerificationResult
+        """
+        start = time.perf_counter()
+        budget = self.budget_ms if budget_ms is None else budget_ms
+        stats = self.template_stats(entry, scale)
+        if region_gray.shape[:2] != stats.gray.shape[:2]:
+            raise ValueError(f"區域大小 {region_gray.shape[:2]} 與模板 {stats.gray.shape[:2]} 不符")
+
+        metrics: Dict[str, float] = {}
+
+        def over_budget() -> bool:
+            return budget is not None and (time.perf_counter() - start) * 1000 >= budget
+
+        # 1. 直方圖（彩色截圖與彩色模板比較，否則灰階對灰階）
+        if region_bgr is not None and stats.color_hist is not None:
+            metrics['hist'] = _normalized_correlation(stats.color_hist, _color_histogram(region_bgr, stats.mask))
+        else:
+            metrics['hist'] = _normalized_correlation(stats.gray_hist, _gray_histogram(region_gray, stats.mask))
+
+        # 2. 邊緣重疊率
+        if not over_budget():
+            edges = cv2.Canny(region_gray, 50, 150)
+            if stats.mask is not None:
+                edges[stats.mask == 0] = 0
+            region_count = int(np.count_nonzero(edges))
+            denom = max(region_count, stats.edge_count)
+            metrics['edge'] = float(np.count_nonzero(stats.edges[edges > 0])) / denom if denom else 1.0
+
+        # 3. SSIM（模板端平均值與變異數已預先計算）
+        if not over_budget():
+            metrics['ssim'] = self._ssim(stats, region_gray)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        return VerificationResult(metrics, elapsed, partial=len(metrics) < len(WEIGHTS))
+
+    @staticmethod
+    def _ssim(stats: _TemplateStats, region_gray: np.ndarray) -> float:
+        """7x7 均勻視窗 SSIM，排除邊界 3 像素（與 skimage structural_similarity 預設一致）"""
+        y = region_gray.astype(np.float32)
+        mu_y = cv2.blur(y, _SSIM_WINDOW)
+        sigma_y = cv2.blur(y * y, _SSIM_WINDOW) - mu_y * mu_y
+        sigma_xy = cv2.blur(stats.gray_f * y, _SSIM_WINDOW) - stats.mu * mu_y
+
+        # skimage 使用樣本變異數（N / (N - 1)）
+        cov_norm = 49.0 / 48.0
+        sigma_x = stats.sigma_sq * cov_norm
+        sigma_y *= cov_norm
+        sigma_xy *= cov_norm
+
+        numerator = (2 * stats.mu * mu_y + _C1) * (2 * sigma_xy + _C2)
+        denominator = (stats.mu * stats.mu + mu_y * mu_y + _C1) * (sigma_x + sigma_y + _C2)
+        ssim_map = numerator / denominator
+
+        pad = 3
+        if ssim_map.shape[0] > 2 * pad and ssim_map.shape[1] > 2 * pad:
+            ssim_map = ssim_map[pad:-pad, pad:-pad]
+        return float(ssim_map.mean())
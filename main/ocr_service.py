@@ -0,0 +1,291 @@
+"""
+OCRService - 全程式共用的 OCR 服務
+OCR 引擎只偵測、初始化一次，並保留常駐的工作執行緒（每個執行緒各自一個已初始化的 OCRTrigger），
+取代每個 OCR 事件都建立新的 OCRTrigger（重新偵測引擎、重新匯入 pytesseract / winrt、重複輸出訊息）
+
+特性：
+- 引擎偵測結果在程序內共用，迴圈中的 OCR 步驟不再重複支付啟動成本
+- 工作執行緒數量有上限，同時要求辨識的執行緒再多也不會同時建立多個引擎
+- 每個工作執行緒保留自己的 OCRTrigger（Windows OCR 的事件迴圈與 OcrEngine 重複使用）
+- recognize() / wait_for_text() 可從任何執行緒呼叫
+- 所有工作執行緒共用一個 OCR 結果快取，截圖內容沒有變化時不重新辨識
+- Tesseract 的全螢幕辨識交給共用的 TiledOCR，分塊後以程序池平行辨識（隨 CPU 核心數加速）
+- 辨識結果以單字方框索引 (TextIndex) 保留，max_age 內的多次文字查詢共用同一次辨識，
+  全螢幕的索引也能回答範圍內的查詢
+- 每次辨識可指定 OCR 前處理管線（pipeline="text" 等），不同管線的結果分開保留
+
+使用方式:
+    from ocr_service import get_ocr_service
+
+    ocr = get_ocr_service()
+    if ocr.is_available():
+        text = ocr.recognize((0, 0, 400, 300))
+        found = ocr.wait_for_text("確認", timeout=10)
+        pos = ocr.find_text_position("開始", max_age=0.5)   # 0.5 秒內的辨識結果可直接沿用
+        hp = ocr.recognize((20, 20, 200, 50), pipeline="small")  # 小字先放大、二值化再辨識
+    print(ocr.stats())
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple, Union
+
+from ocr_cache import OCRResultCache
+from ocr_preprocess import PIPELINES, OCRPipeline, get_pipeline
+from ocr_tiling import TiledOCR
+from ocr_trigger import OCRTrigger
+from text_index import TextBox, TextIndex
+
+Region = Tuple[int, int, int, int]
+
+# 保留的文字索引數量（不同範圍各一個）
+MAX_INDEXES = 8
+
+
+class OCRService:
+    """共用 OCR 服務（執行緒安全）"""
+
+    def __init__(self, engine: str = "auto", max_workers: int = 2,
+                 trigger_factory: Optional[Callable[[str], OCRTrigger]] = None):
+        """
+        Args:
+            engine: OCR 引擎（"auto" / "windows" / "tesseract"，同 OCRTrigger）
+            max_workers: 工作執行緒數量（同時進行的辨識上限）
+            trigger_factory: 建立工作執行緒 OCRTrigger 的函式 factory(engine)，None = OCRTrigger
+        """
+        self.cache = OCRResultCache()  # 所有工作執行緒共用的 OCR 結果快取
+        self.tiler = TiledOCR()  # 所有工作執行緒共用的分塊辨識程序池（第一次分塊辨識時才建立）
+        self._factory = trigger_factory or (lambda name: OCRTrigger(ocr_engine=name, cache=self.cache,
+                                                                    tiler=self.tiler))
+        # 在建立服務時偵測一次引擎，工作執行緒直接使用偵測到的引擎
+        probe = self._factory(engine)
+        self.engine = probe.get_engine_name()
+        self._available = probe.is_available()
+        self.max_workers = max(1, int(max_workers))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._indexes: 'OrderedDict[tuple, TextIndex]' = OrderedDict()  # {(辨識範圍, 前處理管線): 最近一次的索引}
+
+        # 統計
+        self.workers = 0
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.index_hits = 0
+
+    def is_available(self) -> bool:
+        """OCR 引擎是否可用"""
+        return self._available
+
+    def get_engine_name(self) -> str:
+        """取得使用中的引擎名稱"""
+        return self.engine
+
+    # ==================== 工作執行緒 ====================
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="OCR")
+            return self._executor
+
+    def _worker(self) -> OCRTrigger:
+        """目前工作執行緒的 OCRTrigger（第一次使用時建立，之後保持常駐）"""
+        trigger = getattr(self._local, 'trigger', None)
+        if trigger is None:
+            trigger = self._local.trigger = self._factory(self.engine)
+            with self._lock:
+                self.workers += 1
+        return trigger
+
+    def _run(self, func: Callable[[OCRTrigger], object]):
+        """在工作執行緒執行 func(trigger) 並等待結果"""
+        if not self._available:
+            raise NotImplementedError("OCR 功能未啟用。請安裝 pytesseract 或確認 Windows 10+ 環境。")
+        start = time.perf_counter()
+        try:
+            return self._pool().submit(lambda: func(self._worker())).result()
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.calls += 1
+                self.total_ms += (time.perf_counter() - start) * 1000
+
+    def warm_up(self) -> None:
+        """預先建立所有工作執行緒的 OCRTrigger（可在程式啟動後於背景呼叫）"""
+        if not self._available:
+            return
+        barrier = threading.Barrier(self.max_workers)
+
+        def init():
+            self._worker()
+            try:
+                # 等待其他工作執行緒，確保每個執行緒各自初始化一次
+                barrier.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+
+        futures = [self._pool().submit(init) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+
+    # ==================== 辨識 ====================
+
+    def recognize(self, region: Optional[Region] = None, pipeline: Union[str, OCRPipeline, None] = None) -> str:
+        """辨識螢幕文字
+
+        Args:
+            region: 截取區域 (left, top, right, bottom)，None = 全螢幕
+            pipeline: OCR 前處理管線（名稱或 OCRPipeline），None = 直接辨識截圖
+
+        Returns:
+            辨識到的文字
+        """
+        pipeline = get_pipeline(pipeline)
+        return self._run(lambda trigger: trigger.recognize_text(region, pipeline))
+
+    def recognize_boxes(self, region: Optional[Region] = None,
+                        pipeline: Union[str, OCRPipeline, None] = None) -> TextIndex:
+        """辨識螢幕文字並回傳單字方框的索引（每次都重新辨識，結果保留供 text_index 沿用）"""
+        key = tuple(region) if region else None
+        pipeline = get_pipeline(pipeline)
+        index = self._run(lambda trigger: trigger.recognize_boxes(key, pipeline))
+        slot = (key, pipeline.name if pipeline else None)
+        with self._lock:
+            self._indexes[slot] = index
+            self._indexes.move_to_end(slot)
+            while len(self._indexes) > MAX_INDEXES:
+                self._indexes.popitem(last=False)
+        return index
+
+    def text_index(self, region: Optional[Region] = None, max_age: float = 0.0,
+                   pipeline: Union[str, OCRPipeline, None] = None) -> TextIndex:
+        """取得範圍的文字索引，max_age 秒內的辨識結果（相同範圍或涵蓋此範圍、相同前處理管線）直接沿用
+
+        Args:
+            region: 截取區域，None = 全螢幕
+            max_age: 可沿用的最長時間（秒），0 = 一定重新辨識
+            pipeline: OCR 前處理管線，None = 直接辨識截圖
+        """
+        key = tuple(region) if region else None
+        pipeline = get_pipeline(pipeline)
+        name = pipeline.name if pipeline else None
+        if max_age > 0:
+            with self._lock:
+                candidates = [index for (_, slot_name), index in reversed(self._indexes.items())
+                              if slot_name == name and index.covers(key) and index.age <= max_age]
+                if candidates:
+                    self.index_hits += 1
+            if candidates:
+                return candidates[0].within(key)
+        return self.recognize_boxes(key, pipeline)
+
+    def find_text(self, target_text: str, region: Optional[Region] = None, match_mode: str = "contains",
+                  case_sensitive: bool = False, max_age: float = 0.0,
+                  pipeline: Union[str, OCRPipeline, None] = None) -> Optional[TextBox]:
+        """尋找文字，回傳命中範圍的方框（螢幕座標），找不到回傳 None"""
+        return self.text_index(region, max_age, pipeline).find_first(target_text, match_mode, case_sensitive)
+
+    def find_text_position(self, target_text: str, region: Optional[Region] = None, match_mode: str = "contains",
+                           case_sensitive: bool = False, max_age: float = 0.0,
+                           pipeline: Union[str, OCRPipeline, None] = None) -> Optional[Tuple[int, int]]:
+        """尋找文字在螢幕上的位置，回傳中心座標 (x, y)，找不到回傳 None"""
+        box = self.find_text(target_text, region, match_mode, case_sensitive, max_age, pipeline)
+        return box.center if box else None
+
+    def wait_for_text_box(self, target_text: str, timeout: float = 30.0, interval: float = 0.5,
+                          region: Optional[Region] = None, match_mode: str = "contains",
+                          case_sensitive: bool = False, should_stop: Optional[Callable[[], bool]] = None,
+                          max_age: float = 0.0,
+                          pipeline: Union[str, OCRPipeline, None] = None) -> Optional[TextBox]:
+        """等待螢幕出現特定文字，回傳命中範圍的方框
+
+        Args:
+            target_text: 要尋找的文字
+            timeout: 超時時間（秒）
+            interval: 檢查間隔（秒）
+            region: 截取區域，None = 全螢幕
+            match_mode: "contains" / "exact" / "regex"
+            case_sensitive: 是否區分大小寫
+            should_stop: 回傳 True 時提前結束等待（例如回放已停止）
+            max_age: 第一次檢查可沿用的辨識結果時間（秒），之後每次都重新辨識
+            pipeline: OCR 前處理管線（名稱或 OCRPipeline），None = 直接辨識截圖
+
+        Returns:
+            TextBox，逾時或提前結束時回傳 None
+        """
+        pipeline = get_pipeline(pipeline)  # 名稱錯誤時在開始等待前就回報
+        deadline = time.monotonic() + timeout
+        age = max_age
+        while True:
+            try:
+                box = self.text_index(region, age, pipeline).find_first(target_text, match_mode, case_sensitive)
+                if box is not None:
+                    return box
+            except NotImplementedError:
+                raise
+            except Exception as e:
+                print(f"⚠️ OCR 辨識錯誤: {e}")
+            age = 0.0
+            if time.monotonic() + interval >= deadline or (should_stop and should_stop()):
+                return None
+            time.sleep(interval)
+
+    def wait_for_text(self, target_text: str, timeout: float = 30.0, interval: float = 0.5,
+                      region: Optional[Region] = None, match_mode: str = "contains",
+                      case_sensitive: bool = False, should_stop: Optional[Callable[[], bool]] = None,
+                      max_age: float = 0.0, pipeline: Union[str, OCRPipeline, None] = None) -> bool:
+        """等待螢幕出現特定文字（參數同 wait_for_text_box）
+
+        Returns:
+            是否找到文字
+        """
+        return self.wait_for_text_box(target_text, timeout, interval, region, match_mode,
+                                      case_sensitive, should_stop, max_age, pipeline) is not None
+
+    def stats(self) -> dict:
+        """取得統計（workers = 已初始化的工作執行緒數，avg_ms = 每次辨識平均耗時，
+        index_hits = 沿用既有文字索引、不需要重新辨識的查詢次數，cache = 截圖內容快取的命中率，
+        tiles = 分塊辨識的區塊統計，pipelines = 各前處理管線的耗時與交給 OCR 的像素比例）"""
+        with self._lock:
+            return {
+                'engine': self.engine,
+                'available': self._available,
+                'workers': self.workers,
+                'calls': self.calls,
+                'errors': self.errors,
+                'avg_ms': self.total_ms / self.calls if self.calls else 0.0,
+                'index_hits': self.index_hits,
+                'cache': self.cache.stats(),
+                'tiles': self.tiler.stats(),
+                'pipelines': {name: pipeline.stats() for name, pipeline in PIPELINES.items()},
+            }
+
+    def shutdown(self) -> None:
+        """停止工作執行緒與分塊辨識程序池（之後呼叫時自動重新建立）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self.tiler.shutdown()
+
+
+# ==================== 共用實例 ====================
+
+_shared_service: Optional[OCRService] = None
+_shared_lock = threading.Lock()
+
+
+def get_ocr_service() -> OCRService:
+    """取得全程式共用的 OCR 服務（第一次呼叫時偵測引擎）"""
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            _shared_service = OCRService()
+        return _shared_service
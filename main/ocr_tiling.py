@@ -0,0 +1,360 @@
+"""
+OCRTiling - 分塊平行 OCR（全螢幕文字辨識用）
+將截圖切成互相重疊的區塊，略過空白或內容未改變的區塊，其餘區塊以程序池平行交給 tesseract，
+再合併各區塊的單字方框並去除接縫處重複的結果。全螢幕的文字條件可隨 CPU 核心數加速
+
+特性：
+- 區塊之間重疊 overlap 像素（預設為區塊高度的 1/4，前處理放大時依倍率放大）
+- 碰到內側邊緣（可能被切斷）的單字與相鄰區塊完整辨識的結果重疊時捨棄；
+  比重疊範圍還寬、兩邊都被切斷的單字保留片段，不會整個消失
+- 空白區塊（灰階標準差低於門檻）不辨識
+- 與上一次相同位置的區塊內容未改變時，直接沿用上次的單字方框（依最近使用保留，多個範圍交替辨識也能沿用）
+- 合併後依位置重新分行（跨區塊的同一行文字會合併為一行）
+- 程序池在第一次使用時建立並保持常駐；子程序只需要 pytesseract，不載入主程式
+
+使用方式:
+    from ocr_tiling import TiledOCR
+
+    tiler = TiledOCR(tile_size=(800, 600))
+    words = tiler.recognize(screen_rgb, offset=(0, 0))   # [TextBox, ...]
+    print(tiler.stats())
+"""
+
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from text_index import TextBox, boxes_from_tesseract
+
+Region = Tuple[int, int, int, int]
+
+# 接縫去重：兩個相同文字的方框重疊率超過此值視為同一個單字
+SEAM_IOU = 0.5
+
+# 被切斷的單字有此比例的面積落在其他單字內時，視為同一個單字的片段
+SEAM_COVER = 0.5
+
+# 未指定 overlap 時，區塊重疊為區塊高度的此比例
+AUTO_OVERLAP_RATIO = 0.25
+
+
+def tesseract_tile(pixels: np.ndarray, lang: str = 'chi_tra+eng', tesseract_cmd: Optional[str] = None) -> dict:
+    """在子程序辨識一個區塊（需為模組層級函式才能傳給程序池）
+
+    Args:
+        pixels: 區塊的 RGB 或灰階陣列
+        lang: tesseract 語言
+        tesseract_cmd: tesseract 執行檔路徑（主程序有設定時傳入），None = 預設
+
+    Returns:
+        pytesseract.image_to_data 的字典結果
+    """
+    import pytesseract
+    from PIL import Image
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    return pytesseract.image_to_data(Image.fromarray(pixels), lang=lang, output_type=pytesseract.Output.DICT)
+
+
+def tile_grid(width: int, height: int, tile_size: Tuple[int, int], overlap: int) -> List[Region]:
+    """將 width x height 切成互相重疊的區塊
+
+    Returns:
+        [(x1, y1, x2, y2), ...]（由上到下、由左到右）
+    """
+    tile_w, tile_h = max(1, tile_size[0]), max(1, tile_size[1])
+    step_x, step_y = max(1, tile_w - overlap), max(1, tile_h - overlap)
+
+    def starts(total, tile, step):
+        if total <= tile:
+            return [0]
+        positions = list(range(0, total - tile, step))
+        positions.append(total - tile)  # 最後一塊貼齊邊緣
+        return positions
+
+    return [(x, y, min(width, x + tile_w), min(height, y + tile_h))
+            for y in starts(height, tile_h, step_y)
+            for x in starts(width, tile_w, step_x)]
+
+
+def _iou(a: TextBox, b: TextBox) -> float:
+    x1, y1 = max(a.x, b.x), max(a.y, b.y)
+    x2, y2 = min(a.x + a.width, b.x + b.width), min(a.y + a.height, b.y + b.height)
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a.width * a.height + b.width * b.height - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _covered(part: TextBox, other: TextBox) -> float:
+    """part 的面積有多少比例落在 other 內"""
+    x1, y1 = max(part.x, other.x), max(part.y, other.y)
+    x2, y2 = min(part.x + part.width, other.x + other.width), min(part.y + part.height, other.y + other.height)
+    area = part.width * part.height
+    return max(0, x2 - x1) * max(0, y2 - y1) / area if area > 0 else 1.0
+
+
+def merge_tile_words(words: List[TextBox], partial: Sequence[TextBox] = ()) -> List[TextBox]:
+    """去除接縫處重複的單字（相同文字且高度重疊時保留信心度較高者），並依位置重新分行
+
+    Args:
+        words: 完整落在區塊內的單字
+        partial: 碰到區塊內側邊緣（可能被切斷）的單字；落在已保留的單字內時捨棄，否則保留（較寬者優先）
+
+    Returns:
+        單字方框（由上到下、由左到右，line 為重新分配的行號）
+    """
+    kept: List[TextBox] = []
+    for word in sorted(words, key=lambda w: -w.confidence):
+        if any(other.text == word.text and _iou(other, word) >= SEAM_IOU for other in kept):
+            continue
+        kept.append(word)
+    for word in sorted(partial, key=lambda w: -w.width):
+        if any(_covered(word, other) >= SEAM_COVER for other in kept):
+            continue
+        kept.append(word)
+
+    # 依垂直中心分列：中心落在目前這列平均高度一半以內的單字屬於同一列
+    kept.sort(key=lambda w: (w.y + w.height / 2, w.x))
+    rows: List[List[TextBox]] = []
+    for word in kept:
+        center = word.y + word.height / 2
+        if rows:
+            row = rows[-1]
+            row_center = sum(w.y + w.height / 2 for w in row) / len(row)
+            row_height = sum(w.height for w in row) / len(row)
+            if abs(center - row_center) <= row_height / 2:
+                row.append(word)
+                continue
+        rows.append([word])
+
+    # 同一列內水平距離超過兩倍字高視為不同行（例如並排的兩個按鈕）
+    merged = []
+    line_number = 0
+    for row in rows:
+        row.sort(key=lambda w: w.x)
+        previous = None
+        for word in row:
+            if previous is not None and word.x - (previous.x + previous.width) > 2 * max(previous.height, word.height):
+                line_number += 1
+            word.line = line_number
+            merged.append(word)
+            previous = word
+        line_number += 1
+    return merged
+
+
+class TiledOCR:
+    """分塊平行 OCR（執行緒安全）"""
+
+    def __init__(self, tile_size: Tuple[int, int] = (800, 600), overlap: Optional[int] = None,
+                 max_workers: Optional[int] = None, lang: str = 'chi_tra+eng',
+                 blank_std: float = 4.0, min_area: int = 1280 * 720, use_processes: bool = True,
+                 tile_ocr: Callable[..., dict] = tesseract_tile, max_cached_tiles: int = 256):
+        """
+        Args:
+            tile_size: 區塊大小（寬, 高）
+            overlap: 相鄰區塊重疊的像素數（原始截圖的像素；大於最長的單字寬度時不會產生片段），
+                None = 區塊高度的 AUTO_OVERLAP_RATIO
+            max_workers: 平行辨識的程序數，None = CPU 核心數
+            lang: tesseract 語言
+            blank_std: 灰階標準差低於此值的區塊視為空白
+            min_area: 截圖面積達到此值才分塊（較小的範圍直接整張辨識較快）
+            use_processes: True = 程序池，False = 執行緒池（tesseract 以外部程式執行時也能平行）
+            tile_ocr: 區塊辨識函式 tile_ocr(pixels, lang, tesseract_cmd) -> image_to_data 字典
+                （使用程序池時需為模組層級函式）
+            max_cached_tiles: 保留上次辨識結果的區塊數量上限（超過時淘汰最久未使用的區塊）
+        """
+        self.tile_size = tile_size
+        if overlap is None:
+            overlap = int(tile_size[1] * AUTO_OVERLAP_RATIO)
+        self.overlap = max(0, int(overlap))
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.lang = lang
+        self.blank_std = blank_std
+        self.min_area = min_area
+        self.use_processes = use_processes
+        self.tile_ocr = tile_ocr
+        self.max_cached_tiles = max_cached_tiles
+        self._executor: Optional[Executor] = None
+        # {區塊螢幕座標: (內容雜湊, 完整單字, 被切斷的單字)}，依最近使用排序
+        self._previous: 'OrderedDict[Region, Tuple[int, List[TextBox], List[TextBox]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計
+        self.calls = 0
+        self.tiles = 0
+        self.blank = 0
+        self.unchanged = 0
+        self.recognized = 0
+        self.total_ms = 0.0
+
+    def should_tile(self, width: int, height: int) -> bool:
+        """此大小的截圖是否值得分塊"""
+        return width * height >= self.min_area and (width > self.tile_size[0] or height > self.tile_size[1])
+
+    def _pool(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="OCRTile")
+            return self._executor
+
+    def _discard_pool(self, executor: Executor) -> None:
+        """丟棄子程序已當掉的程序池（下次使用時重新建立）"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _tesseract_cmd() -> Optional[str]:
+        """主程序設定的 tesseract 執行檔路徑（子程序不會繼承模組設定）"""
+        try:
+            import pytesseract
+            return pytesseract.pytesseract.tesseract_cmd
+        except ImportError:
+            return None
+
+    def overlap_for(self, scale: float = 1.0) -> int:
+        """放大 scale 倍的影像使用的區塊重疊（最多區塊短邊的一半）"""
+        return min(int(self.overlap * max(1.0, scale)), min(self.tile_size) // 2)
+
+    def recognize(self, pixels: np.ndarray, offset: Tuple[int, int] = (0, 0), scale: float = 1.0) -> List[TextBox]:
+        """分塊辨識截圖
+
+        Args:
+            pixels: 截圖（RGB 或灰階陣列）
+            offset: 截圖左上角的螢幕座標
+            scale: 截圖經前處理放大的倍率（PreprocessResult.scale），區塊重疊依此放大
+
+        Returns:
+            單字方框（螢幕座標）
+
+        Raises:
+            BrokenProcessPool: 辨識子程序當掉（程序池已丟棄，下次呼叫時重新建立）
+        """
+        start = time.perf_counter()
+        pixels = np.ascontiguousarray(pixels)
+        height, width = pixels.shape[:2]
+        if pixels.ndim == 3:
+            gray = cv2.cvtColor(pixels, cv2.COLOR_RGBA2GRAY if pixels.shape[2] == 4 else cv2.COLOR_RGB2GRAY)
+        else:
+            gray = pixels
+        dx, dy = offset
+
+        words: List[TextBox] = []
+        partial: List[TextBox] = []
+        pending = []  # (區塊, 區塊螢幕座標, 內容雜湊, future)
+        tesseract_cmd = self._tesseract_cmd() if self.tile_ocr is tesseract_tile else None
+        blank = unchanged = 0
+        tiles = tile_grid(width, height, self.tile_size, self.overlap_for(scale))
+        pool: Optional[Executor] = None  # 這次呼叫使用的程序池（當掉時只丟棄這一個）
+
+        try:
+            for tile in tiles:
+                x1, y1, x2, y2 = tile
+                screen_tile = (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+                _, std = cv2.meanStdDev(gray[y1:y2, x1:x2])
+                if float(std[0][0]) < self.blank_std:
+                    blank += 1
+                    continue
+                block = np.ascontiguousarray(pixels[y1:y2, x1:x2])
+                digest = zlib.crc32(memoryview(block).cast('B'))
+                with self._lock:
+                    previous = self._previous.get(screen_tile)
+                    if previous is not None:
+                        self._previous.move_to_end(screen_tile)
+                if previous is not None and previous[0] == digest:
+                    unchanged += 1
+                    words.extend(previous[1])
+                    partial.extend(previous[2])
+                    continue
+                if pool is None:
+                    pool = self._pool()
+                future = pool.submit(self.tile_ocr, block, self.lang, tesseract_cmd)
+                pending.append((tile, screen_tile, digest, future))
+
+            for tile, screen_tile, digest, future in pending:
+                x1, y1, x2, y2 = tile
+                inside, cut = self._split_inside(boxes_from_tesseract(future.result(), (x1 + dx, y1 + dy)),
+                                                 screen_tile, (dx, dy, dx + width, dy + height))
+                with self._lock:
+                    self._previous[screen_tile] = (digest, inside, cut)
+                    self._previous.move_to_end(screen_tile)
+                    while len(self._previous) > self.max_cached_tiles:
+                        self._previous.popitem(last=False)
+                words.extend(inside)
+                partial.extend(cut)
+        except BrokenProcessPool:
+            # 子程序當掉後整個程序池都無法使用，丟棄後下次呼叫重新建立
+            if pool is not None:
+                self._discard_pool(pool)
+            raise
+
+        with self._lock:
+            self.calls += 1
+            self.tiles += len(tiles)
+            self.blank += blank
+            self.unchanged += unchanged
+            self.recognized += len(pending)
+            self.total_ms += (time.perf_counter() - start) * 1000
+
+        # 重新建立方框（沿用的單字也會被重新分行，避免修改上次的結果）
+        def copy(boxes):
+            return [TextBox(w.text, w.x, w.y, w.width, w.height, w.confidence) for w in boxes]
+        return merge_tile_words(copy(words), copy(partial))
+
+    @staticmethod
+    def _split_inside(words: List[TextBox], tile: Region, bounds: Region) -> Tuple[List[TextBox], List[TextBox]]:
+        """分出碰到區塊內側邊緣（可能被切斷）的單字；截圖外緣的單字視為完整
+
+        Returns:
+            (完整的單字, 碰到內側邊緣的單字)
+        """
+        margin = 2
+        x1, y1, x2, y2 = tile
+        left = x1 > bounds[0]
+        top = y1 > bounds[1]
+        right = x2 < bounds[2]
+        bottom = y2 < bounds[3]
+        inside, cut = [], []
+        for word in words:
+            if ((left and word.x <= x1 + margin) or (top and word.y <= y1 + margin)
+                    or (right and word.x + word.width >= x2 - margin)
+                    or (bottom and word.y + word.height >= y2 - margin)):
+                cut.append(word)
+            else:
+                inside.append(word)
+        return inside, cut
+
+    def stats(self) -> dict:
+        """取得統計（skipped_ratio = 空白或未改變而略過的區塊比例）"""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'tiles': self.tiles,
+                'blank': self.blank,
+                'unchanged': self.unchanged,
+                'recognized': self.recognized,
+                'skipped_ratio': (self.blank + self.unchanged) / self.tiles if self.tiles else 0.0,
+                'avg_ms': self.total_ms / self.calls if self.calls else 0.0,
+                'workers': self.max_workers,
+                'mode': 'process' if self.use_processes else 'thread',
+            }
+
+    def shutdown(self) -> None:
+        """關閉程序池（之後使用時自動重新建立）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -1,15 +1,17 @@
 """
-OCRTrigger - OCR 文字觸發系統（預留介面）
+OCRTrigger - OCR 文字觸發系統
 允許腳本等待螢幕出現特定文字後再執行後續動作
 
-預期功能：
+功能：
 - 截取螢幕區域
 - OCR 辨識文字
 - 等待特定文字出現
 - 支援模糊匹配與正則表達式
+- 辨識結果的單字方框（位置、信心度）整理為 TextIndex，可查詢文字的螢幕座標
+- Tesseract 辨識大範圍（例如全螢幕）時可交給 TiledOCR 分塊平行辨識
+- 可選擇 OCR 前處理管線（灰階、二值化、放大、裁切），前處理結果與 OCR 結果一起快取
 
 目前狀態：
-- 提供基礎介面
 - 可選擇使用 pytesseract 或 Windows Runtime OCR
 - 若無 OCR 套件，回傳 NotImplementedError
 
@@ -21,11 +23,45 @@ OCRTrigger - OCR 文字觸發系統（預留介面）
         print("找到文字！")
 """
 
+import threading
 import time
-from typing import Optional, Tuple, List
-from PIL import ImageGrab
+from typing import Dict, Optional, Tuple, List, Union
 import re
 
+import numpy as np
+from PIL import Image
+
+from frame_bus import capture
+from text_index import TextBox, TextIndex, boxes_from_tesseract
+from ocr_cache import OCRResultCache, frame_hash
+from ocr_preprocess import OCRPipeline, PreprocessResult, get_pipeline
+from ocr_tiling import TiledOCR
+
+# 引擎偵測結果（每個程序只偵測一次：{引擎名稱: 是否可用}）
+_engine_probes: Dict[str, bool] = {}
+_probe_lock = threading.Lock()
+
+
+def text_matches(text: str, target_text: str, match_mode: str = "contains", case_sensitive: bool = False) -> bool:
+    """辨識結果是否符合目標文字
+
+    Args:
+        text: 辨識到的文字
+        target_text: 要尋找的文字
+        match_mode: "contains"（包含）/ "exact"（完全相同）/ "regex"（正則表達式）
+        case_sensitive: 是否區分大小寫
+    """
+    if not case_sensitive:
+        text = text.lower()
+        target_text = target_text.lower()
+    if match_mode == "contains":
+        return target_text in text
+    if match_mode == "exact":
+        return text.strip() == target_text.strip()
+    if match_mode == "regex":
+        return re.search(target_text, text) is not None
+    return False
+
 
 class OCRTrigger:
     """OCR 文字觸發器
@@ -36,7 +72,8 @@ class OCRTrigger:
     - 支援全螢幕或指定區域
     """
     
-    def __init__(self, ocr_engine: str = "auto"):
+    def __init__(self, ocr_engine: str = "auto", cache: Optional[OCRResultCache] = None,
+                 tiler: Optional[TiledOCR] = None):
         """初始化 OCR 觸發器
         
         Args:
@@ -45,10 +82,17 @@ class OCRTrigger:
                 - "tesseract": 使用 pytesseract
                 - "windows": 使用 Windows Runtime OCR
                 - "none": 不使用 OCR（僅預留介面）
+            cache: OCR 結果快取（截圖內容相同時不重新辨識），None = 建立此觸發器專用的快取
+            tiler: 分塊平行辨識（只用於 Tesseract 的大範圍截圖），None = 整張辨識
         """
+        self.cache = cache if cache is not None else OCRResultCache()
+        self.tiler = tiler
         self.ocr_engine = ocr_engine
         self._ocr_available = False
         self._ocr_function = None
+        self._boxes_function = None
+        self._loop = None  # Windows OCR 使用的事件迴圈（每個實例一個，可在任何執行緒使用）
+        self._windows_engine = None  # Windows OcrEngine（第一次辨識時建立後重複使用）
         
         # 嘗試初始化 OCR 引擎
         self._initialize_ocr(ocr_engine)
@@ -66,11 +110,28 @@ class OCRTrigger:
             self._try_load_engine(engine)
     
     def _try_load_engine(self, engine: str) -> bool:
-        """嘗試載入指定引擎
+        """嘗試載入指定引擎（偵測結果在程序內共用，之後建立的觸發器不再重新偵測）
         
         Returns:
             是否成功載入
         """
+        with _probe_lock:
+            known = _engine_probes.get(engine)
+            if known is None:
+                known = _engine_probes[engine] = self._probe_engine(engine)
+            elif known:
+                self._bind_engine(engine)
+        return known
+    
+    def _bind_engine(self, engine: str) -> None:
+        """使用已確認可用的引擎"""
+        self._ocr_function = self._ocr_windows if engine == "windows" else self._ocr_tesseract
+        self._boxes_function = self._boxes_windows if engine == "windows" else self._boxes_tesseract
+        self._ocr_available = True
+        self.ocr_engine = engine
+    
+    def _probe_engine(self, engine: str) -> bool:
+        """實際偵測引擎是否可用（每個引擎只執行一次）"""
         if engine == "windows":
             try:
                 # Windows Runtime OCR (需要 Python 3.7+ 和 Windows 10+)
@@ -80,9 +141,7 @@ class OCRTrigger:
                     from winrt.windows.media.ocr import OcrEngine
                     from winrt.windows.graphics.imaging import BitmapDecoder, SoftwareBitmap
                     from winrt.windows.storage.streams import InMemoryRandomAccessStream
-                    self._ocr_function = self._ocr_windows
-                    self._ocr_available = True
-                    self.ocr_engine = "windows"
+                    self._bind_engine("windows")
                     print("✅ OCR: 使用 Windows Runtime 引擎 (內建)")
                     return True
                 except ImportError:
@@ -93,22 +152,16 @@ class OCRTrigger:
         elif engine == "tesseract":
             try:
                 import pytesseract
-                self._ocr_function = self._ocr_tesseract
-                self._ocr_available = True
-                self.ocr_engine = "tesseract"
+                self._bind_engine("tesseract")
                 print("✅ OCR: 使用 Tesseract 引擎")
                 return True
             except ImportError:
                 pass
         
         return False
-            except Exception:
-                pass
-        
-        elif engine == "tesseract":
     
-    def _ocr_tesseract(self, image) -> str:
-        """使用 Tesseract 辨識圖片"""
+    def _ocr_tesseract(self, image) -> Optional[str]:
+        """使用 Tesseract 辨識圖片（失敗時回傳 None，不寫入快取）"""
         try:
             import pytesseract
             # 支援繁體中文（需安裝 chi_tra 語言包）
@@ -116,53 +169,82 @@ class OCRTrigger:
             return text.strip()
         except Exception as e:
             print(f"⚠️ Tesseract OCR 失敗: {e}")
-            return ""
+            return None
     
-    def _ocr_windows(self, image) -> str:
-        """使用 Windows Runtime OCR 辨識圖片"""
+    def _boxes_tesseract(self, image, offset: Tuple[int, int]) -> Optional[List[TextBox]]:
+        """使用 Tesseract 辨識圖片，回傳單字方框（失敗時回傳 None）"""
         try:
-            import asyncio
-            from winrt.windows.media.ocr import OcrEngine
-            from winrt.windows.graphics.imaging import BitmapDecoder
-            from winrt.windows.storage.streams import InMemoryRandomAccessStream
-            from io import BytesIO
+            import pytesseract
+            data = pytesseract.image_to_data(image, lang='chi_tra+eng', output_type=pytesseract.Output.DICT)
+            return boxes_from_tesseract(data, offset)
+        except Exception as e:
+            print(f"⚠️ Tesseract OCR 失敗: {e}")
+            return None
+    
+    def _windows_recognize(self, image):
+        """使用 Windows Runtime OCR 辨識圖片，回傳 OcrResult"""
+        import asyncio
+        from winrt.windows.media.ocr import OcrEngine
+        from winrt.windows.graphics.imaging import BitmapDecoder
+        from winrt.windows.storage.streams import InMemoryRandomAccessStream
+        from io import BytesIO
+        
+        # 轉換 PIL Image 到 Windows Runtime
+        async def recognize():
+            # 將圖片轉為 bytes
+            buffer = BytesIO()
+            image.save(buffer, format='PNG')
+            buffer.seek(0)
             
-            # 轉換 PIL Image 到 Windows Runtime
-            async def recognize():
-                # 將圖片轉為 bytes
-                buffer = BytesIO()
-                image.save(buffer, format='PNG')
-                buffer.seek(0)
-                
-                # 創建 Stream
-                stream = InMemoryRandomAccessStream()
-                writer = stream.get_output_stream_at(0)
-                await writer.write_async(buffer.read())
-                await writer.flush_async()
-                
-                # 解碼圖片
-                decoder = await BitmapDecoder.create_async(stream)
-                bitmap = await decoder.get_software_bitmap_async()
-                
-                # OCR 辨識
-                engine = OcrEngine.try_create_from_user_profile_languages()
-                result = await engine.recognize_async(bitmap)
-                
-                return result.text
+            # 創建 Stream
+            stream = InMemoryRandomAccessStream()
+            writer = stream.get_output_stream_at(0)
+            await writer.write_async(buffer.read())
+            await writer.flush_async()
             
-            # 執行非同步函數
-            loop = asyncio.get_event_loop()
-            text = loop.run_until_complete(recognize())
-            return text.strip()
+            # 解碼圖片
+            decoder = await BitmapDecoder.create_async(stream)
+            bitmap = await decoder.get_software_bitmap_async()
+            
+            # OCR 辨識（引擎建立後重複使用）
+            if self._windows_engine is None:
+                self._windows_engine = OcrEngine.try_create_from_user_profile_languages()
+            return await self._windows_engine.recognize_async(bitmap)
+        
+        # 執行非同步函數（非主執行緒沒有預設事件迴圈，使用實例自己的迴圈）
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(recognize())
+    
+    def _ocr_windows(self, image) -> Optional[str]:
+        """使用 Windows Runtime OCR 辨識圖片（失敗時回傳 None）"""
+        try:
+            return self._windows_recognize(image).text.strip()
         except Exception as e:
             print(f"⚠️ Windows OCR 失敗: {e}")
-            return ""
+            return None
+    
+    def _boxes_windows(self, image, offset: Tuple[int, int]) -> Optional[List[TextBox]]:
+        """使用 Windows Runtime OCR 辨識圖片，回傳單字方框（引擎不提供信心度，固定為 1.0；失敗時回傳 None）"""
+        try:
+            result = self._windows_recognize(image)
+        except Exception as e:
+            print(f"⚠️ Windows OCR 失敗: {e}")
+            return None
+        dx, dy = offset
+        words = []
+        for line_number, line in enumerate(result.lines):
+            for word in line.words:
+                rect = word.bounding_rect
+                words.append(TextBox(word.text, round(rect.x) + dx, round(rect.y) + dy,
+                                     round(rect.width), round(rect.height), 1.0, line_number))
+        return words
     
     def capture_screen(
         self,
         region: Optional[Tuple[int, int, int, int]] = None
     ) -> 'PIL.Image.Image':
-        """截取螢幕
+        """截取螢幕（共用截圖匯流排執行中時取自最新畫面）
         
         Args:
             region: 截取區域 (left, top, right, bottom)
@@ -171,19 +253,18 @@ class OCRTrigger:
         Returns:
             PIL Image 物件
         """
-        if region:
-            return ImageGrab.grab(bbox=region)
-        else:
-            return ImageGrab.grab()
+        return capture(region)
     
     def recognize_text(
         self,
-        region: Optional[Tuple[int, int, int, int]] = None
+        region: Optional[Tuple[int, int, int, int]] = None,
+        pipeline: Union[str, OCRPipeline, None] = None
     ) -> str:
         """辨識螢幕文字
         
         Args:
             region: 截取區域，None = 全螢幕
+            pipeline: OCR 前處理管線（名稱或 OCRPipeline），None = 直接辨識截圖
         
         Returns:
             辨識到的文字
@@ -193,11 +274,30 @@ class OCRTrigger:
                 "OCR 功能未啟用。請安裝 pytesseract 或確認 Windows 10+ 環境。"
             )
         
+        pipeline = get_pipeline(pipeline)
+        
         # 截圖
+        captured_at = time.monotonic()
         image = self.capture_screen(region)
+        digest = frame_hash(image)
         
-        # 辨識
-        return self._ocr_function(image)
+        # 🔥 大範圍截圖分塊平行辨識，文字由單字方框組成（與 recognize_boxes 共用快取）
+        if self._should_tile(image):
+            return self._index_image(image, region, captured_at, pipeline, digest).text
+        
+        # 🔥 截圖內容與快取中的結果相同時直接回傳，不重新辨識（也不重新前處理）
+        key = self.cache.key(region, self._kind('text', pipeline), digest)
+        text = self.cache.get(key)
+        if text is not None:
+            return text
+        
+        # 前處理後辨識（找不到像文字的區域時不呼叫引擎）
+        prepared, result = self._prepare(image, region, digest, pipeline)
+        text = "" if result is not None and result.empty else self._ocr_function(prepared)
+        if text is None:
+            return ""
+        self.cache.put(key, text)
+        return text
     
     def wait_for_text(
         self,
@@ -206,7 +306,8 @@ class OCRTrigger:
         interval: float = 0.5,
         region: Optional[Tuple[int, int, int, int]] = None,
         match_mode: str = "contains",
-        case_sensitive: bool = False
+        case_sensitive: bool = False,
+        pipeline: Union[str, OCRPipeline, None] = None
     ) -> bool:
         """等待螢幕出現特定文字
         
@@ -220,6 +321,7 @@ class OCRTrigger:
                 - "exact": 完全相同
                 - "regex": 正則表達式
             case_sensitive: 是否區分大小寫
+            pipeline: OCR 前處理管線，None = 直接辨識截圖
         
         Returns:
             是否找到文字
@@ -234,25 +336,9 @@ class OCRTrigger:
         while time.time() - start_time < timeout:
             try:
                 # 辨識文字
-                text = self.recognize_text(region)
-                
-                # 大小寫處理
-                if not case_sensitive:
-                    text = text.lower()
-                    target = target_text.lower()
-                else:
-                    target = target_text
-                
-                # 匹配模式
-                if match_mode == "contains":
-                    if target in text:
-                        return True
-                elif match_mode == "exact":
-                    if text.strip() == target.strip():
-                        return True
-                elif match_mode == "regex":
-                    if re.search(target, text):
-                        return True
+                text = self.recognize_text(region, pipeline)
+                if text_matches(text, target_text, match_mode, case_sensitive):
+                    return True
                 
             except Exception as e:
                 print(f"⚠️ OCR 辨識錯誤: {e}")
@@ -262,25 +348,115 @@ class OCRTrigger:
         
         return False
     
+    def recognize_boxes(
+        self,
+        region: Optional[Tuple[int, int, int, int]] = None,
+        pipeline: Union[str, OCRPipeline, None] = None
+    ) -> TextIndex:
+        """辨識螢幕文字並回傳單字方框的索引
+        
+        Args:
+            region: 截取區域，None = 全螢幕
+            pipeline: OCR 前處理管線（名稱或 OCRPipeline），None = 直接辨識截圖
+        
+        Returns:
+            TextIndex（方框為螢幕座標）
+        """
+        if not self._ocr_available:
+            raise NotImplementedError(
+                "OCR 功能未啟用。請安裝 pytesseract 或確認 Windows 10+ 環境。"
+            )
+        
+        captured_at = time.monotonic()
+        return self._index_image(self.capture_screen(region), region, captured_at, get_pipeline(pipeline))
+    
+    @staticmethod
+    def _kind(kind: str, pipeline: Optional[OCRPipeline]) -> str:
+        """快取的結果種類（不同前處理管線的結果分開保存）"""
+        return kind if pipeline is None else f"{kind}:{pipeline.name}"
+    
+    def _prepare(self, image, region, digest, pipeline: Optional[OCRPipeline]
+                 ) -> Tuple['PIL.Image.Image', Optional[PreprocessResult]]:
+        """套用前處理管線（前處理結果與 OCR 結果以相同的截圖雜湊快取，純文字與單字方框共用）
+        
+        Returns:
+            (交給引擎的圖片, 前處理結果；未使用管線時為 (原截圖, None))
+        """
+        if pipeline is None:
+            return image, None
+        key = self.cache.key(region, self._kind('pre', pipeline), digest)
+        result = self.cache.get(key)
+        if result is None:
+            result = pipeline.run(np.asarray(image))
+            self.cache.put(key, result)
+        return Image.fromarray(result.image), result
+    
+    def _should_tile(self, image) -> bool:
+        """此截圖是否交給分塊平行辨識（只有 Tesseract 需要，Windows OCR 本身已夠快）"""
+        return (self.tiler is not None and self.ocr_engine == "tesseract"
+                and self.tiler.should_tile(*image.size))
+    
+    def _tiled_boxes(self, image, offset: Tuple[int, int], scale: float = 1.0) -> Optional[List[TextBox]]:
+        """分塊平行辨識，回傳單字方框（失敗時回傳 None；scale = 前處理放大倍率）"""
+        try:
+            return self.tiler.recognize(np.asarray(image), offset, scale)
+        except Exception as e:
+            print(f"⚠️ Tesseract 分塊 OCR 失敗: {e}")
+            return None
+    
+    def _index_image(self, image, region: Optional[Tuple[int, int, int, int]], captured_at: float,
+                     pipeline: Optional[OCRPipeline] = None, digest=None) -> TextIndex:
+        """辨識截圖並建立索引（截圖內容相同時沿用快取）"""
+        # 🔥 截圖內容相同：沿用快取的索引（只更新截圖時間）
+        digest = digest if digest is not None else frame_hash(image)
+        key = self.cache.key(region, self._kind('boxes', pipeline), digest)
+        index = self.cache.get(key)
+        if index is not None:
+            return index.at(captured_at)
+        
+        offset = (region[0], region[1]) if region else (0, 0)
+        prepared, result = self._prepare(image, region, digest, pipeline)
+        if result is not None and result.empty:
+            words = []
+        else:
+            # 前處理後的圖片以 (0, 0) 辨識，再依放大倍率與裁切位置換算回螢幕座標
+            engine_offset = offset if result is None else (0, 0)
+            words = None
+            if self._should_tile(prepared):
+                words = self._tiled_boxes(prepared, engine_offset, 1.0 if result is None else result.scale)
+            if words is None:
+                # 未分塊，或分塊辨識失敗時改為整張辨識（不回傳空的索引）
+                words = self._boxes_function(prepared, engine_offset)
+            if words is None:
+                return TextIndex([], region, captured_at)
+            if result is not None:
+                words = OCRPipeline.map_boxes(words, result, offset)
+        index = TextIndex(words, region, captured_at)
+        self.cache.put(key, index)
+        return index
+    
     def find_text_position(
         self,
         target_text: str,
-        region: Optional[Tuple[int, int, int, int]] = None
+        region: Optional[Tuple[int, int, int, int]] = None,
+        match_mode: str = "contains",
+        case_sensitive: bool = False,
+        pipeline: Union[str, OCRPipeline, None] = None
     ) -> Optional[Tuple[int, int]]:
-        """尋找文字在螢幕上的位置（預留功能）
+        """尋找文字在螢幕上的位置
         
         Args:
             target_text: 要尋找的文字
             region: 截取區域
+            match_mode: 匹配模式（"contains" / "exact" / "regex"）
+            case_sensitive: 是否區分大小寫
+            pipeline: OCR 前處理管線，None = 直接辨識截圖
         
         Returns:
             文字中心座標 (x, y)，若找不到回傳 None
-        
-        Note:
-            此功能需要 OCR 引擎回傳文字座標資訊
-            目前僅為預留介面，實作需依據引擎調整
         """
-        raise NotImplementedError("文字定位功能尚未實作")
+        box = self.recognize_boxes(region, pipeline).find_first(target_text, match_mode, case_sensitive)
+        return box.center if box else None
     
     def is_available(self) -> bool:
         """檢查 OCR 功能是否可用"""
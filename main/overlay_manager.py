@@ -0,0 +1,317 @@
+"""
+OverlayManager - 辨識邊框的共用覆蓋視窗
+以一個常駐、透明、置頂、可點擊穿透的視窗顯示所有辨識邊框，
+取代每次顯示邊框都建立新的 tk.Tk()（建立視窗很慢，且在回放執行緒建立的視窗不會被釋放）
+
+特性：
+- 回放執行緒只把邊框請求放入佇列（不碰 Tk，幾乎沒有成本）
+- UI 執行緒定時取出佇列，同一個位置的重複請求只延長顯示時間，
+  一次取出的所有請求只重繪一次（每秒顯示 50 個邊框也不影響回放）
+- 顯示數量有上限，超過時保留最新的邊框
+- attach(root) 使用主程式的 Tk 執行緒；未 attach 時自動建立專用的 UI 執行緒，
+  之後 attach 時由主程式接手（專用執行緒關閉自己的視窗並結束）
+- expect_attach() 後不再自動建立 UI 執行緒，請求先留在佇列，等主程式 attach 後才顯示
+
+使用方式:
+    from overlay_manager import get_overlay_manager
+
+    overlay = get_overlay_manager()
+    overlay.expect_attach()                  # 主程式稍後才 attach（可選）
+    overlay.attach(root)                     # 在 UI 執行緒呼叫（可選）
+    overlay.show(100, 200, 80, 40, duration_ms=1500)
+    print(overlay.stats())
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+Box = Tuple[int, int, int, int]
+
+# 透明色（此顏色的像素完全透明且可點擊穿透）
+TRANSPARENT_COLOR = '#010203'
+
+
+def _virtual_screen(root) -> Tuple[int, int, int, int]:
+    """所有螢幕合併後的範圍 (x, y, 寬, 高)，非 Windows 時為主螢幕"""
+    try:
+        import ctypes
+        metrics = ctypes.windll.user32.GetSystemMetrics
+        # SM_XVIRTUALSCREEN / SM_YVIRTUALSCREEN / SM_CXVIRTUALSCREEN / SM_CYVIRTUALSCREEN
+        x, y, w, h = metrics(76), metrics(77), metrics(78), metrics(79)
+        if w > 0 and h > 0:
+            return x, y, w, h
+    except (AttributeError, OSError):
+        pass
+    return 0, 0, root.winfo_screenwidth(), root.winfo_screenheight()
+
+
+class OverlayManager:
+    """辨識邊框的共用覆蓋視窗（show() 可從任何執行緒呼叫）"""
+
+    def __init__(self, interval_ms: int = 33, max_borders: int = 64):
+        """
+        Args:
+            interval_ms: UI 執行緒取出佇列的間隔（毫秒）
+            max_borders: 同時顯示的邊框上限
+        """
+        self.interval_ms = max(10, int(interval_ms))
+        self.max_borders = max(1, int(max_borders))
+        self._pending: Deque[tuple] = deque()
+        self._borders: Dict[Box, Tuple[float, str]] = {}  # {(x, y, w, h): (到期時間, 文字)}
+        self._lock = threading.Lock()          # 佇列、統計與 _root / _thread 的交接
+        self._tick_lock = threading.Lock()     # 同一時間只有一個 UI 執行緒處理邊框（交接期間兩個 Tk 都可能在執行）
+        self._root = None
+        self._owns_root = False
+        self._expect_attach = False
+        self._thread: Optional[threading.Thread] = None
+        self._window = None
+        self._window_root = None               # 覆蓋視窗所屬的 Tk（只能由該 Tk 的執行緒操作）
+        self._canvas = None
+        self._origin = (0, 0)
+        self._visible = False
+        self._stopped = False
+        self.available = True
+
+        # 統計
+        self.requests = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.redraws = 0
+
+    # ==================== 任何執行緒 ====================
+
+    def show(self, x: int, y: int, width: int, height: int, duration_ms: int = 1500,
+             label: str = '✅ 已辨識') -> None:
+        """顯示邊框（只放入佇列，立即返回）
+
+        Args:
+            x, y: 左上角螢幕座標
+            width, height: 大小
+            duration_ms: 顯示時間（毫秒），同一位置再次顯示時延長
+            label: 邊框上方的文字
+        """
+        if not self.available:
+            return
+        with self._lock:
+            self._pending.append(('show', (int(x), int(y), int(width), int(height)),
+                                  time.monotonic() + duration_ms / 1000.0, label))
+            self.requests += 1
+        self._ensure_ui()
+
+    def clear(self) -> None:
+        """清除所有邊框"""
+        with self._lock:
+            self._pending.append(('clear',))
+
+    def stats(self) -> dict:
+        """取得統計（coalesced = 合併到既有邊框的請求，redraws = 實際重繪次數）"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'redraws': self.redraws,
+                'pending': len(self._pending),
+                'visible': len(self._borders),
+            }
+
+    def stop(self) -> None:
+        """停止更新並關閉覆蓋視窗（下一次取出佇列時生效）"""
+        self._stopped = True
+
+    def expect_attach(self) -> None:
+        """主程式稍後會 attach：在那之前不自動建立 UI 執行緒，請求留在佇列"""
+        with self._lock:
+            self._expect_attach = True
+
+    def _ensure_ui(self) -> None:
+        """尚未 attach 主程式的 Tk（且主程式沒有預告會 attach）時，啟動專用的 UI 執行緒"""
+        with self._lock:
+            if self._root is not None or self._stopped or self._expect_attach:
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run_own_root, name="Overlay", daemon=True)
+                self._thread.start()
+
+    # ==================== UI 執行緒 ====================
+
+    def attach(self, root) -> None:
+        """使用主程式的 Tk（需在該 Tk 的執行緒呼叫）
+
+        專用 UI 執行緒已啟動時由主程式接手：專用執行緒在下一次更新時關閉自己的 Tk 並結束
+        """
+        with self._lock:
+            if self._root is root:
+                return
+            self._root = root
+            self._owns_root = False
+            self._expect_attach = False
+            self._stopped = False
+        root.after(self.interval_ms, lambda: self._tick(root))
+
+    def _run_own_root(self) -> None:
+        try:
+            import tkinter as tk
+            root = tk.Tk()
+            root.withdraw()
+        except Exception:
+            self.available = False
+            return
+        with self._lock:
+            if self._root is not None:
+                # 啟動期間主程式已 attach
+                root.destroy()
+                return
+            self._root = root
+            self._owns_root = True
+        root.after(0, lambda: self._tick(root, owned=True))
+        root.mainloop()
+
+    def _drain(self, now: float) -> bool:
+        """取出佇列中的所有請求並移除過期邊框
+
+        Returns:
+            顯示內容是否改變（需要重繪）
+        """
+        with self._lock:
+            requests = list(self._pending)
+            self._pending.clear()
+
+        changed = False
+        for request in requests:
+            if request[0] == 'clear':
+                changed = changed or bool(self._borders)
+                self._borders.clear()
+                continue
+            _, box, expires, label = request
+            existing = self._borders.get(box)
+            if existing is not None and existing[1] == label:
+                # 同一位置：只延長顯示時間，不需要重繪
+                self._borders[box] = (max(expires, existing[0]), label)
+                with self._lock:
+                    self.coalesced += 1
+            else:
+                self._borders[box] = (expires, label)
+                changed = True
+
+        expired = [box for box, (expires, _) in self._borders.items() if expires <= now]
+        for box in expired:
+            del self._borders[box]
+        changed = changed or bool(expired)
+
+        if len(self._borders) > self.max_borders:
+            # 保留最晚到期（最新）的邊框
+            ordered = sorted(self._borders.items(), key=lambda item: item[1][0], reverse=True)
+            with self._lock:
+                self.dropped += len(ordered) - self.max_borders
+            self._borders = dict(ordered[:self.max_borders])
+        return changed
+
+    def _tick(self, root, owned: bool = False) -> None:
+        """在 root 的執行緒取出佇列並重繪；root 已被取代時結束（owned = 專用 Tk，由自己的執行緒關閉）"""
+        with self._tick_lock:
+            with self._lock:
+                current = root is self._root
+            if not current:
+                if self._window_root is root:
+                    self._window = self._canvas = self._window_root = None
+                    self._visible = False
+                if owned:
+                    root.destroy()  # 連同其上的覆蓋視窗一起關閉，mainloop 隨之結束
+                return
+            if self._stopped:
+                self._close()
+                return
+            if self._window_root is not None and self._window_root is not root:
+                # 舊的覆蓋視窗屬於被取代的 Tk，由該執行緒關閉；這裡只放掉參照
+                self._window = self._canvas = self._window_root = None
+                self._visible = False
+            try:
+                if self._drain(time.monotonic()):
+                    self._redraw()
+            except Exception:
+                pass
+        root.after(self.interval_ms, lambda: self._tick(root, owned))
+
+    def _ensure_window(self) -> bool:
+        """建立覆蓋視窗（第一次顯示邊框時）"""
+        if self._window is not None:
+            return True
+        import tkinter as tk
+        root = self._root
+        window = tk.Toplevel(root)
+        window.overrideredirect(True)
+        window.attributes('-topmost', True)
+        try:
+            # 透明色的像素完全透明且滑鼠可穿透（Windows）
+            window.attributes('-transparentcolor', TRANSPARENT_COLOR)
+        except tk.TclError:
+            window.destroy()
+            self.available = False
+            return False
+        x, y, w, h = _virtual_screen(root)
+        window.geometry(f"{w}x{h}+{x}+{y}")
+        canvas = tk.Canvas(window, bg=TRANSPARENT_COLOR, highlightthickness=0)
+        canvas.pack(fill='both', expand=True)
+        window.withdraw()
+        self._window, self._canvas, self._origin = window, canvas, (x, y)
+        self._window_root = root
+        return True
+
+    def _redraw(self) -> None:
+        """依目前的邊框重繪（沒有邊框時隱藏視窗）"""
+        if not self._borders:
+            if self._visible:
+                self._canvas.delete('all')
+                self._window.withdraw()
+                self._visible = False
+            return
+        if not self._ensure_window():
+            return
+        canvas = self._canvas
+        ox, oy = self._origin
+        canvas.delete('all')
+        for (x, y, w, h), (_, label) in self._borders.items():
+            x, y = x - ox, y - oy
+            canvas.create_rectangle(x, y, x + w, y + h, outline='lime', width=3)
+            if label:
+                canvas.create_text(x + w // 2, max(8, y - 10), text=label,
+                                   font=('Microsoft JhengHei', 10, 'bold'), fill='lime')
+        if not self._visible:
+            self._window.deiconify()
+            self._window.attributes('-topmost', True)
+            self._visible = True
+        with self._lock:
+            self.redraws += 1
+
+    def _close(self) -> None:
+        if self._window is not None:
+            try:
+                self._window.destroy()
+            except Exception:
+                pass
+        self._window = self._canvas = self._window_root = None
+        self._visible = False
+        with self._lock:
+            root, owned = self._root, self._owns_root
+            self._root = None
+            self._owns_root = False
+        if owned and root is not None:
+            root.destroy()
+
+
+# ==================== 共用實例 ====================
+
+_shared_overlay: Optional[OverlayManager] = None
+_shared_lock = threading.Lock()
+
+
+def get_overlay_manager() -> OverlayManager:
+    """取得全程式共用的覆蓋視窗管理器"""
+    global _shared_overlay
+    with _shared_lock:
+        if _shared_overlay is None:
+            _shared_overlay = OverlayManager()
+        return _shared_overlay
@@ -0,0 +1,119 @@
+"""
+PixelProbe - 像素顏色條件檢查
+以少量像素（或小矩形的平均顏色）判斷畫面狀態，例如「血條是否為紅色」、「指示燈是否為綠色」，
+不需要完整的模板匹配
+
+特性：
+- 所有取樣點合併為一個最小外框，只截取一次
+- 顏色差距以各通道最大絕對差計算（tolerance=10 表示 R/G/B 各自相差不超過 10）
+- 小矩形以平均顏色比較，可容忍反鋸齒與少量雜訊
+
+取樣點格式（事件 JSON 的 probes 欄位）：
+    {"x": 100, "y": 200, "color": "#FF0000"}                    單一像素
+    {"region": [10, 10, 30, 14], "color": [0, 255, 0]}           矩形 (x1, y1, x2, y2) 的平均顏色
+    可另外指定 "tolerance" 覆寫整體容差
+
+使用方式:
+    from pixel_probe import normalize_probes, probes_bbox, evaluate_probes
+
+    probes = normalize_probes([{"x": 100, "y": 200, "color": "#FF0000"}])
+    bbox = probes_bbox(probes)
+    image = np.asarray(ImageGrab.grab(bbox=bbox))
+    matched, samples = evaluate_probes(image, bbox[:2], probes, tolerance=10)
+"""
+
+from typing import Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+Color = Tuple[int, int, int]
+
+
+def parse_color(value: Union[str, Sequence[int]]) -> Color:
+    """解析顏色（'#RRGGBB'、'RRGGBB' 或 [R, G, B]）
+
+    Raises:
+        ValueError: 格式錯誤
+    """
+    if isinstance(value, str):
+        text = value.strip().lstrip('#')
+        if len(text) != 6:
+            raise ValueError(f"顏色格式錯誤: {value}")
+        return (int(text[0:2], 16), int(text[2:4], 16), int(text[4:6], 16))
+    if len(value) != 3:
+        raise ValueError(f"顏色格式錯誤: {value}")
+    return tuple(max(0, min(255, int(c))) for c in value)
+
+
+def format_color(color: Color) -> str:
+    """顏色轉為 '#RRGGBB'"""
+    return '#{:02X}{:02X}{:02X}'.format(*color)
+
+
+def normalize_probes(probes: Iterable[dict]) -> List[dict]:
+    """將取樣點轉為統一格式 {'box': (x1, y1, x2, y2), 'color': (R, G, B), 'tolerance': int|None}
+
+    box 為不含右下邊界的範圍（單一像素為 (x, y, x+1, y+1)）
+
+    Raises:
+        ValueError: 取樣點格式錯誤
+    """
+    normalized = []
+    for probe in probes:
+        if 'region' in probe:
+            x1, y1, x2, y2 = (int(v) for v in probe['region'])
+            x1, x2 = min(x1, x2), max(x1, x2)
+            y1, y2 = min(y1, y2), max(y1, y2)
+            box = (x1, y1, max(x2, x1 + 1), max(y2, y1 + 1))
+        elif 'x' in probe and 'y' in probe:
+            x, y = int(probe['x']), int(probe['y'])
+            box = (x, y, x + 1, y + 1)
+        else:
+            raise ValueError(f"取樣點缺少座標: {probe}")
+        if 'color' not in probe:
+            raise ValueError(f"取樣點缺少顏色: {probe}")
+        tolerance = probe.get('tolerance')
+        normalized.append({
+            'box': box,
+            'color': parse_color(probe['color']),
+            'tolerance': int(tolerance) if tolerance is not None else None,
+        })
+    return normalized
+
+
+def probes_bbox(probes: Sequence[dict]) -> Tuple[int, int, int, int]:
+    """所有取樣點的最小外框 (x1, y1, x2, y2)（normalize_probes 的結果）"""
+    return (min(p['box'][0] for p in probes), min(p['box'][1] for p in probes),
+            max(p['box'][2] for p in probes), max(p['box'][3] for p in probes))
+
+
+def evaluate_probes(image: np.ndarray, origin: Tuple[int, int], probes: Sequence[dict],
+                    tolerance: int = 10, match: str = 'all') -> Tuple[bool, List[Tuple[Color, bool]]]:
+    """檢查取樣點的顏色
+
+    Args:
+        image: 外框範圍的截圖（RGB numpy 陣列）
+        origin: 截圖左上角的螢幕座標
+        probes: normalize_probes 的結果
+        tolerance: 各通道最大允許差值（取樣點未指定時使用）
+        match: 'all' = 全部相符才成立，'any' = 任一相符即成立
+
+    Returns:
+        (是否成立, [(實際顏色, 是否相符), ...])
+    """
+    ox, oy = origin
+    samples = []
+    for probe in probes:
+        x1, y1, x2, y2 = probe['box']
+        patch = image[y1 - oy:y2 - oy, x1 - ox:x2 - ox, :3]
+        if patch.size == 0:
+            samples.append(((0, 0, 0), False))
+            continue
+        actual = tuple(int(round(c)) for c in patch.reshape(-1, 3).mean(axis=0))
+        limit = tolerance if probe['tolerance'] is None else probe['tolerance']
+        diff = max(abs(a - b) for a, b in zip(actual, probe['color']))
+        samples.append((actual, diff <= limit))
+
+    results = [ok for _, ok in samples]
+    matched = any(results) if match == 'any' else all(results)
+    return matched, samples
@@ -11,7 +11,6 @@ import win32con
 import os
 import cv2
 import numpy as np
-from PIL import ImageGrab
 
 # ✅ 重構：匯入新模組
 try:
@@ -21,6 +20,23 @@ except ImportError:
     BEZIER_AVAILABLE = False
     print("⚠️ BezierMouseMover 未載入，將使用傳統直線移動")
 
+from image_matcher import PyramidMatcher, match_at_scale, match_all, template_variant, template_shape, DEFAULT_SCALES
+from match_engine import ParallelMatchEngine
+from template_bank import TemplateBank
+from template_disk_cache import TemplateDiskCache, cache_directory
+from image_catalog import ImageCatalog
+from roi_tracker import ROITracker
+from change_detector import ChangeDetector
+from feature_matcher import FeatureMatcher
+from scale_hints import ScaleHints
+from match_verifier import FEATURE_RATIO, VERIFY_RATIO, MatchVerifier, combined_score
+from match_prefilter import MatchPrefilter, ScreenIntegrals
+from pixel_probe import normalize_probes, probes_bbox, evaluate_probes, format_color
+from frame_bus import get_frame_bus
+from screen_capture import ScreenCapturer, CallableBackend, FrameBusBackend
+from overlay_manager import get_overlay_manager
+from anytime_match import AnytimeMatcher
+
 class CoreRecorder:
     """錄製和回放的核心類別
     
@@ -56,10 +72,28 @@ class CoreRecorder:
         self._pressed_keys = set()
         
         # 圖片辨識相關
-        self._image_cache = {}  # 快取已載入的圖片 {display_name: (image_array, image_path)}
+        self._template_bank = TemplateBank()  # 預先編譯的模板庫（LRU，有容量上限）{display_name: CompiledTemplate}
+        self._template_disk_cache_enabled = True  # 前處理結果保存在圖片目錄下的 .template_cache
         self._images_dir = None  # 圖片目錄路徑
-        self._border_window = None  # 邊框視窗
+        self._image_catalog = ImageCatalog(None)  # 圖片目錄索引（顯示名稱 -> 檔案路徑）
+        self._overlay = get_overlay_manager()  # 辨識邊框的共用覆蓋視窗
         self._current_region = None  # 當前辨識範圍（全域狀態，由 >範圍結束 清除）
+        self._pyramid_matcher = PyramidMatcher(downscale=4, top_k=5)  # 金字塔粗到細匹配器
+        self._match_engine = ParallelMatchEngine()  # 平行多模板匹配引擎
+        self._roi_tracker = ROITracker()  # 圖片位置記憶（優先搜尋上次找到的位置附近）
+        self._roi_tracking = True
+        self._change_detector = ChangeDetector()  # 畫面未變化時沿用上次辨識結果（等待/重試迴圈用）
+        self._feature_matcher = FeatureMatcher()  # 特徵點匹配（模板匹配的備案）
+        self._scale_hints = ScaleHints()  # 每張模板的最佳尺度（設定圖片目錄後保存在目錄中）
+        self._ocr_index_age = 0.5  # OCR 文字索引沿用時間（秒）：此時間內的多次文字查詢共用同一次辨識
+        self._anytime_matcher = AnytimeMatcher(self._pyramid_matcher, self._feature_matcher)  # 有時間預算的辨識（由便宜到昂貴的策略）
+        self._scale_exit_margin = 0.05  # 多尺度搜尋：分數超過閾值此幅度即停止嘗試其餘尺度
+        self._match_verifier = MatchVerifier(budget_ms=20)  # 標準模式的進階驗證（每次最多 20ms）
+        self._match_prefilter = MatchPrefilter()  # 快速模式的候選區域篩選（略過平坦區域，結果與全圖匹配相同）
+        self._prefilter_enabled = False
+        self._capturer = ScreenCapturer()  # 截圖寫入重複使用的緩衝區（RGB / 灰階）
+        self._capture_override = None  # 自訂截圖後端（None = 共用截圖匯流排 / 預設後端，測試/基準測試可注入合成畫面）
+        self._frame_bus_backend = FrameBusBackend(get_frame_bus(), self._capturer.backend)
         
         # ✅ 貝茲曲線滑鼠移動器
         self._bezier_mover = BezierMouseMover() if BEZIER_AVAILABLE else None
@@ -545,6 +579,9 @@ class CoreRecorder:
         # ✅ 修復：清空所有可能殘留的按鍵狀態
         self._pressed_keys.clear()
         
+        # 🔥 釘選本腳本引用的圖片，避免長時間運作時被模板快取淘汰
+        self._pin_script_templates(self.events)
+        
         self.playing = True
         self.paused = False
         self._play_thread = threading.Thread(
@@ -682,6 +719,11 @@ class CoreRecorder:
         finally:
             self.playing = False
             self._current_repeat_count = 0
+            # 回放中新計算的特徵點寫入磁碟快取（下次啟動不必重新計算）
+            try:
+                self._template_bank.flush_features()
+            except Exception:
+                pass
             # ✅ 修復：回放結束後確保所有按鍵都被釋放
             try:
                 self._release_pressed_keys()
@@ -1358,7 +1400,9 @@ class CoreRecorder:
                     threshold=confidence, 
                     fast_mode=True,
                     show_border=show_border,
-                    region=region
+                    region=region,
+                    strategy=event.get('strategy'),  # fast / pyramid
+                    time_budget_ms=event.get('time_budget_ms')  # 設定時在預算內回傳最佳結果
                 )
                 
                 if pos:
@@ -1391,7 +1435,9 @@ class CoreRecorder:
                     threshold=confidence,
                     fast_mode=True,
                     show_border=show_border,
-                    region=region
+                    region=region,
+                    strategy=event.get('strategy'),  # fast / pyramid
+                    time_budget_ms=event.get('time_budget_ms')  # 設定時在預算內回傳最佳結果
                 )
                 
                 if pos:
@@ -1432,7 +1478,9 @@ class CoreRecorder:
                     threshold=confidence,
                     fast_mode=True,
                     show_border=show_border,
-                    region=region
+                    region=region,
+                    strategy=event.get('strategy'),  # fast / pyramid
+                    time_budget_ms=event.get('time_budget_ms')  # 設定時在預算內回傳最佳結果
                 )
                 
                 if pos:
@@ -1481,7 +1529,9 @@ class CoreRecorder:
                     threshold=confidence,
                     fast_mode=True,
                     show_border=show_border,
-                    region=region
+                    region=region,
+                    strategy=event.get('strategy'),  # fast / pyramid
+                    time_budget_ms=event.get('time_budget_ms')  # 設定時在預算內回傳最佳結果
                 )
                 
                 if pos:
@@ -1495,12 +1545,39 @@ class CoreRecorder:
             except Exception as e:
                 self.logger(f"條件判斷執行失敗: {e}")
         
+        # ✅ 條件判斷 - 像素顏色（不需模板匹配，只截取取樣點的最小範圍）
+        elif event['type'] == 'if_pixel_color':
+            try:
+                probes = event.get('probes', [])
+                tolerance = event.get('tolerance', 10)
+                match = event.get('match', 'all')  # all / any
+                on_success = event.get('on_success')
+                on_failure = event.get('on_failure')
+                
+                matched, samples = self.check_pixel_colors(probes, tolerance=tolerance, match=match)
+                for probe, actual, ok in samples:
+                    x1, y1, x2, y2 = probe['box']
+                    where = f"({x1},{y1})" if (x2 - x1, y2 - y1) == (1, 1) else f"({x1},{y1},{x2},{y2})"
+                    self.logger(f"[顏色判斷] {'✓' if ok else '✖'} {where} 實際 {format_color(actual)}"
+                                f"，預期 {format_color(probe['color'])}")
+                
+                if matched:
+                    self.logger(f"[顏色判斷] ✅ 條件成立")
+                    if on_success:
+                        return self._handle_branch_action(on_success)
+                else:
+                    self.logger(f"[顏色判斷] ✖ 條件不成立")
+                    if on_failure:
+                        return self._handle_branch_action(on_failure)
+            except Exception as e:
+                self.logger(f"顏色判斷執行失敗: {e}")
+        
         # ==================== OCR 文字辨識事件 ====================
         
         # OCR 條件判斷：if_text_exists
         elif event['type'] == 'if_text_exists':
             try:
-                from ocr_trigger import OCRTrigger
+                from ocr_service import get_ocr_service
                 
                 target_text = event.get('target_text', '')
                 timeout = event.get('timeout', 10.0)
@@ -1510,8 +1587,8 @@ class CoreRecorder:
                 
                 self.logger(f"[OCR] 檢查文字是否存在: {target_text}（最長 {timeout}s）")
                 
-                # 初始化 OCR 引擎
-                ocr = OCRTrigger(ocr_engine="auto")
+                # 共用 OCR 服務（引擎只初始化一次）
+                ocr = get_ocr_service()
                 
                 if not ocr.is_available():
                     self.logger("[OCR] ⚠️ OCR 引擎未啟用，跳過此步驟")
@@ -1526,7 +1603,11 @@ class CoreRecorder:
                     target_text=target_text,
                     timeout=timeout,
                     match_mode=match_mode,
-                    interval=0.5
+                    interval=0.5,
+                    region=event.get('region'),
+                    should_stop=lambda: not self.playing,
+                    max_age=self._ocr_index_age,
+                    pipeline=event.get('ocr_pipeline')
                 )
                 
                 if found:
@@ -1539,7 +1620,7 @@ class CoreRecorder:
                         return self._handle_branch_action(on_failure)
                         
             except ImportError:
-                self.logger("[OCR] ❌ ocr_trigger 模組未找到，請確認檔案存在")
+                self.logger("[OCR] ❌ ocr_service 模組未找到，請確認檔案存在")
             except Exception as e:
                 self.logger(f"[OCR] 錯誤: {e}")
                 if event.get('on_failure'):
@@ -1548,7 +1629,7 @@ class CoreRecorder:
         # OCR 等待文字：wait_text
         elif event['type'] == 'wait_text':
             try:
-                from ocr_trigger import OCRTrigger
+                from ocr_service import get_ocr_service
                 
                 target_text = event.get('target_text', '')
                 timeout = event.get('timeout', 10.0)
@@ -1556,7 +1637,7 @@ class CoreRecorder:
                 
                 self.logger(f"[OCR] 等待文字出現: {target_text}（最長 {timeout}s）")
                 
-                ocr = OCRTrigger(ocr_engine="auto")
+                ocr = get_ocr_service()
                 
                 if not ocr.is_available():
                     self.logger("[OCR] ⚠️ OCR 引擎未啟用")
@@ -1565,7 +1646,11 @@ class CoreRecorder:
                 found = ocr.wait_for_text(
                     target_text=target_text,
                     timeout=timeout,
-                    match_mode=match_mode
+                    match_mode=match_mode,
+                    region=event.get('region'),
+                    should_stop=lambda: not self.playing,
+                    max_age=self._ocr_index_age,
+                    pipeline=event.get('ocr_pipeline')
                 )
                 
                 if found:
@@ -1579,25 +1664,33 @@ class CoreRecorder:
         # OCR 點擊文字位置：click_text
         elif event['type'] == 'click_text':
             try:
-                from ocr_trigger import OCRTrigger
+                from ocr_service import get_ocr_service
                 
                 target_text = event.get('target_text', '')
                 timeout = event.get('timeout', 5.0)
                 
                 self.logger(f"[OCR] 尋找並點擊文字: {target_text}")
                 
-                ocr = OCRTrigger(ocr_engine="auto")
+                ocr = get_ocr_service()
                 
                 if not ocr.is_available():
                     self.logger("[OCR] ⚠️ OCR 引擎未啟用")
                     return ('continue',)
                 
-                # 尋找文字位置
-                pos = ocr.find_text_position(target_text)
+                # 尋找文字位置（剛辨識過的畫面直接查詢索引，不重新辨識）
+                box = ocr.wait_for_text_box(
+                    target_text=target_text,
+                    timeout=timeout,
+                    match_mode=event.get('match_mode', 'contains'),
+                    region=event.get('region'),
+                    should_stop=lambda: not self.playing,
+                    max_age=self._ocr_index_age,
+                    pipeline=event.get('ocr_pipeline')
+                )
                 
-                if pos:
-                    x, y = pos
-                    self.logger(f"[OCR] ✅ 找到文字於 ({x}, {y})，執行點擊")
+                if box:
+                    x, y = box.center
+                    self.logger(f"[OCR] ✅ 找到文字「{box.text}」於 ({x}, {y})（信心度 {box.confidence:.2f}），執行點擊")
                     
                     # 移動並點擊
                     win32api.SetCursorPos((x, y))
@@ -1623,14 +1716,19 @@ class CoreRecorder:
                 found = False
                 
                 while True:
-                    # 🔥 一次截圖，多次匹配（效能優化）
-                    snapshot = ImageGrab.grab()
+                    # 🔥 一次截圖，多次匹配（效能優化，直接使用灰階緩衝區）
+                    _, snapshot = self._grab_arrays()
                     
                     # 準備圖片列表
                     template_list = [{'name': img.get('name', ''), 'threshold': confidence} for img in images]
                     
-                    # 🔥 使用批次辨識方法
-                    results = self.find_images_in_snapshot(snapshot, template_list, threshold=confidence, fast_mode=True)
+                    # 🔥 使用批次辨識方法（持續等待時，畫面未變化就沿用上次結果）
+                    gate_key = ('any', tuple(t['name'] for t in template_list), confidence, event.get('strategy')) if timeout > 0 else None
+                    results = self._find_images_gated(
+                        snapshot, template_list, gate_key, threshold=confidence, fast_mode=True,
+                        strategy=event.get('strategy'),
+                        first_hit=event.get('first_hit', False)  # True = 排在前面的圖片找到後不再等待後面的圖片
+                    )
                     
                     # 檢查是否有找到任何圖片
                     for img_config in images:
@@ -1722,9 +1820,12 @@ class CoreRecorder:
                 
                 self.logger(f"[多條件AND] 檢查 {len(images)} 張圖片是否全部存在")
                 
+                # 🔥 共用同一張截圖判斷所有圖片
+                results = self.find_images_on_screen(images, threshold=confidence, fast_mode=True, use_mask=False)
+                
                 all_found = True
                 for img_name in images:
-                    pos = self.find_image_on_screen(img_name, threshold=confidence, fast_mode=True)
+                    pos = results.get(img_name)
                     if not pos:
                         self.logger(f"[多條件AND] ✖ 缺少: {img_name}")
                         all_found = False
@@ -1754,9 +1855,12 @@ class CoreRecorder:
                 
                 self.logger(f"[多條件OR] 檢查 {len(images)} 張圖片是否有任一存在")
                 
+                # 🔥 共用同一張截圖；排在前面的圖片找到後不再等待後面的圖片（結果依列表順序決定）
+                results = self.find_images_on_screen(images, threshold=confidence, fast_mode=True, first_hit=True, use_mask=False)
+                
                 found = None
                 for img_name in images:
-                    pos = self.find_image_on_screen(img_name, threshold=confidence, fast_mode=True)
+                    pos = results.get(img_name)
                     if pos:
                         self.logger(f"[多條件OR] ✅ 找到: {img_name}")
                         found = img_name
@@ -1775,18 +1879,93 @@ class CoreRecorder:
             except Exception as e:
                 self.logger(f"多條件OR判斷失敗: {e}")
         
+        # 找出圖片的所有位置（數量存入變數）
+        elif event['type'] == 'find_all_images':
+            try:
+                image_name = event.get('image', '')
+                count_var = event.get('count_var', '')
+                on_success = event.get('on_success')
+                on_failure = event.get('on_failure')
+                region = event.get('region') or self._current_region
+                
+                hits = self.find_all_images_on_screen(
+                    image_name,
+                    threshold=event.get('confidence', 0.85),
+                    region=region,
+                    order=event.get('order', 'score'),
+                    max_results=event.get('max_results', 100),
+                    show_border=event.get('show_border', False)
+                )
+                if count_var:
+                    self._set_variable(count_var, len(hits))
+                
+                if hits and on_success:
+                    return self._handle_branch_action(on_success)
+                elif not hits and on_failure:
+                    return self._handle_branch_action(on_failure)
+            except Exception as e:
+                self.logger(f"找全部圖片執行失敗: {e}")
+        
+        # 點擊變數記錄的位置（{var}_x, {var}_y，通常來自逐一處理圖片循環）
+        elif event['type'] == 'click_variable_position':
+            try:
+                var = event.get('var', '')
+                button = event.get('button', 'left')
+                return_to_origin = event.get('return_to_origin', True)
+                x = self._get_variable(f"{var}_x", None)
+                y = self._get_variable(f"{var}_y", None)
+                if x is None or y is None:
+                    self.logger(f"[點擊變數位置] ❌ 變數 {var} 沒有位置")
+                else:
+                    if return_to_origin:
+                        original_pos = win32api.GetCursorPos()
+                    ctypes.windll.user32.SetCursorPos(int(x), int(y))
+                    time.sleep(0.005)
+                    self._mouse_event_enhanced('down', button=button)
+                    time.sleep(0.05)
+                    self._mouse_event_enhanced('up', button=button)
+                    self.logger(f"[點擊變數位置] ✅ 已點擊 {button} 於 ({x}, {y})")
+                    if return_to_origin:
+                        time.sleep(0.01)
+                        ctypes.windll.user32.SetCursorPos(original_pos[0], original_pos[1])
+            except Exception as e:
+                self.logger(f"點擊變數位置執行失敗: {e}")
+        
         # 循環開始
         elif event['type'] == 'loop_start':
-            loop_type = event.get('loop_type', 'repeat')  # repeat/while/for
+            loop_type = event.get('loop_type', 'repeat')  # repeat/while/foreach
             max_count = event.get('max_count', 1)
             condition = event.get('condition', {})  # for while loop
+            items = []
+            
+            if loop_type == 'foreach':
+                # 🔥 逐一處理圖片：開始時一次找出所有位置，每輪把目前位置寫入變數
+                source = event.get('source', {})
+                hits = self.find_all_images_on_screen(
+                    source.get('image', ''),
+                    threshold=source.get('confidence', 0.85),
+                    region=source.get('region') or self._current_region,
+                    order=source.get('order', 'score'),
+                    max_results=source.get('max_results', 100)
+                )
+                items = hits
+                max_count = len(hits)
+                if not hits:
+                    end_index = self._find_loop_end(self._current_play_index)
+                    self.logger("[循環開始] 逐一處理：沒有找到任何位置，略過循環")
+                    if end_index is not None:
+                        self._current_play_index = end_index
+                    return None
+                self._set_hit_variables(event.get('var', 'hit'), hits, 0)
             
             self._loop_stack.append({
                 'type': loop_type,
                 'start_index': self._current_play_index,
                 'counter': 0,
                 'max_count': max_count,
-                'condition': condition
+                'condition': condition,
+                'items': items,
+                'var': event.get('var', 'hit')
             })
             self.logger(f"[循環開始] 類型={loop_type}, 次數={max_count}")
         
@@ -1804,9 +1983,14 @@ class CoreRecorder:
                     # 檢查條件
                     condition = loop_info['condition']
                     if condition.get('type') == 'image_exists':
-                        img_name = condition.get('image', '')
-                        pos = self.find_image_on_screen(img_name, threshold=0.75, fast_mode=True)
-                        should_continue = bool(pos)
+                        # 支援單張（image）或多張（images，全部存在才繼續）
+                        img_names = condition.get('images') or [condition.get('image', '')]
+                        results = self.find_images_on_screen(img_names, threshold=condition.get('confidence', 0.75), fast_mode=True, reuse_if_unchanged=True, use_mask=False)
+                        should_continue = all(results.get(name) for name in img_names)
+                elif loop_info['type'] == 'foreach':
+                    should_continue = loop_info['counter'] < len(loop_info['items'])
+                    if should_continue:
+                        self._set_hit_variables(loop_info['var'], loop_info['items'], loop_info['counter'])
                 
                 if should_continue:
                     self.logger(f"[循環] 繼續循環 ({loop_info['counter']}/{loop_info['max_count']})")
@@ -1964,6 +2148,29 @@ class CoreRecorder:
         """取得變數值"""
         return self._variables.get(name, default)
     
+    def _set_hit_variables(self, var, hits, index):
+        """將第 index 個圖片位置寫入變數 {var}_x / {var}_y / {var}_score / {var}_index（從 1 起算）/ {var}_count"""
+        x, y, score = hits[index]
+        self._variables[f"{var}_x"] = x
+        self._variables[f"{var}_y"] = y
+        self._variables[f"{var}_score"] = round(score, 4)
+        self._variables[f"{var}_index"] = index + 1
+        self._variables[f"{var}_count"] = len(hits)
+        self.logger(f"[變數] {var} = ({x}, {y}) 第 {index + 1}/{len(hits)} 個")
+    
+    def _find_loop_end(self, start_index):
+        """找出與 start_index 的循環開始對應的循環結束索引（支援巢狀循環），找不到回傳 None"""
+        depth = 0
+        for index in range(start_index, len(self.events)):
+            event_type = self.events[index].get('type')
+            if event_type == 'loop_start':
+                depth += 1
+            elif event_type == 'loop_end':
+                depth -= 1
+                if depth == 0:
+                    return index
+        return None
+    
     def _variable_operation(self, name, operation, value=1):
         """變數運算（加減乘除）"""
         try:
@@ -2037,16 +2244,6 @@ class CoreRecorder:
         """重置動作計時"""
         if action_id in self._action_start_time:
             del self._action_start_time[action_id]
-                self.logger(f"[分支] 跳轉至標籤: {target}, 重複{repeat_count}次")
-                return ('jump', target, repeat_count)
-            
-            else:  # continue
-                self.logger("[分支] 繼續執行")
-                return None
-                
-        except Exception as e:
-            self.logger(f"分支動作處理失敗: {e}")
-            return None
 
     def _mouse_event_enhanced(self, event, button='left', delta=0):
         """增強版滑鼠事件執行（更精確穩定）"""
@@ -2169,11 +2366,203 @@ class CoreRecorder:
     
     def set_images_directory(self, images_dir):
         """設定圖片目錄"""
+        if images_dir != self._images_dir:
+            # 目錄變更：同名圖片可能指向不同檔案，重建索引並清除模板庫（磁碟快取改用新目錄）
+            self._template_bank.set_disk_cache(None)
+            self._template_bank.clear()
+            self._roi_tracker.forget()
+            self._change_detector.clear()
+        if images_dir and self._template_disk_cache_enabled and self._template_bank.disk_cache is None:
+            # 🔥 前處理結果保存在圖片目錄下，下次啟動直接以 mmap 載入
+            self._template_bank.set_disk_cache(
+                TemplateDiskCache(cache_directory(images_dir), self._template_bank.scales))
         self._images_dir = images_dir
+        self._image_catalog = ImageCatalog(images_dir)
+        self._scale_hints = ScaleHints(images_dir)
         self.logger(f"[圖片辨識] 圖片目錄：{images_dir}")
     
+    def set_template_disk_cache(self, enabled):
+        """啟用/停用模板磁碟快取（圖片目錄下的 .template_cache）"""
+        self._template_disk_cache_enabled = bool(enabled)
+        if not enabled:
+            self._template_bank.set_disk_cache(None)
+        elif self._images_dir and self._template_bank.disk_cache is None:
+            self._template_bank.set_disk_cache(
+                TemplateDiskCache(cache_directory(self._images_dir), self._template_bank.scales))
+        self.logger(f"[圖片辨識] 模板磁碟快取：{'啟用' if enabled else '停用'}")
+    
+    def set_template_cache_budget(self, max_mb):
+        """設定模板快取容量上限
+        
+        Args:
+            max_mb: 容量上限（MB），0 = 不限制
+        """
+        self._template_bank.set_max_bytes(int(max_mb * 1024 * 1024))
+        self.logger(f"[圖片辨識] 模板快取上限：{max_mb} MB")
+    
+    def get_template_cache_stats(self):
+        """取得模板快取統計（佔用量、命中率、淘汰次數等）"""
+        return self._template_bank.stats()
+    
+    def _pin_script_templates(self, events):
+        """釘選腳本中引用的所有圖片（取代上一個腳本的釘選）"""
+        names = set()
+        
+        def collect(item):
+            if isinstance(item, dict):
+                for key in ('image', 'name'):
+                    if isinstance(item.get(key), str) and item[key]:
+                        names.add(item[key])
+                for key in ('images', 'condition'):
+                    if key in item:
+                        collect(item[key])
+            elif isinstance(item, list):
+                for value in item:
+                    if isinstance(value, str):
+                        names.add(value)
+                    else:
+                        collect(value)
+        
+        for event in events:
+            event_type = event.get('type', '')
+            if 'image' in event_type or event_type == 'recognize_any':
+                collect(event)
+            elif event.get('type') == 'loop_start':
+                collect(event.get('condition'))
+                collect(event.get('source'))
+        
+        self._template_bank.unpin()
+        self._template_bank.pin(names)
+    
+    def set_screen_source(self, source):
+        """設定圖片辨識使用的截圖來源
+        
+        Args:
+            source: 可呼叫物件 source(bbox) -> PIL.Image（RGB），bbox 為 (x1, y1, x2, y2) 或 None；
+                    None = 恢復使用共用截圖匯流排（未啟動時為預設截圖後端）
+        """
+        self.set_capture_backend(CallableBackend(source) if source is not None else None)
+    
+    def set_capture_backend(self, backend):
+        """設定圖片辨識使用的截圖後端
+        
+        Args:
+            backend: screen_capture 的 CaptureBackend（例如 ArrayBackend 注入記憶體中的畫面）；
+                     None = 恢復使用共用截圖匯流排（未啟動時為預設截圖後端）
+        """
+        self._capture_override = backend
+        self._change_detector.clear()
+    
+    def get_capture_stats(self):
+        """取得截圖統計（目前使用的後端、截圖次數、緩衝區配置次數與大小）"""
+        stats = self._capturer.stats()
+        if self._capture_override is not None:
+            stats['backend'] = self._capture_override.name
+        elif get_frame_bus().running:
+            stats['backend'] = self._frame_bus_backend.name
+        return stats
+    
+    def enable_frame_bus(self, fps=10):
+        """啟動共用截圖匯流排：單一背景執行緒截圖，圖片辨識、OCR、編輯器截圖共用最新畫面
+        
+        預設不啟動；主程式在設定檔 "frame_bus": true 時呼叫（"frame_bus_fps" 設定 FPS）。
+        匯流排只截取主螢幕，其他螢幕的範圍仍直接截圖
+        
+        Args:
+            fps: 每秒截圖次數上限（同時執行多少個辨識都不會超過）
+        """
+        get_frame_bus().start(fps=fps)
+        self.logger(f"[截圖] 共用截圖匯流排：啟用（{fps} FPS）")
+    
+    def disable_frame_bus(self):
+        """停止共用截圖匯流排，恢復每次辨識各自截圖"""
+        get_frame_bus().stop()
+        self.logger("[截圖] 共用截圖匯流排：停用")
+    
+    def get_frame_bus_stats(self):
+        """取得共用截圖匯流排統計（截圖次數、平均耗時等）"""
+        return get_frame_bus().stats()
+    
+    def _grab_rgb(self, region=None):
+        """截取螢幕（或指定範圍），回傳 RGB 陣列
+        
+        回傳的是重複使用的緩衝區，在同一執行緒下一次截圖前有效
+        """
+        backend = self._capture_override
+        if backend is None and self._frame_bus_backend.bus.running:
+            backend = self._frame_bus_backend
+        return self._capturer.grab(tuple(region) if region else None, backend)
+    
+    def _grab_arrays(self, region=None):
+        """截取螢幕（或指定範圍），回傳 (RGB, 灰階)，兩者皆為重複使用的緩衝區"""
+        rgb = self._grab_rgb(region)
+        return rgb, self._capturer.to_gray(rgb)
+    
+    def _scales_for(self, name, fast_mode, multi_scale=True):
+        """決定模板要嘗試的尺度與順序（依記憶的最佳尺度由近到遠）
+        
+        Args:
+            name: 模板名稱（None = 沒有尺度記憶）
+            fast_mode: 快速模式只嘗試最佳尺度（不是 1.0 時再補 1.0）
+            multi_scale: 非快速模式時是否使用多尺度
+        """
+        if fast_mode:
+            hint = self._scale_hints.get(name) if name else 1.0
+            return [1.0] if hint == 1.0 else [hint, 1.0]
+        scales = DEFAULT_SCALES if multi_scale else [1.0]
+        return self._scale_hints.order(name, scales) if name else list(scales)
+    
+    def set_roi_tracking(self, enabled):
+        """啟用/停用圖片位置記憶（優先在上次找到的位置附近搜尋）"""
+        self._roi_tracking = bool(enabled)
+        if not enabled:
+            self._roi_tracker.forget()
+        self.logger(f"[圖片辨識] 位置記憶：{'啟用' if enabled else '停用'}")
+    
+    def get_roi_stats(self, image_name=None):
+        """取得位置記憶的命中統計
+        
+        Args:
+            image_name: 圖片名稱，None 時回傳所有圖片 {name: stats}
+        """
+        if image_name is None:
+            return self._roi_tracker.all_stats()
+        return self._roi_tracker.stats(image_name)
+    
+    def get_change_gate_stats(self):
+        """取得畫面變化閘門統計（跳過匹配的次數與比例）"""
+        return self._change_detector.stats()
+    
+    def set_match_prefilter(self, enabled):
+        """啟用/停用快速模式的候選區域篩選（略過不可能相符的平坦區域，再執行模板匹配）"""
+        self._prefilter_enabled = bool(enabled)
+        self._match_prefilter.reset_stats()
+        self.logger(f"[圖片辨識] 候選區域篩選：{'啟用' if enabled else '停用'}")
+    
+    def get_prefilter_stats(self):
+        """取得候選區域篩選統計（pruned_ratio = 省略的搜尋面積比例）"""
+        return self._match_prefilter.stats()
+    
+    def get_ocr_stats(self):
+        """取得共用 OCR 服務的統計（workers = 常駐的工作執行緒數，avg_ms = 平均辨識耗時）"""
+        from ocr_service import get_ocr_service
+        return get_ocr_service().stats()
+    
+    def get_anytime_stats(self):
+        """取得有時間預算辨識的統計（exhausted_ratio = 預算用完的比例，cost_ms_per_mpx = 各階段成本估計）"""
+        return self._anytime_matcher.stats()
+    
+    def set_match_workers(self, max_workers):
+        """設定批次辨識的平行匹配執行緒數量
+        
+        Args:
+            max_workers: 執行緒數量（1 = 等同逐張匹配）
+        """
+        self._match_engine.set_max_workers(max_workers)
+        self.logger(f"[圖片辨識] 平行匹配執行緒數：{self._match_engine.max_workers}")
+    
     def show_match_border(self, x, y, width, height, duration=1500):
-        """顯示圖片辨識位置的邊框
+        """顯示圖片辨識位置的邊框（只放入覆蓋視窗的佇列，不會延遲回放）
         
         Args:
             x: 左上角 x 坐標
@@ -2183,51 +2572,37 @@ class CoreRecorder:
             duration: 顯示時間(毫秒)
         """
         try:
-            import tkinter as tk
-            
-            # 關閉舊的邊框視窗
-            if self._border_window:
-                try:
-                    self._border_window.destroy()
-                except:
-                    pass
-                self._border_window = None
-            
-            # 創建新的邊框視窗
-            border = tk.Tk()
-            border.overrideredirect(True)  # 無框視窗
-            border.attributes('-topmost', True)  # 置頂
-            border.attributes('-alpha', 0.6)  # 半透明
-            border.geometry(f"{width}x{height}+{x}+{y}")
-            
-            # 綠色邊框
-            canvas = tk.Canvas(border, bg='green', highlightthickness=3, highlightbackground='lime')
-            canvas.pack(fill='both', expand=True)
-            
-            # 中央文字
-            canvas.create_text(
-                width//2, height//2,
-                text='✅ 已辨識',
-                font=('Microsoft JhengHei', 14, 'bold'),
-                fill='white'
-            )
-            
-            self._border_window = border
-            
-            # 定時關閉
-            def close_border():
-                try:
-                    border.destroy()
-                except:
-                    pass
-                self._border_window = None
-            
-            border.after(duration, close_border)
-            
+            self._overlay.show(x, y, width, height, duration_ms=duration)
         except Exception as e:
             self._log(f"[邊框] 顯示失敗: {e}", "warning")
     
-    def find_image_on_screen(self, image_name_or_path, threshold=0.92, region=None, multi_scale=True, fast_mode=False, use_features_fallback=True, show_border=False):
+    def attach_overlay(self, root):
+        """讓辨識邊框使用主程式的 Tk 執行緒顯示（需在 UI 執行緒呼叫）"""
+        self._overlay.attach(root)
+    
+    def check_pixel_colors(self, probes, tolerance=10, match='all'):
+        """檢查螢幕上的像素顏色（所有取樣點合併為一次最小範圍截圖）
+        
+        Args:
+            probes: 取樣點列表 [{'x', 'y', 'color'} 或 {'region': [x1, y1, x2, y2], 'color'}]
+            tolerance: 各通道最大允許差值
+            match: 'all' = 全部相符才成立，'any' = 任一相符即成立
+            
+        Returns:
+            (是否成立, [(取樣點, 實際顏色, 是否相符), ...])
+        """
+        normalized = normalize_probes(probes)
+        if not normalized:
+            return False, []
+        bbox = probes_bbox(normalized)
+        image = self._grab_rgb(bbox)
+        matched, samples = evaluate_probes(image, bbox[:2], normalized, tolerance=tolerance, match=match)
+        return matched, [(probe, actual, ok) for probe, (actual, ok) in zip(normalized, samples)]
+    
+    # 驗證項目的日誌名稱
+    _VERIFY_LABELS = {'hist': '直方圖', 'edge': '邊緣', 'ssim': 'SSIM'}
+    
+    def find_image_on_screen(self, image_name_or_path, threshold=0.92, region=None, multi_scale=True, fast_mode=False, use_features_fallback=True, show_border=False, strategy=None, reuse_if_unchanged=False, time_budget_ms=None):
         """在螢幕上尋找圖片（🔥 終極強化版：透明遮罩、多算法融合、SSIM驗證、特徵點匹配）
         
         Args:
@@ -2237,256 +2612,367 @@ class CoreRecorder:
             multi_scale: 是否啟用多尺度搜尋（提高容錯性）
             fast_mode: 快速模式（跳過驗證步驟，大幅提升速度）
             use_features_fallback: 模板匹配失敗時，是否嘗試特徵點匹配
+            strategy: 匹配策略，None 時依 fast_mode 決定
+                - "fast": 原解析度單一尺度匹配（等同 fast_mode=True）
+                - "pyramid": 金字塔粗到細匹配（縮小圖找候選，原解析度精修）
+                - "standard": 多尺度匹配 + 進階驗證
+            reuse_if_unchanged: 畫面與上次相同條件的辨識相比沒有變化時，直接沿用上次結果
+                （等待 / 重試迴圈使用，跳過 matchTemplate）
+            time_budget_ms: 時間預算（毫秒），設定時改用 find_image_anytime（忽略 strategy / fast_mode）
             
         Returns:
             (center_x, center_y) 如果找到，否則 None
         """
+        if time_budget_ms is not None:
+            result = self.find_image_anytime(image_name_or_path, time_budget_ms, threshold=threshold,
+                                             region=region, show_border=show_border)
+            return result.center if result is not None and result.found else None
         try:
-            # 🔥 載入目標圖片（支援透明遮罩）
-            template, mask = self._load_image(image_name_or_path)
-            if template is None:
+            # 🔥 從模板庫取得預先編譯的模板（灰階、遮罩、各尺度版本皆已備妥）
+            entry = self._get_template(image_name_or_path)
+            if entry is None:
                 self.logger(f"[圖片辨識] 無法載入圖片：{image_name_or_path}")
                 return None
             
-            # 截取螢幕
-            if region:
-                screenshot = ImageGrab.grab(bbox=region)
-            else:
-                screenshot = ImageGrab.grab()
+            # 截取螢幕（寫入重複使用的緩衝區）
+            screen_array = self._grab_rgb(region)
+            
+            if strategy is None:
+                strategy = "fast" if fast_mode else "standard"
+            
+            # 🔥 畫面未變化：沿用上次結果，不做任何匹配
+            if reuse_if_unchanged:
+                gate_key = ('image', image_name_or_path, threshold, tuple(region) if region else None, multi_scale, strategy)
+                fingerprint = self._change_detector.fingerprint(screen_array)
+                unchanged, previous = self._change_detector.lookup(gate_key, fingerprint)
+                if unchanged:
+                    return previous
+            tag = {"fast": "[圖片辨識][快速]", "pyramid": "[圖片辨識][金字塔]"}.get(strategy, "[圖片辨識]")
+            
+            offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+            bounds = (offset_x, offset_y, offset_x + screen_array.shape[1], offset_y + screen_array.shape[0])
+            box = None
+            from_roi = False
+            
+            # 🔥 位置記憶：先在上次找到的位置附近由小到大搜尋
+            if self._roi_tracking:
+                for wx1, wy1, wx2, wy2 in self._roi_tracker.windows(image_name_or_path, bounds):
+                    window = screen_array[wy1 - offset_y:wy2 - offset_y, wx1 - offset_x:wx2 - offset_x]
+                    window_cv = self._capturer.to_gray(window, 'gray_roi')
+                    hit = self._locate_template(entry, window_cv, threshold, multi_scale, strategy,
+                                                use_features_fallback=False, log=lambda msg: None,
+                                                screen_color=window)
+                    if hit:
+                        box = (hit[0] + wx1, hit[1] + wy1, hit[2], hit[3])
+                        from_roi = True
+                        break
             
-            # 🔥 極速優化：轉換為灰度圖加速匹配（速度提升 2-3倍）
-            screen_array = np.array(screenshot)
-            screen_cv = cv2.cvtColor(screen_array, cv2.COLOR_RGB2GRAY)
+            # 完整搜尋範圍
+            if box is None:
+                # 🔥 極速優化：轉換為灰度圖加速匹配（速度提升 2-3倍，寫入重複使用的緩衝區）
+                screen_cv = self._capturer.to_gray(screen_array)
+                hit = self._locate_template(entry, screen_cv, threshold, multi_scale, strategy, use_features_fallback,
+                                            screen_color=screen_array)
+                if hit:
+                    box = (hit[0] + offset_x, hit[1] + offset_y, hit[2], hit[3])
+            
+            if self._roi_tracking:
+                self._roi_tracker.record(image_name_or_path, box, roi=from_roi)
+            
+            if box is None:
+                if reuse_if_unchanged:
+                    self._change_detector.store(gate_key, fingerprint, None)
+                self.logger(f"{tag} ❌ 未找到圖片")
+                return None
             
-            # 🔥 將模板也轉為灰度圖
-            if len(template.shape) == 3:
-                template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-            else:
-                template_gray = template
+            x, y, w, h = box
+            center_x, center_y = x + w // 2, y + h // 2
+            if reuse_if_unchanged:
+                self._change_detector.store(gate_key, fingerprint, (center_x, center_y))
+            self.logger(f"{tag} ✅ 找到圖片於 ({center_x}, {center_y})" + ("（位置記憶）" if from_roi else ""))
             
-            best_match_val = 0
-            best_match_loc = None
-            best_template_size = None
-            best_scale = 1.0
+            # 顯示邊框
+            if show_border:
+                self.show_match_border(x, y, w, h)
             
-            # 🔥 快速模式：使用新的 _match_template_on_screen 方法（跳過多尺度）
-            if fast_mode:
-                pos = self._match_template_on_screen(
-                    screen_cv, template_gray, None,  # 使用灰度圖，無遮罩
-                    threshold=threshold,
-                    fast_mode=True,
-                    multi_scale=False  # 快速模式不使用多尺度
-                )
+            return (center_x, center_y)
                 
-                if pos:
-                    # 如果有指定region，需要加上偏移
-                    if region:
-                        pos = (pos[0] + region[0], pos[1] + region[1])
-                    self.logger(f"[圖片辨識][快速] ✅ 找到圖片於 ({pos[0]}, {pos[1]})")
-                    
-                    # 顯示邊框
-                    if show_border:
-                        h, w = template_gray.shape
-                        self.show_match_border(pos[0] - w//2, pos[1] - h//2, w, h)
-                    
-                    return pos
-                else:
-                    self.logger(f"[圖片辨識][快速] ❌ 未找到圖片")
-                    return None
+        except Exception as e:
+            self.logger(f"[圖片辨識] 錯誤：{e}")
+            import traceback
+            traceback.print_exc()
+            return None
+    
+    def find_image_anytime(self, image_name_or_path, time_budget_ms=100, threshold=0.9, region=None, show_border=False):
+        """在時間預算內尋找圖片，預算用完時回傳目前最佳的候選位置與信心度
+        
+        依成本由低到高執行：位置記憶 → 金字塔 → 原解析度 → 其餘尺度 → 特徵點，
+        任一階段達到閾值即停止；剩餘預算不足以執行下一個階段時直接回傳
+        
+        Args:
+            image_name_or_path: 圖片顯示名稱或完整路徑
+            time_budget_ms: 時間預算（毫秒，不含截圖），None = 不限制
+            threshold: 匹配閾值 (0-1)
+            region: 搜尋區域 (x1, y1, x2, y2)，None表示全螢幕
+            show_border: 找到時是否顯示邊框
             
-            # 🔥 標準模式：多尺度模板匹配（主要方法，支援遮罩）
-            if multi_scale:
-                scales = [0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2]  # 更細緻的尺度範圍
-                for scale in scales:
-                    if scale != 1.0:
-                        width = int(template.shape[1] * scale)
-                        height = int(template.shape[0] * scale)
-                        if width < 10 or height < 10 or width > screen_cv.shape[1] or height > screen_cv.shape[0]:
-                            continue
-                        scaled_template = cv2.resize(template, (width, height), interpolation=cv2.INTER_CUBIC)
-                        scaled_mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST) if mask is not None else None
-                    else:
-                        scaled_template = template
-                        scaled_mask = mask
-                    
-                    # 🔥 根據是否有遮罩選擇演算法
-                    if scaled_mask is not None:
-                        # 有透明遮罩：使用支援遮罩的演算法
-                        self.logger(f"[圖片辨識] 使用透明遮罩進行匹配 (尺度:{scale:.2f})")
-                        result = cv2.matchTemplate(screen_cv, scaled_template, cv2.TM_CCORR_NORMED, mask=scaled_mask)
-                        min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                        score = max_val
-                        loc = max_loc
-                    else:
-                        # 無遮罩：使用多種匹配方法並加權平均
-                        methods = [
-                            (cv2.TM_CCOEFF_NORMED, 1.0),   # 相關係數法（權重最高）
-                            (cv2.TM_CCORR_NORMED, 0.8),    # 相關法
-                            (cv2.TM_SQDIFF_NORMED, 0.6),   # 平方差法（需要反轉）
-                        ]
-                        
-                        method_scores = []
-                        for method, weight in methods:
-                            try:
-                                result = cv2.matchTemplate(screen_cv, scaled_template, method)
-                                
-                                if method == cv2.TM_SQDIFF_NORMED:
-                                    # 平方差法：值越小越好，需要反轉
-                                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                                    score = 1.0 - min_val  # 反轉分數
-                                    loc = min_loc
-                                else:
-                                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                                    score = max_val
-                                    loc = max_loc
-                                
-                                method_scores.append((score * weight, loc))
-                            except Exception as e:
-                                continue
-                        
-                        if not method_scores:
-                            continue
-                            
-                        # 計算加權平均分數
-                        score = sum(s for s, _ in method_scores) / len(method_scores)
-                        loc = method_scores[0][1]  # 使用主要方法的位置
-                    
-                    # 記錄最佳匹配
-                    if score > best_match_val:
-                        best_match_val = score
-                        best_match_loc = loc
-                        best_template_size = (scaled_template.shape[1], scaled_template.shape[0])
-                        best_scale = scale
-            else:
-                # 🔥 單一尺度匹配（支援遮罩）
-                if mask is not None:
-                    result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCORR_NORMED, mask=mask)
-                else:
-                    result = cv2.matchTemplate(screen_cv, template, cv2.TM_CCOEFF_NORMED)
-                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                best_match_val = max_val
-                best_match_loc = max_loc
-                best_template_size = (template.shape[1], template.shape[0])
-            
-            self.logger(f"[圖片辨識] 模板匹配度：{best_match_val:.3f} (尺度:{best_scale:.2f}, 閾值：{threshold})")
-            
-            # 🔥 如果模板匹配失敗但接近閾值，嘗試特徵點匹配
-            if use_features_fallback and best_match_val < threshold and best_match_val >= threshold * 0.7:
-                self.logger(f"[圖片辨識] 模板匹配未達閾值，嘗試特徵點匹配...")
-                feature_x, feature_y, match_count = self.find_image_by_features(template, screen_cv)
-                
-                if feature_x is not None and match_count >= 15:  # 需要足夠的特徵點
-                    if region:
-                        feature_x += region[0]
-                        feature_y += region[1]
-                    self.logger(f"[圖片辨識] ✅ 特徵點匹配成功於 ({feature_x}, {feature_y})")
-                    return (feature_x, feature_y)
-            
-            # 🔥 階段2: 進階驗證（當模板匹配度接近閾值時）
-            if best_match_val >= threshold * 0.85:  # 降低初步門檻，進行更精確驗證
-                w, h = best_template_size
-                x1, y1 = best_match_loc
-                x2, y2 = x1 + w, y1 + h
+        Returns:
+            AnytimeResult（螢幕座標；found = 是否達到閾值），無法載入圖片或發生錯誤時回傳 None
+        """
+        try:
+            entry = self._get_template(image_name_or_path)
+            if entry is None:
+                self.logger(f"[圖片辨識] 無法載入圖片：{image_name_or_path}")
+                return None
+            
+            screen_array = self._grab_rgb(region)
+            screen_cv = self._capturer.to_gray(screen_array)
+            offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+            
+            # 位置記憶的搜尋視窗（轉為相對於截圖的座標）
+            windows = []
+            if self._roi_tracking:
+                bounds = (offset_x, offset_y, offset_x + screen_cv.shape[1], offset_y + screen_cv.shape[0])
+                windows = [(x1 - offset_x, y1 - offset_y, x2 - offset_x, y2 - offset_y)
+                           for x1, y1, x2, y2 in self._roi_tracker.windows(image_name_or_path, bounds)]
+            
+            result = self._anytime_matcher.match(entry, screen_cv, threshold=threshold, budget_ms=time_budget_ms,
+                                                 scales=self._scales_for(entry.name, False), windows=windows)
+            result.offset(offset_x, offset_y)
+            
+            if self._roi_tracking:
+                box = (result.x, result.y, result.width, result.height) if result.found else None
+                self._roi_tracker.record(image_name_or_path, box, roi=result.stage == 'roi')
+            
+            budget_note = f"，預算 {time_budget_ms}ms 已用完" if result.exhausted else ""
+            if not result.found:
+                where = f"最佳候選 {result.center}，" if result.center else ""
+                self.logger(f"[圖片辨識][預算] ❌ 未找到圖片（{where}信心度 {result.confidence:.3f}，"
+                            f"{result.elapsed_ms:.1f}ms{budget_note}）")
+                return result
+            
+            if result.stage != 'features':
+                self._scale_hints.update(entry.name, result.scale)
+            self.logger(f"[圖片辨識][預算] ✅ 找到圖片於 {result.center}（{result.stage}，信心度 {result.confidence:.3f}，"
+                        f"{result.elapsed_ms:.1f}ms{budget_note}）")
+            if show_border:
+                self.show_match_border(result.x, result.y, result.width, result.height)
+            return result
+        
+        except Exception as e:
+            self.logger(f"[圖片辨識] 錯誤：{e}")
+            return None
+    
+    def find_all_images_on_screen(self, image_name_or_path, threshold=0.9, region=None, multi_scale=False,
+                                  order="score", max_results=100, overlap=0.3, show_border=False):
+        """在螢幕上找出圖片的所有位置（例如所有勾選框、所有敵人）
+        
+        每個尺度只做一次 matchTemplate，結果圖一次篩出所有超過閾值的位置，
+        再以非極大值抑制去除重疊的結果
+        
+        Args:
+            image_name_or_path: 圖片顯示名稱或完整路徑
+            threshold: 匹配閾值 (0-1)
+            region: 搜尋區域 (x1, y1, x2, y2)，None表示全螢幕
+            multi_scale: 是否同時搜尋多個尺度（不同尺度的結果一起去除重疊）
+            order: "score" = 分數由高到低，"position" = 由上到下、由左到右
+            max_results: 最多回傳幾個
+            overlap: 兩個結果的最大允許重疊率
+            show_border: 是否在每個結果顯示邊框
+            
+        Returns:
+            [(center_x, center_y, score), ...]，找不到時為空列表
+        """
+        try:
+            entry = self._get_template(image_name_or_path)
+            if entry is None:
+                self.logger(f"[找全部圖片] 無法載入圖片：{image_name_or_path}")
+                return []
+            
+            screen_array = self._grab_rgb(region)
+            screen_cv = self._capturer.to_gray(screen_array)
+            offset_x, offset_y = (region[0], region[1]) if region else (0, 0)
+            scales = self._scales_for(entry.name, False, multi_scale)
+            
+            hits = match_all(screen_cv, entry, entry.mask, threshold=threshold, scales=scales,
+                             overlap=overlap, max_results=max_results, order=order)
+            self.logger(f"[找全部圖片] {'✅' if hits else '❌'} 找到 {len(hits)} 個：{image_name_or_path}")
+            
+            results = []
+            for cx, cy, score, (w, h) in hits:
+                x, y = cx + offset_x, cy + offset_y
+                results.append((x, y, score))
+                if show_border:
+                    self.show_match_border(x - w // 2, y - h // 2, w, h)
+            return results
+        
+        except Exception as e:
+            self.logger(f"[找全部圖片] 錯誤：{e}")
+            return []
+    
+    def _locate_template(self, entry, screen_cv, threshold, multi_scale, strategy, use_features_fallback=True, log=None, screen_color=None):
+        """在灰階截圖中尋找模板（find_image_on_screen 的匹配核心）
+        
+        Args:
+            entry: 模板庫的 CompiledTemplate
+            screen_cv: 灰階螢幕截圖（或其中一塊搜尋視窗）
+            threshold: 匹配閾值
+            multi_scale: 標準模式是否使用多尺度
+            strategy: "fast" / "pyramid" / "standard"
+            use_features_fallback: 模板匹配失敗時，是否嘗試特徵點匹配
+            log: 日誌函式，None 時使用 self.logger
+            screen_color: 與 screen_cv 對齊的彩色截圖（RGB），供驗證比較彩色直方圖
+            
+        Returns:
+            (x, y, w, h) 相對於 screen_cv 的左上角與大小，找不到回傳 None
+        """
+        log = log or self.logger
+        template_gray, mask = entry.gray, entry.mask
+        
+        best_match_val = 0
+        best_match_loc = None
+        best_template_size = None
+        best_scale = 1.0
+        best_primary = 0  # 最佳位置的主要方法分數（相關係數法 / 遮罩相關法，0-1）
+        
+        # 🔥 快速 / 金字塔模式：使用 _match_template_on_screen 方法（跳過多尺度）
+        if strategy in ("fast", "pyramid"):
+            pos = self._match_template_on_screen(
+                screen_cv, entry, None,  # 使用灰度圖，無遮罩
+                threshold=threshold,
+                fast_mode=True,
+                multi_scale=False,  # 快速模式不使用多尺度
+                strategy=strategy,
+                screen_color=screen_color
+            )
+            if not pos:
+                return None
+            center_x, center_y, (w, h) = pos
+            return (center_x - w // 2, center_y - h // 2, w, h)
+        
+        # 🔥 標準模式：多尺度模板匹配（主要方法，支援遮罩）
+        if multi_scale:
+            # 依記憶的最佳尺度由近到遠嘗試，主要方法分數超過閾值一定幅度即提前結束
+            stop_score = min(1.0, threshold + self._scale_exit_margin)
+            for scale in self._scales_for(entry.name, fast_mode=False):
+                # 模板庫已預先縮放，直接取用
+                scaled_template, scaled_mask = entry.variant(scale)
+                height, width = scaled_template.shape[:2]
+                if scale != 1.0 and (width < 10 or height < 10):
+                    continue
+                if width > screen_cv.shape[1] or height > screen_cv.shape[0]:
+                    continue
                 
-                # 確保範圍在螢幕內
-                if x2 <= screen_cv.shape[1] and y2 <= screen_cv.shape[0]:
-                    matched_region = screen_cv[y1:y2, x1:x2]
-                    
-                    # 調整模板大小以匹配找到的區域
-                    if best_scale != 1.0:
-                        template_resized = cv2.resize(template, (w, h), interpolation=cv2.INTER_CUBIC)
-                    else:
-                        template_resized = template
-                    
-                    verification_score = 0
-                    verification_count = 0
-                    
-                    try:
-                        # 🔥 驗證1: 結構相似度 (SSIM) - 最準確的像素級比較
-                        from skimage.metrics import structural_similarity as ssim
-                        
-                        # 轉換為灰階
-                        gray_template = cv2.cvtColor(template_resized, cv2.COLOR_BGR2GRAY)
-                        gray_matched = cv2.cvtColor(matched_region, cv2.COLOR_BGR2GRAY)
-                        
-                        ssim_score = ssim(gray_template, gray_matched)
-                        verification_score += ssim_score * 1.5  # SSIM權重最高
-                        verification_count += 1.5
-                        self.logger(f"[圖片辨識] SSIM驗證: {ssim_score:.3f}")
-                    except ImportError:
-                        # 如果沒有 scikit-image，使用替代方法
-                        pass
-                    except Exception as e:
-                        self.logger(f"[圖片辨識] SSIM驗證失敗: {e}")
-                    
-                    try:
-                        # 🔥 驗證2: 直方圖相似度（顏色分布比較）
-                        hist_template = cv2.calcHist([template_resized], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-                        hist_matched = cv2.calcHist([matched_region], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-                        
-                        cv2.normalize(hist_template, hist_template)
-                        cv2.normalize(hist_matched, hist_matched)
-                        
-                        hist_score = cv2.compareHist(hist_template, hist_matched, cv2.HISTCMP_CORREL)
-                        verification_score += hist_score * 1.0
-                        verification_count += 1.0
-                        self.logger(f"[圖片辨識] 直方圖驗證: {hist_score:.3f}")
-                    except Exception as e:
-                        self.logger(f"[圖片辨識] 直方圖驗證失敗: {e}")
-                    
-                    try:
-                        # 🔥 驗證3: 邊緣檢測相似度（形狀輪廓比較）
-                        edges_template = cv2.Canny(template_resized, 50, 150)
-                        edges_matched = cv2.Canny(matched_region, 50, 150)
-                        
-                        # 計算邊緣重疊率
-                        edge_overlap = np.sum(edges_template & edges_matched)
-                        edge_total = np.sum(edges_template)
-                        edge_score = edge_overlap / edge_total if edge_total > 0 else 0
-                        
-                        verification_score += edge_score * 0.8
-                        verification_count += 0.8
-                        self.logger(f"[圖片辨識] 邊緣驗證: {edge_score:.3f}")
-                    except Exception as e:
-                        self.logger(f"[圖片辨識] 邊緣驗證失敗: {e}")
+                # 🔥 根據是否有遮罩選擇演算法
+                if scaled_mask is not None:
+                    # 有透明遮罩：使用支援遮罩的演算法
+                    log(f"[圖片辨識] 使用透明遮罩進行匹配 (尺度:{scale:.2f})")
+                    result = cv2.matchTemplate(screen_cv, scaled_template, cv2.TM_CCORR_NORMED, mask=scaled_mask)
+                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+                    score = max_val
+                    loc = max_loc
+                    primary_score = score
+                else:
+                    # 無遮罩：使用多種匹配方法並加權平均
+                    methods = [
+                        (cv2.TM_CCOEFF_NORMED, 1.0),   # 相關係數法（權重最高）
+                        (cv2.TM_CCORR_NORMED, 0.8),    # 相關法
+                        (cv2.TM_SQDIFF_NORMED, 0.6),   # 平方差法（需要反轉）
+                    ]
                     
-                    # 計算最終綜合分數
-                    if verification_count > 0:
-                        final_score = (best_match_val * 0.6 + (verification_score / verification_count) * 0.4)
-                        self.logger(f"[圖片辨識] 綜合分數: {final_score:.3f} (模板:{best_match_val:.3f} + 驗證:{verification_score/verification_count:.3f})")
-                    else:
-                        final_score = best_match_val
-                        self.logger(f"[圖片辨識] 最終分數: {final_score:.3f} (僅模板匹配)")
+                    method_scores = []
+                    for method, weight in methods:
+                        try:
+                            result = cv2.matchTemplate(screen_cv, scaled_template, method)
+                            
+                            if method == cv2.TM_SQDIFF_NORMED:
+                                # 平方差法：值越小越好，需要反轉
+                                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+                                score = 1.0 - min_val  # 反轉分數
+                                loc = min_loc
+                            else:
+                                min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
+                                score = max_val
+                                loc = max_loc
+                            
+                            method_scores.append((score * weight, loc))
+                        except Exception as e:
+                            continue
                     
-                    # 使用綜合分數判斷
-                    if final_score >= threshold:
-                        # 計算中心點座標
-                        center_x = best_match_loc[0] + w // 2
-                        center_y = best_match_loc[1] + h // 2
-                        
-                        # 如果有指定region，需要加上偏移
-                        if region:
-                            center_x += region[0]
-                            center_y += region[1]
-                        
-                        self.logger(f"[圖片辨識] ✅ 找到圖片於 ({center_x}, {center_y})")
-                        
-                        # 顯示邊框
-                        if show_border:
-                            x1 = best_match_loc[0] + (region[0] if region else 0)
-                            y1 = best_match_loc[1] + (region[1] if region else 0)
-                            self.show_match_border(x1, y1, w, h)
+                    if not method_scores:
+                        continue
                         
-                        return (center_x, center_y)
-            
-            self.logger(f"[圖片辨識] ❌ 未找到圖片（分數不足）")
-            return None
+                    # 計算加權平均分數
+                    score = sum(s for s, _ in method_scores) / len(method_scores)
+                    loc = method_scores[0][1]  # 使用主要方法的位置
+                    primary_score = method_scores[0][0]  # 相關係數法（權重 1.0）
                 
-        except Exception as e:
-            self.logger(f"[圖片辨識] 錯誤：{e}")
-            import traceback
-            traceback.print_exc()
-            return None
+                # 記錄最佳匹配
+                if score > best_match_val:
+                    best_match_val = score
+                    best_match_loc = loc
+                    best_template_size = (scaled_template.shape[1], scaled_template.shape[0])
+                    best_scale = scale
+                    best_primary = primary_score
+                
+                if primary_score >= stop_score:
+                    break
+        else:
+            # 🔥 單一尺度匹配（支援遮罩）
+            best_match_val, best_match_loc = match_at_scale(screen_cv, template_gray, mask)
+            best_template_size = (template_gray.shape[1], template_gray.shape[0])
+            best_primary = best_match_val
+        
+        log(f"[圖片辨識] 模板匹配度：{best_primary:.3f} (加權:{best_match_val:.3f}, 尺度:{best_scale:.2f}, 閾值：{threshold})")
+        
+        # 🔥 如果模板匹配失敗但接近閾值，嘗試特徵點匹配
+        if use_features_fallback and best_primary < threshold and best_primary >= threshold * FEATURE_RATIO:
+            log(f"[圖片辨識] 模板匹配未達閾值，嘗試特徵點匹配...")
+            # 🔥 只在模板匹配的候選位置附近偵測特徵點
+            w, h = best_template_size
+            margin = max(w, h)
+            feature_region = (best_match_loc[0] - margin, best_match_loc[1] - margin,
+                              best_match_loc[0] + w + margin, best_match_loc[1] + h + margin)
+            feature_x, feature_y, match_count = self.find_image_by_features(entry, screen_cv, region=feature_region)
+            
+            if feature_x is not None and match_count >= 15:  # 需要足夠的特徵點
+                log(f"[圖片辨識] ✅ 特徵點匹配成功於 ({feature_x}, {feature_y})")
+                h, w = template_gray.shape
+                return (feature_x - w // 2, feature_y - h // 2, w, h)
+        
+        # 🔥 階段2: 進階驗證（當模板匹配度接近閾值時）
+        if best_primary >= threshold * VERIFY_RATIO:  # 降低初步門檻，進行更精確驗證
+            w, h = best_template_size
+            x1, y1 = best_match_loc
+            x2, y2 = x1 + w, y1 + h
+            
+            # 確保範圍在螢幕內
+            if x2 <= screen_cv.shape[1] and y2 <= screen_cv.shape[0]:
+                matched_region = screen_cv[y1:y2, x1:x2]
+                matched_color = None
+                if screen_color is not None:
+                    # 驗證器以 BGR 比較彩色直方圖（截圖為 RGB）
+                    matched_color = cv2.cvtColor(screen_color[y1:y2, x1:x2], cv2.COLOR_RGB2BGR)
+                
+                # 🔥 單次驗證：直方圖、邊緣、SSIM（模板端統計已預先計算，有時間預算）
+                verification = self._match_verifier.verify(entry, best_scale, matched_region, matched_color)
+                for metric, value in verification.metrics.items():
+                    log(f"[圖片辨識] {self._VERIFY_LABELS[metric]}驗證: {value:.3f}")
+                
+                # 計算最終綜合分數（以 0-1 的主要方法分數為基準，規則見 match_verifier 模組說明）
+                final_score = combined_score(best_primary, verification.score)
+                if verification.score is not None:
+                    log(f"[圖片辨識] 綜合分數: {final_score:.3f} (模板:{best_primary:.3f} + 驗證:{verification.score:.3f}"
+                        f"{'，已達時間預算' if verification.partial else ''}，{verification.elapsed_ms:.1f}ms)")
+                else:
+                    log(f"[圖片辨識] 最終分數: {final_score:.3f} (僅模板匹配)")
+                
+                # 使用綜合分數判斷
+                if final_score >= threshold:
+                    self._scale_hints.update(entry.name, best_scale)
+                    return (best_match_loc[0], best_match_loc[1], w, h)
+        
+        return None
     
     def _load_image(self, image_name_or_path):
         """載入圖片（支援快取和透明遮罩）
@@ -2499,146 +2985,97 @@ class CoreRecorder:
                 - image_bgr: OpenCV BGR格式的圖片
                 - mask: Alpha通道遮罩（如果有），否則為None
         """
-        # 檢查快取
-        if image_name_or_path in self._image_cache:
-            cached = self._image_cache[image_name_or_path]
-            # 返回灰度圖版本（如果有）
-            if len(cached) > 3 and cached[3] is not None:
-                return cached[3], None  # 灰度圖, 無遮罩
-            return cached[0], cached[2] if len(cached) > 2 else None
-        
+        entry = self._get_template(image_name_or_path)
+        if entry is None:
+            return None, None
+        return entry.bgr, entry.mask
+    
+    def _resolve_image_path(self, image_name_or_path):
+        """將圖片顯示名稱解析為檔案路徑，找不到回傳 None"""
         # 判斷是否為完整路徑
         if os.path.isfile(image_name_or_path):
-            image_path = image_name_or_path
-        else:
-            # 從圖片目錄中尋找
-            if not self._images_dir or not os.path.exists(self._images_dir):
-                self.logger(f"[圖片辨識] 圖片目錄不存在：{self._images_dir}")
-                return None, None
-            
-            # 嘗試尋找匹配的檔案
-            image_path = None
-            for filename in os.listdir(self._images_dir):
-                if filename.endswith(('.png', '.jpg', '.jpeg', '.bmp')):
-                    # 檢查檔名或顯示名稱是否匹配
-                    if image_name_or_path in filename or filename.startswith(image_name_or_path):
-                        image_path = os.path.join(self._images_dir, filename)
-                        break
-            
-            if not image_path:
-                self.logger(f"[圖片辨識] 找不到圖片：{image_name_or_path}")
-                return None, None
+            return image_name_or_path
+        
+        # 從圖片目錄中尋找
+        if not self._images_dir or not os.path.exists(self._images_dir):
+            self.logger(f"[圖片辨識] 圖片目錄不存在：{self._images_dir}")
+            return None
+        
+        # 🔥 透過目錄索引查詢（目錄內容變更時才重新掃描）
+        image_path = self._image_catalog.resolve(image_name_or_path)
+        if image_path:
+            return image_path
+        
+        self.logger(f"[圖片辨識] 找不到圖片：{image_name_or_path}")
+        return None
+    
+    def _get_template(self, image_name_or_path):
+        """從模板庫取得預先編譯的模板，未載入時讀取並編譯一次
+        
+        Returns:
+            CompiledTemplate 或 None
+        """
+        # 檢查快取
+        entry = self._template_bank.get(image_name_or_path)
+        if entry is not None:
+            return entry
+        
+        image_path = self._resolve_image_path(image_name_or_path)
+        if not image_path:
+            return None
         
-        # 載入圖片
         try:
-            # 🔥 使用 IMREAD_UNCHANGED 讀取完整圖片（包含Alpha通道）
-            image_rgba = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
-            if image_rgba is None:
+            # 🔥 一次完成灰階、遮罩、各尺度縮放等前處理並加入模板庫
+            entry = self._template_bank.load(image_name_or_path, image_path)
+            if entry is None:
                 self.logger(f"[圖片辨識] 無法讀取圖片：{image_path}")
-                return None, None
-            
-            mask = None
+                return None
             
-            # 🔥 檢查是否有 Alpha 通道（透明遮罩）
-            if image_rgba.shape[2] == 4:  # RGBA格式
-                # 分離 RGB 和 Alpha
-                bgr = cv2.cvtColor(image_rgba, cv2.COLOR_RGBA2BGR)
-                mask = image_rgba[:, :, 3]  # Alpha通道作為遮罩
-                
-                # 檢查遮罩是否有效（是否真的有透明區域）
-                if np.all(mask == 255):  # 完全不透明
-                    mask = None
-                    self.logger(f"[圖片辨識] 已載入圖片（無透明區域）：{os.path.basename(image_path)}")
-                else:
-                    self.logger(f"[圖片辨識] 已載入圖片（含透明遮罩）：{os.path.basename(image_path)}")
-            else:  # RGB或灰階格式
-                if len(image_rgba.shape) == 2:  # 灰階
-                    bgr = cv2.cvtColor(image_rgba, cv2.COLOR_GRAY2BGR)
-                else:  # RGB
-                    bgr = image_rgba
+            if entry.has_mask:
+                self.logger(f"[圖片辨識] 已載入圖片（含透明遮罩）：{os.path.basename(image_path)}")
+            else:
                 self.logger(f"[圖片辨識] 已載入圖片（不透明）：{os.path.basename(image_path)}")
-            
-            # 🔥 加入快取（包含遮罩資訊）
-            self._image_cache[image_name_or_path] = (bgr, image_path, mask)
-            
-            return bgr, mask
+            return entry
         except Exception as e:
             self.logger(f"[圖片辨識] 載入圖片失敗：{e}")
             import traceback
             traceback.print_exc()
-            return None, None
+            return None
     
     def clear_image_cache(self):
-        """清除圖片快取"""
-        self._image_cache.clear()
-        self.logger("[圖片辨識] 已清除圖片快取")
+        """清除圖片快取（磁碟快取保留，重新載入時直接讀取）"""
+        self._template_bank.flush_features()
+        stats = self._template_bank.stats()
+        self._template_bank.clear()
+        self._image_catalog.invalidate()
+        self._change_detector.clear()
+        self.logger(f"[圖片辨識] 已清除圖片快取（{stats['entries']} 張，{stats['bytes'] / 1024 / 1024:.1f} MB，"
+                    f"命中率 {stats['hit_rate']:.0%}，淘汰 {stats['evictions']} 次）")
     
-    def find_image_by_features(self, template, screen_cv, threshold=0.7, min_match_count=10):
+    def find_image_by_features(self, template, screen_cv, threshold=0.7, min_match_count=10, region=None):
         """使用特徵點匹配尋找圖片（Template Matching 的備案方法）
         
+        🔥 ORB 偵測器重複使用、模板描述子快取在模板庫，並可只在指定範圍內偵測
+        
         Args:
-            template: 模板圖片 (BGR)
-            screen_cv: 螢幕截圖 (BGR)
+            template: 模板庫的 CompiledTemplate 或灰階模板圖片
+            screen_cv: 灰階螢幕截圖
             threshold: Lowe's ratio test 閾值 (0-1)
             min_match_count: 最小匹配點數量
+            region: 只在此範圍 (x1, y1, x2, y2) 內偵測螢幕特徵點，None = 整張截圖
             
         Returns:
-            (center_x, center_y, match_count) 如果找到，否則 (None, None, 0)
+            (center_x, center_y, match_count) 如果找到，否則 (None, None, match_count)
         """
         try:
-            # 🔥 使用 ORB 特徵檢測器（快速且免費）
-            orb = cv2.ORB_create(nfeatures=2000)  # 增加特徵點數量
-            
-            # 檢測關鍵點和描述符
-            kp1, des1 = orb.detectAndCompute(template, None)
-            kp2, des2 = orb.detectAndCompute(screen_cv, None)
-            
-            if des1 is None or des2 is None:
-                self.logger("[特徵匹配] 無法提取特徵點")
-                return None, None, 0
-            
-            # 🔥 使用 BFMatcher 進行特徵點匹配
-            bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
-            matches = bf.knnMatch(des1, des2, k=2)
-            
-            # 🔥 Lowe's ratio test 篩選優質匹配
-            good_matches = []
-            for match_pair in matches:
-                if len(match_pair) == 2:
-                    m, n = match_pair
-                    if m.distance < threshold * n.distance:
-                        good_matches.append(m)
-            
-            match_count = len(good_matches)
-            self.logger(f"[特徵匹配] 找到 {match_count} 個優質匹配點（最小需求：{min_match_count}）")
-            
-            if match_count >= min_match_count:
-                # 🔥 使用 RANSAC 計算單應性矩陣
-                src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                
-                M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-                
-                if M is not None:
-                    # 計算模板四個角點在螢幕上的位置
-                    h, w = template.shape[:2]
-                    pts = np.float32([[0, 0], [0, h-1], [w-1, h-1], [w-1, 0]]).reshape(-1, 1, 2)
-                    dst = cv2.perspectiveTransform(pts, M)
-                    
-                    # 計算中心點
-                    center_x = int(np.mean(dst[:, 0, 0]))
-                    center_y = int(np.mean(dst[:, 0, 1]))
-                    
-                    # 驗證中心點是否在合理範圍內
-                    if 0 <= center_x < screen_cv.shape[1] and 0 <= center_y < screen_cv.shape[0]:
-                        self.logger(f"[特徵匹配] ✅ 找到圖片於 ({center_x}, {center_y})，匹配點數：{match_count}")
-                        return center_x, center_y, match_count
-                    else:
-                        self.logger(f"[特徵匹配] ❌ 中心點超出螢幕範圍")
-                else:
-                    self.logger(f"[特徵匹配] ❌ 無法計算單應性矩陣")
-            
-            return None, None, match_count
+            center_x, center_y, match_count = self._feature_matcher.match(
+                template, screen_cv, region=region, min_match_count=min_match_count, ratio=threshold
+            )
+            if center_x is not None:
+                self.logger(f"[特徵匹配] ✅ 找到圖片於 ({center_x}, {center_y})，匹配點數：{match_count}")
+            else:
+                self.logger(f"[特徵匹配] ❌ 未找到（優質匹配點：{match_count}，最小需求：{min_match_count}）")
+            return center_x, center_y, match_count
             
         except Exception as e:
             self.logger(f"[特徵匹配] 錯誤：{e}")
@@ -2646,14 +3083,76 @@ class CoreRecorder:
             traceback.print_exc()
             return None, None, 0
     
-    def find_images_in_snapshot(self, snapshot, template_list, threshold=0.92, fast_mode=True):
+    def find_images_on_screen(self, image_names, threshold=0.75, region=None, fast_mode=True, strategy=None, first_hit=False, reuse_if_unchanged=False, use_mask=True):
+        """截取一次螢幕並批次辨識多張圖片（所有圖片都在同一時刻的畫面上判斷）
+        
+        Args:
+            image_names: 圖片名稱列表 ['pic01', 'pic02', ...]
+            threshold: 匹配閾值
+            region: 搜尋區域 (x1, y1, x2, y2)，None表示全螢幕
+            fast_mode: 是否使用快速模式
+            strategy: 匹配策略（同 find_images_in_snapshot）
+            first_hit: 排在前面的圖片找到後不再等待後面的圖片（回傳列表中最前面的命中）
+            reuse_if_unchanged: 畫面沒有變化時直接沿用上次相同條件的結果
+            use_mask: 是否套用 PNG 透明遮罩（False = 與 find_image_on_screen 快速模式相同，不使用遮罩）
+            
+        Returns:
+            dict: {'pic01': (x, y), 'pic02': None, ...}（螢幕絕對座標）
+        """
+        try:
+            # 🔥 一次截圖，N 次匹配（直接使用灰階緩衝區）
+            _, snapshot = self._grab_arrays(region)
+            template_list = [{'name': name, 'threshold': threshold} for name in image_names]
+            gate_key = ('images', tuple(image_names), threshold, tuple(region) if region else None, fast_mode, strategy, first_hit, use_mask)
+            results = self._find_images_gated(
+                snapshot, template_list, gate_key if reuse_if_unchanged else None,
+                threshold=threshold, fast_mode=fast_mode, strategy=strategy, first_hit=first_hit, use_mask=use_mask
+            )
+            if region:
+                results = {
+                    name: (pos[0] + region[0], pos[1] + region[1]) if pos else None
+                    for name, pos in results.items()
+                }
+            return results
+        except Exception as e:
+            self.logger(f"[批次辨識] 截圖失敗：{e}")
+            return {name: None for name in image_names}
+    
+    def _find_images_gated(self, snapshot, template_list, gate_key, **kwargs):
+        """find_images_in_snapshot 加上畫面變化閘門
+        
+        Args:
+            snapshot: 螢幕截圖 (PIL.Image 或 numpy array)
+            template_list: 同 find_images_in_snapshot
+            gate_key: 辨識條件鍵，None = 不使用閘門（每次都匹配）
+            **kwargs: 傳給 find_images_in_snapshot 的參數
+        """
+        if gate_key is None:
+            return self.find_images_in_snapshot(snapshot, template_list, **kwargs)
+        
+        frame = snapshot if isinstance(snapshot, np.ndarray) else np.asarray(snapshot)
+        fingerprint = self._change_detector.fingerprint(frame)
+        unchanged, previous = self._change_detector.lookup(gate_key, fingerprint)
+        if unchanged:
+            return dict(previous)
+        
+        results = self.find_images_in_snapshot(snapshot, template_list, **kwargs)
+        self._change_detector.store(gate_key, fingerprint, dict(results))
+        return results
+    
+    def find_images_in_snapshot(self, snapshot, template_list, threshold=0.92, fast_mode=True, strategy=None, first_hit=False, use_mask=True):
         """在同一張螢幕截圖中批次搜尋多張圖片（一次截圖，多次匹配）
         
+        🔥 所有模板（及各尺度）由平行匹配引擎同時對同一張唯讀截圖進行匹配
+        
         Args:
             snapshot: 螢幕截圖 (PIL.Image 或 numpy array)
             template_list: 圖片名稱列表 [{'name': 'pic01', 'threshold': 0.9}, ...]
             threshold: 預設匹配閾值
             fast_mode: 是否使用快速模式
+            strategy: 匹配策略（"pyramid" 使用金字塔匹配，其餘同 fast_mode）
+            first_hit: 提前結束模式，圖片通過閾值時取消排在後面的匹配，回傳列表中最前面的命中
+            use_mask: 是否套用 PNG 透明遮罩（False 時分數與 find_image_on_screen 快速模式一致）
             
         Returns:
             dict: {'pic01': (x, y), 'pic02': None, ...}
@@ -2661,15 +3160,19 @@ class CoreRecorder:
         results = {}
         
         try:
-            # 轉換截圖為 OpenCV 格式（如果需要）
+            # 轉換截圖為灰階（與模板庫的灰階模板一致）
             if not isinstance(snapshot, np.ndarray):
-                screen_cv = cv2.cvtColor(np.array(snapshot), cv2.COLOR_RGB2BGR)
+                screen_cv = cv2.cvtColor(np.array(snapshot), cv2.COLOR_RGB2GRAY)
+            elif snapshot.ndim == 3:
+                screen_cv = cv2.cvtColor(snapshot, cv2.COLOR_BGR2GRAY)
             else:
                 screen_cv = snapshot
             
             self.logger(f"[批次辨識] 開始在同一截圖中搜尋 {len(template_list)} 張圖片")
             
-            # 🔥 批次處理每張圖片
+            jobs = []
+            
+            # 🔥 準備每張圖片的匹配工作
             for template_info in template_list:
                 if isinstance(template_info, dict):
                     img_name = template_info.get('name', '')
@@ -2681,23 +3184,28 @@ class CoreRecorder:
                 if not img_name:
                     continue
                 
-                # 載入模板圖片和遮罩
-                template, mask = self._load_image(img_name)
-                if template is None:
+                # 從模板庫取得預先編譯的模板（含遮罩與各尺度版本）
+                entry = self._get_template(img_name)
+                if entry is None:
                     results[img_name] = None
                     continue
                 
-                # 🔥 在同一張截圖上進行匹配（不重複截圖）
-                pos = self._match_template_on_screen(
-                    screen_cv, template, mask, 
-                    threshold=img_threshold, 
-                    fast_mode=fast_mode
-                )
-                
-                results[img_name] = pos
+                mask = entry.mask if use_mask else None
+                jobs.append((img_name, entry, mask, img_threshold, self._scales_for(img_name, fast_mode)))
+            
+            # 🔥 在同一張截圖上平行匹配（不重複截圖）
+            match_func = None
+            if strategy == "pyramid":
+                match_func = lambda screen, t, m, thr, sc: self._pyramid_matcher.match(
+                    screen, t, m, threshold=thr, scales=sc, stop_score=min(1.0, thr + self._scale_exit_margin))
+            hits = self._match_engine.match_templates(screen_cv, jobs, first_hit=first_hit, match_func=match_func)
+            
+            for img_name, *_ in jobs:
+                hit = hits.get(img_name)
+                results[img_name] = (hit[0], hit[1]) if hit else None
                 
-                if pos:
-                    self.logger(f"[批次辨識] ✅ {img_name} 於 ({pos[0]}, {pos[1]})")
+                if hit:
+                    self.logger(f"[批次辨識] ✅ {img_name} 於 ({hit[0]}, {hit[1]})")
                 else:
                     self.logger(f"[批次辨識] ❌ {img_name} 未找到")
             
@@ -2709,19 +3217,22 @@ class CoreRecorder:
             traceback.print_exc()
             return results
     
-    def _match_template_on_screen(self, screen_cv, template, mask, threshold=0.92, fast_mode=False, multi_scale=True):
+    def _match_template_on_screen(self, screen_cv, template, mask, threshold=0.92, fast_mode=False, multi_scale=True, strategy=None, screen_color=None):
         """在給定的螢幕截圖上進行模板匹配（支援透明遮罩）
         
         Args:
-            screen_cv: 螢幕截圖 (BGR)
-            template: 模板圖片 (BGR)
-            mask: 透明遮罩（可選）
+            screen_cv: 螢幕截圖（與模板相同通道數）
+            template: 模板圖片，或模板庫的 CompiledTemplate（灰階，直接使用預先縮放的版本）
+            mask: 透明遮罩（可選）；template 為 CompiledTemplate 時傳入 None 表示不使用遮罩
             threshold: 匹配閾值
             fast_mode: 快速模式
             multi_scale: 多尺度搜尋
+            strategy: "pyramid" 時改用金字塔粗到細匹配
+            screen_color: 與 screen_cv 對齊的彩色截圖（RGB），啟用候選區域篩選時用於顏色分布比較
             
         Returns:
-            (center_x, center_y) 或 None
+            (center_x, center_y, (w, h)) 或 None；(w, h) 為命中尺度的模板大小
+            （不從尺度記憶回推，其他執行緒同時匹配同一張圖片時也不會錯位）
         """
         try:
             best_match_val = 0
@@ -2729,50 +3240,61 @@ class CoreRecorder:
             best_template_size = None
             best_scale = 1.0
             
-            # 🔥 快速模式：只使用1.0尺度，跳過多尺度搜尋
-            if fast_mode:
-                scales = [1.0]  # 極速模式：只用原始尺寸
-            else:
-                scales = [0.8, 0.85, 0.9, 0.95, 1.0, 1.05, 1.1, 1.15, 1.2] if multi_scale else [1.0]
+            # 🔥 依記憶的最佳尺度排序（快速模式只嘗試最佳尺度，未命中再試 1.0）
+            name = getattr(template, 'name', None)
+            scales = self._scales_for(name, fast_mode, multi_scale)
+            # 快速模式通過閾值即停止；多尺度搜尋需超過閾值一定幅度才提前結束
+            stop_score = threshold if fast_mode else min(1.0, threshold + self._scale_exit_margin)
+            
+            # 🔥 金字塔模式：縮小圖找候選，只在候選 ROI 以原解析度精修
+            if strategy == "pyramid":
+                hit = self._pyramid_matcher.match(screen_cv, template, mask, threshold=threshold,
+                                                  scales=scales, stop_score=stop_score)
+                if not hit:
+                    return None
+                if name:
+                    width = template_shape(template)[1]
+                    self._scale_hints.update(name, min(scales, key=lambda sc: abs(int(width * sc) - hit[3][0])))
+                return (hit[0], hit[1], tuple(hit[3]))
+            
+            # 🔥 候選區域篩選：積分影像每張截圖只計算一次，各尺度共用（灰階、無遮罩時才適用）
+            integrals = None
+            use_prefilter = self._prefilter_enabled and screen_cv.ndim == 2
             
             for scale in scales:
                 if scale != 1.0:
-                    width = int(template.shape[1] * scale)
-                    height = int(template.shape[0] * scale)
+                    height, width = template_shape(template)[:2]
+                    width, height = int(width * scale), int(height * scale)
                     if width < 10 or height < 10 or width > screen_cv.shape[1] or height > screen_cv.shape[0]:
                         continue
-                    scaled_template = cv2.resize(template, (width, height), interpolation=cv2.INTER_CUBIC)
-                    scaled_mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST) if mask is not None else None
-                else:
-                    scaled_template = template
-                    scaled_mask = mask
+                scaled_template, scaled_mask = template_variant(template, mask, scale)
                 
-                # 🔥 使用遮罩進行匹配（如果有透明背景）
-                if scaled_mask is not None:
-                    # 支援遮罩的演算法：TM_CCORR_NORMED 或 TM_SQDIFF
-                    result = cv2.matchTemplate(screen_cv, scaled_template, cv2.TM_CCORR_NORMED, mask=scaled_mask)
-                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                    score = max_val
-                    loc = max_loc
+                if use_prefilter and scaled_mask is None:
+                    if integrals is None:
+                        integrals = ScreenIntegrals(screen_cv, screen_color)
+                    score, loc, _ = self._match_prefilter.match(
+                        integrals, scaled_template, self._template_rgb(template, scaled_template, screen_color))
                 else:
-                    # 無遮罩：使用標準演算法
-                    result = cv2.matchTemplate(screen_cv, scaled_template, cv2.TM_CCOEFF_NORMED)
-                    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-                    score = max_val
-                    loc = max_loc
+                    # 🔥 有透明背景時使用遮罩匹配（TM_CCORR_NORMED），否則 TM_CCOEFF_NORMED
+                    score, loc = match_at_scale(screen_cv, scaled_template, scaled_mask)
                 
                 if score > best_match_val:
                     best_match_val = score
                     best_match_loc = loc
                     best_template_size = (scaled_template.shape[1], scaled_template.shape[0])
                     best_scale = scale
+                
+                if best_match_val >= stop_score:
+                    break
             
             # 判斷是否達到閾值
             if best_match_val >= threshold:
+                if name:
+                    self._scale_hints.update(name, best_scale)
                 w, h = best_template_size
                 center_x = best_match_loc[0] + w // 2
                 center_y = best_match_loc[1] + h // 2
-                return (center_x, center_y)
+                return (center_x, center_y, (w, h))
             else:
                 return None
                 
@@ -2780,78 +3302,15 @@ class CoreRecorder:
             self.logger(f"[模板匹配] 錯誤：{e}")
             return None
     
-    def find_image_by_features(self, template, screen_cv, threshold=0.7, min_match_count=10):
-        """使用特徵點匹配尋找圖片（Template Matching 的備案方法）
-        
-        Args:
-            template: 模板圖片 (BGR)
-            screen_cv: 螢幕截圖 (BGR)
-            threshold: Lowe's ratio test 閾值 (0-1)
-            min_match_count: 最小匹配點數量
-            
-        Returns:
-            (center_x, center_y, match_count) 如果找到，否則 (None, None, 0)
-        """
-        try:
-            # 🔥 使用 ORB 特徵檢測器（快速且免費）
-            orb = cv2.ORB_create(nfeatures=2000)  # 增加特徵點數量
-            
-            # 檢測關鍵點和描述符
-            kp1, des1 = orb.detectAndCompute(template, None)
-            kp2, des2 = orb.detectAndCompute(screen_cv, None)
-            
-            if des1 is None or des2 is None:
-                self.logger("[特徵匹配] 無法提取特徵點")
-                return None, None, 0
-            
-            # 🔥 使用 BFMatcher 進行特徵點匹配
-            bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)
-            matches = bf.knnMatch(des1, des2, k=2)
-            
-            # 🔥 Lowe's ratio test 篩選優質匹配
-            good_matches = []
-            for match_pair in matches:
-                if len(match_pair) == 2:
-                    m, n = match_pair
-                    if m.distance < threshold * n.distance:
-                        good_matches.append(m)
-            
-            match_count = len(good_matches)
-            self.logger(f"[特徵匹配] 找到 {match_count} 個優質匹配點（最小需求：{min_match_count}）")
-            
-            if match_count >= min_match_count:
-                # 🔥 使用 RANSAC 計算單應性矩陣
-                src_pts = np.float32([kp1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                dst_pts = np.float32([kp2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-                
-                M, mask = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
-                
-                if M is not None:
-                    # 計算模板四個角點在螢幕上的位置
-                    h, w = template.shape[:2]
-                    pts = np.float32([[0, 0], [0, h-1], [w-1, h-1], [w-1, 0]]).reshape(-1, 1, 2)
-                    dst = cv2.perspectiveTransform(pts, M)
-                    
-                    # 計算中心點
-                    center_x = int(np.mean(dst[:, 0, 0]))
-                    center_y = int(np.mean(dst[:, 0, 1]))
-                    
-                    # 驗證中心點是否在合理範圍內
-                    if 0 <= center_x < screen_cv.shape[1] and 0 <= center_y < screen_cv.shape[0]:
-                        self.logger(f"[特徵匹配] ✅ 找到圖片於 ({center_x}, {center_y})，匹配點數：{match_count}")
-                        return center_x, center_y, match_count
-                    else:
-                        self.logger(f"[特徵匹配] ✖ 中心點超出螢幕範圍")
-                else:
-                    self.logger(f"[特徵匹配] ✖ 無法計算單應性矩陣")
-            
-            return None, None, match_count
-            
-        except Exception as e:
-            self.logger(f"[特徵匹配] 錯誤：{e}")
-            import traceback
-            traceback.print_exc()
-            return None, None, 0
+    @staticmethod
+    def _template_rgb(template, scaled_template, screen_color):
+        """取得與縮放後模板同大小的彩色模板（RGB），沒有彩色截圖或彩色模板時回傳 None"""
+        if screen_color is None or not hasattr(template, 'bgr'):
+            return None
+        bgr = template.bgr
+        if bgr.shape[:2] != scaled_template.shape[:2]:
+            bgr = cv2.resize(bgr, (scaled_template.shape[1], scaled_template.shape[0]), interpolation=cv2.INTER_CUBIC)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
     
     def execute_image_action(self, action_type, target_name, button="left", **kwargs):
         """執行圖片辨識相關動作
@@ -2905,7 +3364,8 @@ class CoreRecorder:
             # 等待圖片出現
             start_time = time.time()
             while time.time() - start_time < timeout:
-                pos = self.find_image_on_screen(target_name, threshold, region)
+                # 畫面未變化時沿用上次結果，閒置等待幾乎不耗 CPU
+                pos = self.find_image_on_screen(target_name, threshold, region, reuse_if_unchanged=True)
                 if pos:
                     self.logger(f"[圖片辨識] 已找到 {target_name}")
                     return True
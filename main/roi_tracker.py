@@ -0,0 +1,143 @@
+"""
+ROITracker - 圖片位置記憶（搜尋視窗追蹤）
+記住每張模板上次找到的位置，下次優先在附近的小範圍內搜尋
+
+特性：
+- 以上次命中的位置為中心，依序擴大搜尋視窗（小 → 中 → 大）
+- 所有視窗都找不到時，由呼叫端回退到完整搜尋範圍
+- 連續多次未找到時忘記位置，避免持續浪費時間在錯誤的視窗
+- 每張模板各自統計命中率
+
+使用方式:
+    from roi_tracker import ROITracker
+
+    tracker = ROITracker()
+    for window in tracker.windows("pic01", (0, 0, 1920, 1080)):
+        box = search(window)  # (x, y, w, h) 絕對座標
+        if box:
+            tracker.record("pic01", box, roi=True)
+            break
+    else:
+        box = search((0, 0, 1920, 1080))
+        tracker.record("pic01", box, roi=False)
+"""
+
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# (x1, y1, x2, y2)
+Box = Tuple[int, int, int, int]
+
+
+class _TrackState:
+    """單張模板的追蹤狀態"""
+    __slots__ = ('last_box', 'consecutive_misses', 'lookups', 'roi_hits', 'full_hits', 'misses')
+
+    def __init__(self):
+        self.last_box: Optional[Tuple[int, int, int, int]] = None  # (x, y, w, h)
+        self.consecutive_misses = 0
+        self.lookups = 0
+        self.roi_hits = 0
+        self.full_hits = 0
+        self.misses = 0
+
+
+class ROITracker:
+    """圖片位置記憶（執行緒安全）"""
+
+    def __init__(self, margins: Sequence[float] = (0.25, 1.0, 4.0), min_margin: int = 8, forget_after: int = 3):
+        """初始化追蹤器
+
+        Args:
+            margins: 各階段視窗向外擴張的距離（模板長邊的倍數）
+            min_margin: 視窗向外擴張的最小像素數
+            forget_after: 連續未找到幾次後忘記位置
+        """
+        self.margins = list(margins)
+        self.min_margin = min_margin
+        self.forget_after = forget_after
+        self._states: Dict[str, _TrackState] = {}
+        self._lock = threading.Lock()
+
+    def windows(self, key: str, bounds: Box) -> List[Box]:
+        """取得依序嘗試的搜尋視窗（絕對座標，已裁切到 bounds 內）
+
+        Args:
+            key: 模板名稱
+            bounds: 完整搜尋範圍 (x1, y1, x2, y2)
+
+        Returns:
+            由小到大的視窗列表；沒有位置記憶時為空列表（直接搜尋完整範圍）
+        """
+        with self._lock:
+            state = self._states.get(key)
+            last_box = state.last_box if state else None
+        if last_box is None:
+            return []
+
+        x, y, w, h = last_box
+        bx1, by1, bx2, by2 = bounds
+        windows = []
+        for factor in self.margins:
+            margin = max(self.min_margin, int(max(w, h) * factor))
+            window = (max(bx1, x - margin), max(by1, y - margin),
+                      min(bx2, x + w + margin), min(by2, y + h + margin))
+            # 視窗必須容得下模板，且與完整範圍不同
+            if window[2] - window[0] < w or window[3] - window[1] < h:
+                continue
+            if window == tuple(bounds):
+                break
+            if windows and window == windows[-1]:
+                continue
+            windows.append(window)
+        return windows
+
+    def record(self, key: str, box: Optional[Tuple[int, int, int, int]], roi: bool = False) -> None:
+        """記錄一次搜尋結果
+
+        Args:
+            key: 模板名稱
+            box: 找到的位置 (x, y, w, h)（絕對座標），未找到為 None
+            roi: 是否在位置記憶的視窗內找到
+        """
+        with self._lock:
+            state = self._states.setdefault(key, _TrackState())
+            state.lookups += 1
+            if box is None:
+                state.misses += 1
+                state.consecutive_misses += 1
+                if state.consecutive_misses >= self.forget_after:
+                    state.last_box = None
+                return
+            state.consecutive_misses = 0
+            state.last_box = tuple(box)
+            if roi:
+                state.roi_hits += 1
+            else:
+                state.full_hits += 1
+
+    def forget(self, key: Optional[str] = None) -> None:
+        """清除位置記憶與統計，key 為 None 時清除全部"""
+        with self._lock:
+            if key is None:
+                self._states.clear()
+            else:
+                self._states.pop(key, None)
+
+    def stats(self, key: str) -> Dict[str, float]:
+        """取得單張模板的統計（roi_hit_rate = 在小視窗內找到的比例）"""
+        with self._lock:
+            state = self._states.get(key) or _TrackState()
+            return {
+                'lookups': state.lookups,
+                'roi_hits': state.roi_hits,
+                'full_hits': state.full_hits,
+                'misses': state.misses,
+                'roi_hit_rate': state.roi_hits / state.lookups if state.lookups else 0.0,
+            }
+
+    def all_stats(self) -> Dict[str, Dict[str, float]]:
+        """取得所有模板的統計"""
+        with self._lock:
+            keys = list(self._states)
+        return {key: self.stats(key) for key in keys}
@@ -0,0 +1,88 @@
+"""
+ScaleHints - 模板最佳尺度記憶
+記住每張模板上次成功匹配的尺度，並保存在圖片目錄中，重新開啟程式後仍然有效
+
+多尺度搜尋依「與最佳尺度的距離」由近到遠排序，搭配提前結束，
+DPI 縮放的環境在第一次成功後，之後第一個嘗試的尺度就會命中。
+
+使用方式:
+    from scale_hints import ScaleHints
+
+    hints = ScaleHints("scripts/images")
+    for scale in hints.order("pic01", [0.9, 1.0, 1.1]):
+        ...
+    hints.update("pic01", 1.1)  # 尺度改變時才寫入檔案
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+HINTS_FILENAME = ".scale_hints.json"
+
+
+class ScaleHints:
+    """模板最佳尺度記憶（執行緒安全）"""
+
+    def __init__(self, directory: Optional[str] = None):
+        """初始化並載入既有記錄
+
+        Args:
+            directory: 保存記錄的目錄（通常為圖片目錄），None = 只保留在記憶體
+        """
+        self.path = os.path.join(directory, HINTS_FILENAME) if directory else None
+        self._hints: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._hints = {str(name): float(scale) for name, scale in data.items()}
+        except (OSError, ValueError, AttributeError):
+            # 檔案損壞時重新累積
+            self._hints = {}
+
+    def _save(self) -> None:
+        """寫入檔案（先寫暫存檔再取代，避免寫到一半造成檔案損壞）"""
+        if not self.path or not os.path.isdir(os.path.dirname(self.path)):
+            return
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._hints, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def get(self, name: str, default: float = 1.0) -> float:
+        """取得模板的最佳尺度，沒有記錄時回傳 default"""
+        with self._lock:
+            return self._hints.get(name, default)
+
+    def order(self, name: str, scales: Sequence[float]) -> List[float]:
+        """依與最佳尺度的距離由近到遠排序（距離相同時較小的尺度優先）"""
+        best = self.get(name)
+        return sorted(scales, key=lambda scale: (round(abs(scale - best), 6), scale))
+
+    def update(self, name: str, scale: float) -> None:
+        """記錄成功匹配的尺度（與既有記錄不同時才寫入檔案）"""
+        scale = round(float(scale), 4)
+        with self._lock:
+            if self._hints.get(name) == scale:
+                return
+            self._hints[name] = scale
+            self._save()
+
+    def forget(self, name: Optional[str] = None) -> None:
+        """清除記錄，name 為 None 時清除全部"""
+        with self._lock:
+            if name is None:
+                self._hints.clear()
+            else:
+                self._hints.pop(name, None)
+            self._save()
@@ -0,0 +1,250 @@
+"""
+ScreenCapture - 螢幕截圖後端與重複使用的緩衝區
+截圖直接寫入預先配置的 NumPy 緩衝區，灰階轉換也寫入重複使用的緩衝區，
+每次辨識不再配置數十 MB 的新陣列（多螢幕、高解析度時差異最明顯）
+
+後端：
+- ImageGrabBackend: 使用 PIL.ImageGrab（預設；PIL 內部仍會配置影像，只省下後續的複製與轉換）
+- MSSBackend: 使用 mss（需明確指定），原始 BGRA 資料以零複製方式轉為 RGB 直接寫入緩衝區
+  （DPI 縮放與多螢幕座標原點可能與 ImageGrab 不同，切換前請確認範圍座標一致）
+- ArrayBackend: 記憶體中的固定畫面（測試、基準測試用），完全不配置記憶體
+- CallableBackend: 包裝舊式截圖函式 source(bbox) -> PIL.Image
+- FrameBusBackend: 從共用截圖匯流排的最新畫面取出範圍
+
+所有後端都只截取要求的範圍。ScreenCapturer 傳回的陣列屬於緩衝區，
+在同一執行緒下一次截圖前有效；需要保留時請自行 copy()。
+
+使用方式:
+    from screen_capture import ScreenCapturer, create_backend
+
+    capturer = ScreenCapturer(create_backend("auto"))
+    rgb, gray = capturer.grab_gray((0, 0, 800, 600))
+    print(capturer.stats())
+"""
+
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import ImageGrab
+
+try:
+    import mss
+    MSS_AVAILABLE = True
+except ImportError:
+    MSS_AVAILABLE = False
+
+Region = Tuple[int, int, int, int]
+
+
+class CaptureBackend:
+    """截圖後端基底類別"""
+
+    name = "base"
+
+    def capture_into(self, region: Optional[Region], allocate: Callable[[Tuple[int, int, int]], np.ndarray]) -> np.ndarray:
+        """截取範圍並寫入 allocate(shape) 取得的緩衝區
+
+        Args:
+            region: 截取範圍 (x1, y1, x2, y2)，None = 主螢幕全畫面
+            allocate: 依 (高, 寬, 3) 取得可寫入的 uint8 緩衝區
+
+        Returns:
+            寫入完成的 RGB 緩衝區
+        """
+        raise NotImplementedError
+
+
+class ImageGrabBackend(CaptureBackend):
+    """PIL.ImageGrab 後端"""
+
+    name = "imagegrab"
+
+    def capture_into(self, region, allocate):
+        image = ImageGrab.grab(bbox=tuple(region)) if region else ImageGrab.grab()
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        array = np.asarray(image)
+        out = allocate(array.shape)
+        np.copyto(out, array)
+        return out
+
+
+class MSSBackend(CaptureBackend):
+    """mss 後端（每個執行緒各自建立 mss 實例）"""
+
+    name = "mss"
+
+    def __init__(self):
+        if not MSS_AVAILABLE:
+            raise ImportError("需要安裝 mss 套件")
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, 'sct', None)
+        if sct is None:
+            sct = mss.mss()
+            self._local.sct = sct
+        return sct
+
+    def capture_into(self, region, allocate):
+        sct = self._sct()
+        if region:
+            x1, y1, x2, y2 = region
+            monitor = {'left': int(x1), 'top': int(y1), 'width': int(x2 - x1), 'height': int(y2 - y1)}
+        else:
+            monitor = sct.monitors[1]  # 主螢幕（與 ImageGrab.grab() 相同）
+        shot = sct.grab(monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        out = allocate((shot.height, shot.width, 3))
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB, dst=out)
+        return out
+
+
+class ArrayBackend(CaptureBackend):
+    """記憶體中的固定畫面（RGB），測試與基準測試用"""
+
+    name = "array"
+
+    def __init__(self, frame: np.ndarray):
+        self.frame = frame
+
+    def set_frame(self, frame: np.ndarray) -> None:
+        """更換畫面（模擬畫面變化）"""
+        self.frame = frame
+
+    def capture_into(self, region, allocate):
+        frame = self.frame
+        if region:
+            x1, y1, x2, y2 = (int(v) for v in region)
+            frame = frame[max(0, y1):max(0, y2), max(0, x1):max(0, x2)]
+        out = allocate(frame.shape)
+        np.copyto(out, frame)
+        return out
+
+
+class CallableBackend(CaptureBackend):
+    """包裝截圖函式 source(bbox) -> PIL.Image（RGB）"""
+
+    name = "callable"
+
+    def __init__(self, source: Callable[[Optional[Region]], object]):
+        self.source = source
+
+    def capture_into(self, region, allocate):
+        array = np.asarray(self.source(tuple(region) if region else None))
+        if array.ndim == 3 and array.shape[2] == 4:
+            array = array[:, :, :3]
+        out = allocate(array.shape)
+        np.copyto(out, array)
+        return out
+
+
+class FrameBusBackend(CaptureBackend):
+    """從共用截圖匯流排的最新畫面取出範圍
+
+    匯流排沒有畫面、或範圍不完全在畫面內（主螢幕以外的螢幕，座標可能為負數）時改用 fallback
+    """
+
+    name = "framebus"
+
+    def __init__(self, bus, fallback: CaptureBackend, max_age: Optional[float] = None):
+        self.bus = bus
+        self.fallback = fallback
+        self.max_age = max_age
+
+    def capture_into(self, region, allocate):
+        with self.bus.borrow(max_age=self.max_age) as frame:
+            if frame is not None and frame.covers(region):
+                source = frame.array
+                if region:
+                    x1, y1, x2, y2 = (int(v) for v in region)
+                    source = source[y1:y2, x1:x2]
+                out = allocate(source.shape)
+                np.copyto(out, source)
+                return out
+        return self.fallback.capture_into(region, allocate)
+
+
+def create_backend(kind: str = "auto") -> CaptureBackend:
+    """建立截圖後端
+
+    Args:
+        kind: "auto" / "imagegrab"（ImageGrab，與過去的截圖行為相同）/ "mss"（需安裝 mss）
+
+    mss 不會自動啟用：它的 DPI 處理與多螢幕座標原點和 ImageGrab 不一定相同，
+    同一個範圍可能截到不同的位置或大小
+    """
+    if kind == "mss":
+        return MSSBackend()
+    if kind not in ("auto", "imagegrab"):
+        raise ValueError(f"未知的截圖後端: {kind}（可用: auto, imagegrab, mss）")
+    return ImageGrabBackend()
+
+
+class ScreenCapturer:
+    """以重複使用的緩衝區截圖（每個執行緒各自一組緩衝區）"""
+
+    def __init__(self, backend: Optional[CaptureBackend] = None):
+        """
+        Args:
+            backend: 預設截圖後端，None = create_backend("auto")
+        """
+        self.backend = backend or create_backend("auto")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        # 統計
+        self.captures = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+
+    def _buffer(self, kind: str, shape: Tuple[int, ...]) -> np.ndarray:
+        """取得指定形狀的緩衝區（容量不足時才重新配置，否則回傳既有記憶體的檢視）"""
+        pool: Dict[str, np.ndarray] = getattr(self._local, 'pool', None)
+        if pool is None:
+            pool = self._local.pool = {}
+        size = int(np.prod(shape))
+        backing = pool.get(kind)
+        if backing is None or backing.size < size:
+            backing = np.empty(size, dtype=np.uint8)
+            pool[kind] = backing
+            with self._lock:
+                self.allocations += 1
+                self.allocated_bytes += size
+        return backing[:size].reshape(shape)
+
+    def grab(self, region: Optional[Region] = None, backend: Optional[CaptureBackend] = None) -> np.ndarray:
+        """截圖（RGB），回傳重複使用的緩衝區
+
+        Args:
+            region: 截取範圍 (x1, y1, x2, y2)，None = 主螢幕全畫面
+            backend: 本次使用的後端，None = 預設後端
+        """
+        rgb = (backend or self.backend).capture_into(region, lambda shape: self._buffer('rgb', shape))
+        with self._lock:
+            self.captures += 1
+        return rgb
+
+    def to_gray(self, rgb: np.ndarray, kind: str = 'gray') -> np.ndarray:
+        """RGB 轉灰階，寫入重複使用的緩衝區（kind 區分同時需要保留的多個灰階結果）"""
+        gray = self._buffer(kind, rgb.shape[:2])
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY, dst=gray)
+        return gray
+
+    def grab_gray(self, region: Optional[Region] = None,
+                  backend: Optional[CaptureBackend] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """截圖並轉為灰階，回傳 (RGB, 灰階)，兩者皆為重複使用的緩衝區"""
+        rgb = self.grab(region, backend)
+        return rgb, self.to_gray(rgb)
+
+    def stats(self) -> dict:
+        """取得統計（allocations = 緩衝區配置次數，穩定後不再增加）"""
+        with self._lock:
+            return {
+                'backend': self.backend.name,
+                'captures': self.captures,
+                'allocations': self.allocations,
+                'allocated_bytes': self.allocated_bytes,
+            }
@@ -0,0 +1,320 @@
+"""
+TemplateBank - 預先編譯的模板庫
+模板載入時一次完成所有前處理，匹配迴圈不再做任何逐次轉換
+
+每張模板在載入時預先計算：
+- 灰階版本
+- 透明遮罩（完全不透明時視為無遮罩）
+- 各尺度的縮放版本（模板 INTER_CUBIC，遮罩 INTER_NEAREST）
+- 各尺度的平均值 / 標準差（供篩選與驗證使用）
+- 金字塔匹配用的縮小版本（首次使用時計算後保留）
+- 特徵點匹配用的 ORB 特徵點與描述子（首次使用時由 FeatureMatcher 計算後保留）
+
+設定磁碟快取（TemplateDiskCache）後，前處理結果與特徵點會保存到圖片目錄下，
+之後載入同一張圖片時以 mmap 直接讀取，不再解碼與縮放
+
+模板庫為有容量上限的 LRU 快取：
+- 以位元組計算佔用量（含所有預處理版本），超過上限時淘汰最久未使用的模板
+- 目前腳本引用的模板可「釘選」，不會被淘汰
+- 統計命中 / 未命中 / 淘汰次數
+
+使用方式:
+    from template_bank import TemplateBank
+
+    bank = TemplateBank(max_bytes=128 * 1024 * 1024)
+    bank.pin(["pic01", "pic02"])
+    entry = bank.get("pic01") or bank.load("pic01", "images/pic01.png")
+    gray, mask = entry.variant(1.1)
+    print(bank.stats())
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+from image_matcher import DEFAULT_SCALES, scale_template
+
+# 模板庫預設容量上限（位元組）
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class CompiledTemplate:
+    """預處理完成的單張模板
+
+    屬性：
+        name: 顯示名稱（快取鍵）
+        path: 圖片檔案路徑
+        bgr: 原始 BGR 圖片
+        gray: 灰階圖片
+        mask: Alpha 遮罩（無透明區域時為 None）
+        features: ORB 特徵 (關鍵點座標, 描述子)，尚未計算時為 None
+        cache_key: 磁碟快取的鍵（尚未寫入或未使用磁碟快取時為 None）
+        features_cached: 特徵點是否已寫入磁碟快取
+    """
+
+    def __init__(self, name: str, path: str, bgr: np.ndarray, mask: Optional[np.ndarray] = None,
+                 scales: Iterable[float] = DEFAULT_SCALES):
+        self.name = name
+        self.path = path
+        self.bgr = bgr
+        self.gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        # 檢查遮罩是否有效（是否真的有透明區域）
+        self.mask = mask if mask is not None and not np.all(mask == 255) else None
+
+        self._variants: Dict[float, Tuple[np.ndarray, Optional[np.ndarray]]] = {1.0: (self.gray, self.mask)}
+        self._downsampled: Dict[Tuple[float, int], Tuple[np.ndarray, Optional[np.ndarray]]] = {}
+        self.norms: Dict[float, Tuple[float, float]] = {}
+        self.features: Optional[Tuple[np.ndarray, Optional[np.ndarray]]] = None
+        self.cache_key: Optional[str] = None
+        self.features_cached = False
+
+        for scale in scales:
+            self.variant(scale)
+
+    @classmethod
+    def from_arrays(cls, name: str, path: str, bgr: np.ndarray, mask: Optional[np.ndarray],
+                    variants: Dict[float, Tuple[np.ndarray, Optional[np.ndarray]]],
+                    norms: Dict[float, Tuple[float, float]]) -> 'CompiledTemplate':
+        """從已完成前處理的陣列建立模板（磁碟快取載入用，不重新計算）
+
+        Args:
+            variants: {尺度: (灰階模板, 遮罩)}，需包含 1.0
+            norms: {尺度: (平均值, 標準差)}
+        """
+        entry = cls.__new__(cls)
+        entry.name = name
+        entry.path = path
+        entry.bgr = bgr
+        entry.gray = variants[1.0][0]
+        entry.mask = mask
+        entry._variants = dict(variants)
+        entry._downsampled = {}
+        entry.norms = dict(norms)
+        entry.features = None
+        entry.cache_key = None
+        entry.features_cached = False
+        return entry
+
+    @classmethod
+    def from_image(cls, name: str, path: str, image: np.ndarray,
+                   scales: Iterable[float] = DEFAULT_SCALES) -> 'CompiledTemplate':
+        """從 cv2.imread(IMREAD_UNCHANGED) 的結果建立模板（支援 RGBA / RGB / 灰階）"""
+        mask = None
+        if len(image.shape) == 2:  # 灰階
+            bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif image.shape[2] == 4:  # 含 Alpha 通道
+            bgr = cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+            mask = image[:, :, 3].copy()
+        else:
+            bgr = image
+        return cls(name, path, bgr, mask, scales)
+
+    @property
+    def has_mask(self) -> bool:
+        return self.mask is not None
+
+    @property
+    def scales(self) -> List[float]:
+        """已計算的尺度"""
+        return list(self._variants)
+
+    @property
+    def nbytes(self) -> int:
+        """模板與所有預處理版本佔用的位元組數"""
+        total = self.bgr.nbytes
+        for gray, mask in list(self._variants.values()) + list(self._downsampled.values()):
+            total += gray.nbytes + (mask.nbytes if mask is not None else 0)
+        if self.features is not None:
+            points, descriptors = self.features
+            total += points.nbytes + (descriptors.nbytes if descriptors is not None else 0)
+        return total
+
+    def variant(self, scale: float) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """取得指定尺度的 (灰階模板, 遮罩)，未預先計算的尺度會計算一次後保留"""
+        cached = self._variants.get(scale)
+        if cached is None:
+            cached = scale_template(self.gray, self.mask, scale)
+            self._variants[scale] = cached
+        if scale not in self.norms:
+            gray, mask = cached
+            mean, std = cv2.meanStdDev(gray, mask=mask)
+            self.norms[scale] = (float(mean[0][0]), float(std[0][0]))
+        return cached
+
+    def downsampled(self, scale: float, factor: int) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """取得金字塔匹配用的縮小版本（先縮放到 scale，再縮小 factor 倍）"""
+        key = (scale, factor)
+        cached = self._downsampled.get(key)
+        if cached is None:
+            gray, mask = self.variant(scale)
+            h, w = gray.shape[:2]
+            small_w, small_h = max(1, w // factor), max(1, h // factor)
+            small = cv2.resize(gray, (small_w, small_h), interpolation=cv2.INTER_AREA)
+            small_mask = cv2.resize(mask, (small_w, small_h), interpolation=cv2.INTER_NEAREST) if mask is not None else None
+            cached = (small, small_mask)
+            self._downsampled[key] = cached
+        return cached
+
+
+class TemplateBank:
+    """模板庫：有容量上限的 LRU 快取（以顯示名稱或路徑為鍵，執行緒安全）"""
+
+    def __init__(self, scales: Iterable[float] = DEFAULT_SCALES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 disk_cache=None):
+        """初始化模板庫
+
+        Args:
+            scales: 載入時預先計算的尺度
+            max_bytes: 容量上限（位元組），0 或 None = 不限制
+            disk_cache: TemplateDiskCache（可選），載入時優先從磁碟快取讀取
+        """
+        self.scales = list(scales)
+        self.max_bytes = max_bytes
+        self.disk_cache = disk_cache
+        self._entries: 'OrderedDict[str, CompiledTemplate]' = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._pinned: Set[str] = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CompiledTemplate]:
+        """取得已載入的模板（標記為最近使用），未載入回傳 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            # 金字塔縮小版本等延遲計算的資料會讓佔用量增加，重新計算
+            self._account(key, entry.nbytes)
+            return entry
+
+    def load(self, key: str, path: str) -> Optional[CompiledTemplate]:
+        """讀取圖片並編譯為模板
+
+        Args:
+            key: 快取鍵（顯示名稱或路徑）
+            path: 圖片檔案路徑
+
+        Returns:
+            CompiledTemplate，讀取失敗回傳 None
+        """
+        disk_cache = self.disk_cache
+        entry = disk_cache.load(key, path) if disk_cache is not None else None
+        if entry is None:
+            # 🔥 使用 IMREAD_UNCHANGED 讀取完整圖片（包含Alpha通道）
+            image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                return None
+            entry = CompiledTemplate.from_image(key, path, image, self.scales)
+            if disk_cache is not None:
+                disk_cache.store(entry)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._account(key, entry.nbytes)
+            self._evict(keep=key)
+        return entry
+
+    def _account(self, key: str, size: int) -> None:
+        """更新單一模板的佔用量（需持有鎖）"""
+        self._bytes += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """淘汰最久未使用且未釘選的模板，直到佔用量低於上限（需持有鎖）"""
+        if not self.max_bytes or self._bytes <= self.max_bytes:
+            return
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if key == keep or key in self._pinned:
+                continue
+            del self._entries[key]
+            self._bytes -= self._sizes.pop(key, 0)
+            self.evictions += 1
+
+    def set_disk_cache(self, disk_cache) -> None:
+        """設定磁碟快取（None = 停用），已載入的模板不受影響"""
+        self.flush_features()
+        self.disk_cache = disk_cache
+
+    def flush_features(self) -> int:
+        """將新計算的特徵點寫入磁碟快取
+
+        Returns:
+            寫入的模板數量
+        """
+        disk_cache = self.disk_cache
+        if disk_cache is None:
+            return 0
+        with self._lock:
+            pending = [entry for entry in self._entries.values()
+                       if entry.features is not None and not entry.features_cached]
+        return sum(1 for entry in pending if disk_cache.store_features(entry))
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        """調整容量上限（立即淘汰超出的模板）"""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def pin(self, keys: Iterable[str]) -> None:
+        """釘選模板（尚未載入的名稱也可釘選，載入後即受保護）"""
+        with self._lock:
+            self._pinned.update(keys)
+
+    def unpin(self, keys: Optional[Iterable[str]] = None) -> None:
+        """取消釘選，keys 為 None 時取消全部"""
+        with self._lock:
+            if keys is None:
+                self._pinned.clear()
+            else:
+                self._pinned.difference_update(keys)
+            self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """取得快取統計資訊"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'pinned': len(self._pinned),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'disk': self.disk_cache.stats() if self.disk_cache is not None else None,
+            }
+
+    def clear(self) -> None:
+        """清除所有模板（保留釘選名單與統計）"""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        """目前佔用的位元組數"""
+        with self._lock:
+            return self._bytes
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
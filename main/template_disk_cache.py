@@ -0,0 +1,275 @@
+"""
+TemplateDiskCache - 預處理模板的磁碟快取
+將 TemplateBank 的前處理結果（灰階、遮罩、各尺度縮放版本、平均值 / 標準差、ORB 特徵）
+保存在圖片目錄下的 .template_cache，下次啟動或清除快取後直接以記憶體對應 (mmap) 載入，
+不再重新解碼 PNG 與縮放
+
+特性：
+- 以圖片檔案內容的雜湊為鍵（加上尺度設定與格式版本），圖片被覆寫後自動失效，改名不影響
+- 每張模板一個 .npy（所有陣列連續存放）與一個 .json 索引；載入時以 mmap 開啟，
+  只有實際用到的尺度才會從磁碟讀入
+- 特徵點另存一組檔案（首次計算後才寫入），不需要改寫已對應到記憶體的檔案
+- 先寫暫存檔再取代，寫到一半中斷不會留下損壞的快取；損壞或版本不符時視為未命中
+
+使用方式:
+    from template_disk_cache import TemplateDiskCache, cache_directory
+
+    cache = TemplateDiskCache(cache_directory("scripts/images"))
+    entry = cache.load("pic01", "scripts/images/pic01.png")
+    if entry is None:
+        entry = CompiledTemplate.from_image(...)
+        cache.store(entry)
+    print(cache.stats())
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from image_matcher import DEFAULT_SCALES
+from template_bank import CompiledTemplate
+
+# 快取目錄名稱（位於圖片目錄下）
+CACHE_DIRNAME = ".template_cache"
+
+# 快取格式版本（前處理方式改變時遞增，舊快取自動失效）
+CACHE_VERSION = 1
+
+# 陣列在 .npy 中的對齊位元組數
+_ALIGN = 16
+
+
+def cache_directory(images_dir: str) -> str:
+    """圖片目錄對應的快取目錄"""
+    return os.path.join(images_dir, CACHE_DIRNAME)
+
+
+def _write_blob(base: str, arrays: Dict[str, Optional[np.ndarray]], extra: dict) -> None:
+    """將多個陣列連續寫入 base.npy，索引（位置、形狀、型別）與 extra 寫入 base.json"""
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        if array is None:
+            continue
+        offset = -(-offset // _ALIGN) * _ALIGN
+        layout[name] = [offset, list(array.shape), array.dtype.str]
+        offset += array.nbytes
+
+    blob = np.zeros(max(offset, 1), dtype=np.uint8)
+    for name, (start, _, _) in layout.items():
+        data = np.ascontiguousarray(arrays[name]).view(np.uint8).ravel()
+        blob[start:start + data.size] = data
+
+    # 先寫 .npy 再寫 .json：索引存在即代表資料完整
+    temp_path = base + ".tmp.npy"
+    np.save(temp_path, blob)
+    os.replace(temp_path, base + ".npy")
+    temp_path = base + ".json.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(extra, version=CACHE_VERSION, arrays=layout), f)
+    os.replace(temp_path, base + ".json")
+
+
+def _read_blob(base: str) -> Optional[Tuple[Dict[str, np.ndarray], dict]]:
+    """以 mmap 開啟 base.npy，回傳 ({名稱: 陣列檢視}, 索引)；不存在或格式不符回傳 None"""
+    try:
+        with open(base + ".json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION:
+            return None
+        # 轉為一般 ndarray 檢視（仍指向對應的記憶體，切片時不經過 np.memmap 的額外處理）
+        blob = np.asarray(np.load(base + ".npy", mmap_mode='r'))
+    except (OSError, ValueError):
+        return None
+
+    arrays = {}
+    try:
+        for name, (start, shape, dtype) in meta['arrays'].items():
+            dtype = np.dtype(dtype)
+            size = math.prod(shape) * dtype.itemsize
+            if start + size > blob.size:
+                return None
+            arrays[name] = blob[start:start + size].view(dtype).reshape(shape)
+    except (KeyError, TypeError, ValueError):
+        return None
+    return arrays, meta
+
+
+class TemplateDiskCache:
+    """預處理模板的磁碟快取（執行緒安全）"""
+
+    def __init__(self, directory: str, scales: Iterable[float] = DEFAULT_SCALES):
+        """
+        Args:
+            directory: 快取目錄（不存在時在第一次寫入時建立）
+            scales: 預先計算的尺度（需與 TemplateBank 相同，不同設定的快取互不影響）
+        """
+        self.directory = directory
+        self.scales = [float(s) for s in scales]
+        self._keys: Dict[str, Tuple[int, int, str]] = {}  # {路徑: (大小, 修改時間, 鍵)}
+        self._lock = threading.Lock()
+
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    def key_for(self, path: str) -> Optional[str]:
+        """圖片檔案的快取鍵（檔案內容雜湊；檔案大小與修改時間未變時不重新計算）"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            known = self._keys.get(path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            return known[2]
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"v{CACHE_VERSION}:{self.scales}:".encode())
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            return None
+        key = digest.hexdigest()
+        with self._lock:
+            self._keys[path] = (stat.st_size, stat.st_mtime_ns, key)
+        return key
+
+    def _base(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, name: str, path: str):
+        """從快取載入模板（陣列為唯讀的 mmap 檢視）
+
+        Args:
+            name: 顯示名稱
+            path: 圖片檔案路徑
+
+        Returns:
+            CompiledTemplate，未命中回傳 None
+        """
+        key = self.key_for(path)
+        loaded = _read_blob(self._base(key)) if key else None
+        if loaded is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        arrays, meta = loaded
+        try:
+            variants = {}
+            for scale in meta['scales']:
+                variants[scale] = (arrays[f"gray@{scale}"], arrays.get(f"mask@{scale}"))
+            norms = {float(scale): tuple(values) for scale, values in meta['norms'].items()}
+            entry = CompiledTemplate.from_arrays(name, path, arrays['bgr'], arrays.get('mask'), variants, norms)
+        except (KeyError, TypeError, ValueError):
+            # 索引內容不完整，視為未命中（重新寫入時覆蓋）
+            with self._lock:
+                self.misses += 1
+            return None
+        entry.cache_key = key
+
+        features = _read_blob(self._base(key) + ".features")
+        if features is not None:
+            feature_arrays, _ = features
+            entry.features = (feature_arrays['points'], feature_arrays.get('descriptors'))
+            entry.features_cached = True
+
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def store(self, entry) -> bool:
+        """寫入模板的前處理結果（不含特徵點）
+
+        Returns:
+            是否寫入成功
+        """
+        key = entry.cache_key or self.key_for(entry.path)
+        if not key:
+            return False
+        arrays: Dict[str, Optional[np.ndarray]] = {'bgr': entry.bgr, 'mask': entry.mask}
+        scales: List[float] = []
+        norms = {}
+        for scale in entry.scales:
+            gray, mask = entry.variant(scale)
+            arrays[f"gray@{scale}"] = gray
+            arrays[f"mask@{scale}"] = mask
+            scales.append(scale)
+            norms[str(scale)] = list(entry.norms[scale])
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_blob(self._base(key), arrays, {'scales': scales, 'norms': norms})
+        except OSError:
+            with self._lock:
+                self.errors += 1
+            return False
+        entry.cache_key = key
+        with self._lock:
+            self.writes += 1
+        return True
+
+    def store_features(self, entry) -> bool:
+        """寫入模板的 ORB 特徵點（FeatureMatcher 第一次計算後呼叫）
+
+        Returns:
+            是否寫入成功
+        """
+        if entry.features is None or entry.features_cached:
+            return False
+        key = entry.cache_key or self.key_for(entry.path)
+        if not key:
+            return False
+        points, descriptors = entry.features
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_blob(self._base(key) + ".features", {'points': points, 'descriptors': descriptors}, {})
+        except OSError:
+            with self._lock:
+                self.errors += 1
+            return False
+        entry.cache_key = key
+        entry.features_cached = True
+        with self._lock:
+            self.writes += 1
+        return True
+
+    def clear(self) -> int:
+        """刪除所有快取檔案（使用中的檔案在 Windows 上無法刪除，略過）
+
+        Returns:
+            刪除的檔案數量
+        """
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return 0
+        for filename in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, filename))
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._keys.clear()
+        return removed
+
+    def stats(self) -> dict:
+        """取得統計（hit_rate = 載入時命中快取的比例）"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'errors': self.errors,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,224 @@
+"""
+TextIndex - OCR 結果的文字位置索引
+將 OCR 引擎回傳的單字方框（文字、位置、信心度）整理成單字與文字行，
+一次辨識的結果可回答多次「完全相同 / 包含 / 正則表達式」查詢並回傳螢幕座標，不需要重新辨識
+
+特性：
+- 文字行由同一行的單字組成，查詢時比對整行文字，命中的範圍換算回實際涵蓋的單字方框
+  （中文逐字切開的結果也能找到跨多個單字的詞）
+- 英數單字之間以空白連接，中日韓文字之間不加空白
+- within(region) 取出位於範圍內的結果，全螢幕的索引也能回答範圍查詢
+
+使用方式:
+    from text_index import TextIndex, boxes_from_tesseract
+
+    index = TextIndex(boxes_from_tesseract(pytesseract.image_to_data(image, output_type=Output.DICT)))
+    box = index.find_first("確認")
+    if box:
+        print(box.center, box.confidence)
+"""
+
+import copy
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+Region = Tuple[int, int, int, int]
+
+
+class TextBox:
+    """一個單字或一行文字的方框
+
+    屬性：
+        text: 文字
+        x, y, width, height: 螢幕座標的左上角與大小
+        confidence: 信心度（0-1，引擎不提供時為 1.0）
+        line: 所屬文字行的鍵（同一行的單字相同）
+    """
+    __slots__ = ('text', 'x', 'y', 'width', 'height', 'confidence', 'line')
+
+    def __init__(self, text: str, x: int, y: int, width: int, height: int,
+                 confidence: float = 1.0, line=None):
+        self.text = text
+        self.x = int(x)
+        self.y = int(y)
+        self.width = int(width)
+        self.height = int(height)
+        self.confidence = float(confidence)
+        self.line = line
+
+    @property
+    def center(self) -> Tuple[int, int]:
+        """方框中心點"""
+        return (self.x + self.width // 2, self.y + self.height // 2)
+
+    @property
+    def box(self) -> Region:
+        """(x1, y1, x2, y2)"""
+        return (self.x, self.y, self.x + self.width, self.y + self.height)
+
+    def __repr__(self) -> str:
+        return f"TextBox({self.text!r}, {self.box}, {self.confidence:.2f})"
+
+
+def _union(words: Sequence[TextBox], text: str) -> TextBox:
+    """多個單字方框合併為一個（信心度取最低值）"""
+    x1 = min(w.x for w in words)
+    y1 = min(w.y for w in words)
+    x2 = max(w.x + w.width for w in words)
+    y2 = max(w.y + w.height for w in words)
+    return TextBox(text, x1, y1, x2 - x1, y2 - y1, min(w.confidence for w in words), words[0].line)
+
+
+def _needs_space(left: str, right: str) -> bool:
+    """兩個單字之間是否以空白連接（只有英數字之間需要）"""
+    return left[-1:].isascii() and right[:1].isascii()
+
+
+def boxes_from_tesseract(data: Dict[str, list], offset: Tuple[int, int] = (0, 0),
+                         min_confidence: float = 0.0) -> List[TextBox]:
+    """將 pytesseract.image_to_data(output_type=Output.DICT) 的結果轉為單字方框
+
+    Args:
+        data: image_to_data 的字典結果
+        offset: 截圖左上角的螢幕座標（加到每個方框）
+        min_confidence: 最低信心度（0-1），低於此值的單字捨棄
+
+    Returns:
+        單字方框（依辨識順序）
+    """
+    dx, dy = offset
+    words = []
+    for i, text in enumerate(data.get('text', [])):
+        text = (text or '').strip()
+        try:
+            conf = float(data['conf'][i])
+        except (TypeError, ValueError):
+            conf = -1.0
+        # conf = -1 為區塊 / 段落 / 行等非單字項目
+        if not text or conf < 0 or conf / 100.0 < min_confidence:
+            continue
+        line = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        words.append(TextBox(text, data['left'][i] + dx, data['top'][i] + dy,
+                             data['width'][i], data['height'][i], conf / 100.0, line))
+    return words
+
+
+class TextIndex:
+    """一次 OCR 結果的文字索引（建立後唯讀，可跨執行緒共用）"""
+
+    def __init__(self, words: Iterable[TextBox], region: Optional[Region] = None,
+                 captured_at: Optional[float] = None):
+        """
+        Args:
+            words: 單字方框（螢幕座標）
+            region: 辨識的螢幕範圍，None = 全螢幕
+            captured_at: 截圖時間（time.monotonic()），None = 現在
+        """
+        self.words: List[TextBox] = list(words)
+        self.region = tuple(region) if region else None
+        self.captured_at = time.monotonic() if captured_at is None else captured_at
+
+        # 依所屬文字行分組（保持辨識順序）
+        grouped: Dict[object, List[TextBox]] = {}
+        for index, word in enumerate(self.words):
+            key = word.line if word.line is not None else ('word', index)
+            grouped.setdefault(key, []).append(word)
+
+        # 每行：(合併後的方框, 單字, 各單字在行文字中的 [起, 迄) 位置)
+        self._lines: List[Tuple[TextBox, List[TextBox], List[Tuple[int, int]]]] = []
+        for line_words in grouped.values():
+            text = ''
+            spans = []
+            for word in line_words:
+                if text and _needs_space(text, word.text):
+                    text += ' '
+                spans.append((len(text), len(text) + len(word.text)))
+                text += word.text
+            self._lines.append((_union(line_words, text), line_words, spans))
+
+    @property
+    def lines(self) -> List[TextBox]:
+        """文字行方框"""
+        return [line for line, _, _ in self._lines]
+
+    @property
+    def text(self) -> str:
+        """全部文字（每行一列）"""
+        return '\n'.join(line.text for line, _, _ in self._lines)
+
+    @property
+    def age(self) -> float:
+        """距離截圖的秒數"""
+        return time.monotonic() - self.captured_at
+
+    def at(self, captured_at: float) -> 'TextIndex':
+        """相同內容、不同截圖時間的索引（畫面未變化時沿用快取結果用，不重新整理文字行）"""
+        index = copy.copy(self)
+        index.captured_at = captured_at
+        return index
+
+    def covers(self, region: Optional[Region]) -> bool:
+        """此索引的辨識範圍是否涵蓋 region"""
+        if self.region is None:
+            return True
+        if region is None:
+            return False
+        return (self.region[0] <= region[0] and self.region[1] <= region[1]
+                and self.region[2] >= region[2] and self.region[3] >= region[3])
+
+    def within(self, region: Optional[Region]) -> 'TextIndex':
+        """只保留完全位於 region 內的單字"""
+        if region is None or region == self.region:
+            return self
+        x1, y1, x2, y2 = region
+        words = [w for w in self.words if w.x >= x1 and w.y >= y1 and w.x + w.width <= x2 and w.y + w.height <= y2]
+        return TextIndex(words, region, self.captured_at)
+
+    def find(self, target_text: str, match_mode: str = "contains", case_sensitive: bool = False) -> List[TextBox]:
+        """尋找文字
+
+        Args:
+            target_text: 要尋找的文字（regex 模式為正則表達式）
+            match_mode: "contains"（包含）/ "exact"（整個單字或整行完全相同）/ "regex"
+            case_sensitive: 是否區分大小寫
+
+        Returns:
+            命中範圍的方框（依辨識順序），文字為實際命中的內容
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+        if match_mode == "regex":
+            pattern = re.compile(target_text, flags)
+        elif match_mode == "exact":
+            pattern = re.compile(r'\s*' + re.escape(target_text.strip()) + r'\s*$', flags)
+        else:
+            pattern = re.compile(re.escape(target_text), flags)
+
+        results = []
+        for line, words, spans in self._lines:
+            if match_mode == "exact":
+                # 整行或單一單字完全相同
+                if pattern.match(line.text):
+                    results.append(line)
+                else:
+                    results.extend(word for word in words if pattern.match(word.text))
+                continue
+            for match in pattern.finditer(line.text):
+                start, end = match.span()
+                if start == end:
+                    continue
+                covered = [word for word, (ws, we) in zip(words, spans) if ws < end and we > start]
+                if covered:
+                    results.append(_union(covered, match.group(0)))
+        return results
+
+    def find_first(self, target_text: str, match_mode: str = "contains",
+                   case_sensitive: bool = False) -> Optional[TextBox]:
+        """尋找文字，回傳信心度最高的結果（相同時取較前面的），找不到回傳 None"""
+        results = self.find(target_text, match_mode, case_sensitive)
+        if not results:
+            return None
+        return max(results, key=lambda box: box.confidence)
+
+    def __len__(self) -> int:
+        return len(self.words)
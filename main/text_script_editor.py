@@ -16,7 +16,8 @@ import os
 import re
 import sys
 from typing import List, Dict, Any, Tuple
-from PIL import Image, ImageGrab, ImageTk
+from PIL import Image, ImageTk
+from frame_bus import capture as capture_screen
 
 # 🔧 載入 LINE Seed 字體
 LINE_SEED_FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "TTF", "LINESeedTW_TTF_Rg.ttf")
@@ -729,6 +730,7 @@ class TextCommandEditor(tk.Toplevel):
                 ("移動至圖片", "#673AB7", None, ">移動至>pic01, T=0s000"),
                 ("點擊圖片", "#3F51B5", None, ">左鍵點擊>pic01, T=0s000"),
                 ("條件判斷", "#2196F3", None, ">if>pic01, T=0s000\n>>#標籤\n>>>#標籤"),
+                ("顏色判斷", "#1E88E5", None, ">if顏色>(100,200)=#FF0000, 容差10, T=0s000\n>>#成立\n>>>#不成立"),
             ],
             # 第二行：滑鼠和鍵盤指令
             [
@@ -826,6 +828,8 @@ class TextCommandEditor(tk.Toplevel):
             [
                 ("重複N次", "#1565C0", None, ">重複>10次, T=0s000\n  # 在此處添加要重複的指令\n>重複結束, T=0s000"),
                 ("條件循環", "#1976D2", None, ">當圖片存在>loading, T=0s000\n  # 在此處添加循環內的指令\n>循環結束, T=0s000"),
+                ("逐一處理圖片", "#1E88E5", None, ">逐一處理圖片>checkbox, 變數=hit, 依位置, T=0s000\n>點擊變數位置>hit, T=0s000\n>循環結束, T=0s000"),
+                ("找全部圖片", "#2196F3", None, ">找全部圖片>enemy, 數量=count, T=0s000\n>>#找到\n>>>#沒找到"),
             ],
             # 第三行：多條件與隨機
             [
@@ -1232,6 +1236,7 @@ class TextCommandEditor(tk.Toplevel):
                         cmd += ", 邊框"
                     if region:
                         cmd += f", 範圍({region[0]},{region[1]},{region[2]},{region[3]})"
+                    cmd += self._format_time_budget(event)
                     cmd += f", T={time_str}\n"
                     lines.append(cmd)
                 
@@ -1245,13 +1250,14 @@ class TextCommandEditor(tk.Toplevel):
                         cmd += ", 邊框"
                     if region:
                         cmd += f", 範圍({region[0]},{region[1]},{region[2]},{region[3]})"
+                    cmd += self._format_time_budget(event)
                     cmd += f", T={time_str}\n"
                     lines.append(cmd)
                 
                 # ==================== OCR 文字辨識事件格式化 ====================
                 elif event_type == "if_text_exists":
                     target_text = event.get("target_text", "")
-                    lines.append(f">if文字>{target_text}, T={time_str}\n")
+                    lines.append(f">if文字>{target_text}{self._format_ocr_pipeline(event)}, T={time_str}\n")
                     
                     # 成功分支
                     on_success = event.get("on_success", {})
@@ -1268,11 +1274,11 @@ class TextCommandEditor(tk.Toplevel):
                 elif event_type == "wait_text":
                     target_text = event.get("target_text", "")
                     timeout = event.get("timeout", 10.0)
-                    lines.append(f">等待文字>{target_text}, 最長{timeout}s, T={time_str}\n")
+                    lines.append(f">等待文字>{target_text}, 最長{timeout}s{self._format_ocr_pipeline(event)}, T={time_str}\n")
                 
                 elif event_type == "click_text":
                     target_text = event.get("target_text", "")
-                    lines.append(f">點擊文字>{target_text}, T={time_str}\n")
+                    lines.append(f">點擊文字>{target_text}{self._format_ocr_pipeline(event)}, T={time_str}\n")
                 
                 elif event_type == "click_image":
                     pic_name = event.get("image", "")
@@ -1286,6 +1292,7 @@ class TextCommandEditor(tk.Toplevel):
                         cmd += ", 邊框"
                     if region:
                         cmd += f", 範圍({region[0]},{region[1]},{region[2]},{region[3]})"
+                    cmd += self._format_time_budget(event)
                     cmd += f", T={time_str}\n"
                     lines.append(cmd)
                 
@@ -1308,6 +1315,7 @@ class TextCommandEditor(tk.Toplevel):
                         cmd += ", 邊框"
                     if region:
                         cmd += f", 範圍({region[0]},{region[1]},{region[2]},{region[3]})"
+                    cmd += self._format_time_budget(event)
                     cmd += f", T={time_str}\n"
                     lines.append(cmd)
                     
@@ -1389,6 +1397,32 @@ class TextCommandEditor(tk.Toplevel):
                         if condition.get("type") == "image_exists":
                             image = condition.get("image", "")
                             lines.append(f">當圖片存在>{image}, T={time_str}\n")
+                    elif loop_type == "foreach":
+                        source = event.get("source", {})
+                        options = self._format_find_all_options(source, "變數", event.get("var", "hit"))
+                        lines.append(f">逐一處理圖片>{source.get('image', '')}{options}, T={time_str}\n")
+                
+                # 找出圖片的所有位置
+                elif event_type == "find_all_images":
+                    options = self._format_find_all_options(event, "數量", event.get("count_var", ""))
+                    on_success = event.get("on_success", {})
+                    on_failure = event.get("on_failure", {})
+                    lines.append(f">找全部圖片>{event.get('image', '')}{options}, T={time_str}\n")
+                    
+                    if on_success:
+                        success_action = self._format_branch_action(on_success)
+                        if success_action or on_success.get("action") != "continue":
+                            lines.append(f">>{success_action}\n")
+                    
+                    if on_failure:
+                        failure_action = self._format_branch_action(on_failure)
+                        if failure_action or on_failure.get("action") != "continue":
+                            lines.append(f">>>{failure_action}\n")
+                
+                # 點擊變數記錄的位置
+                elif event_type == "click_variable_position":
+                    button = ", 右鍵" if event.get("button") == "right" else ""
+                    lines.append(f">點擊變數位置>{event.get('var', 'hit')}{button}, T={time_str}\n")
                 
                 # 循環結束
                 elif event_type == "loop_end":
@@ -1432,6 +1466,27 @@ class TextCommandEditor(tk.Toplevel):
                         if failure_action or on_failure.get("action") != "continue":
                             lines.append(f">>>{failure_action}\n")
                 
+                # 像素顏色判斷
+                elif event_type == "if_pixel_color":
+                    probes_str = "|".join(self._format_pixel_probe(probe) for probe in event.get("probes", []))
+                    on_success = event.get("on_success", {})
+                    on_failure = event.get("on_failure", {})
+                    
+                    cmd = f">if顏色>{probes_str}, 容差{event.get('tolerance', 10)}"
+                    if event.get("match") == "any":
+                        cmd += ", 任一"
+                    lines.append(f"{cmd}, T={time_str}\n")
+                    
+                    if on_success:
+                        success_action = self._format_branch_action(on_success)
+                        if success_action or on_success.get("action") != "continue":
+                            lines.append(f">>{success_action}\n")
+                    
+                    if on_failure:
+                        failure_action = self._format_branch_action(on_failure)
+                        if failure_action or on_failure.get("action") != "continue":
+                            lines.append(f">>>{failure_action}\n")
+                
                 # 隨機延遲
                 elif event_type == "random_delay":
                     min_ms = event.get("min_ms", 100)
@@ -1673,8 +1728,9 @@ class TextCommandEditor(tk.Toplevel):
                     # ✅ v2.7.1+ 新增：進階指令解析
                     if any(keyword in line for keyword in [
                         "設定變數>", "變數加1>", "變數減1>", "if變數>",
-                        "重複>", "當圖片存在>", "循環結束", "重複結束",
-                        "if全部存在>", "if任一存在>",
+                        "重複>", "當圖片存在>", "逐一處理圖片>", "循環結束", "重複結束",
+                        "找全部圖片>", "點擊變數位置>",
+                        "if全部存在>", "if任一存在>", "if顏色>",
                         "隨機延遲>", "隨機執行>",
                         "計數器>", "計時器>", "重置計數器>", "重置計時器>"
                     ]):
@@ -1859,12 +1915,13 @@ class TextCommandEditor(tk.Toplevel):
         :param start_time: 起始時間戳
         :return: JSON事件字典
         """
-        # 辨識圖片指令（新格式：>辨識>pic01, 邊框, 範圍(x1,y1,x2,y2), T=0s100）
+        # 辨識圖片指令（新格式：>辨識>pic01, 邊框, 範圍(x1,y1,x2,y2), T=0s100；可加「預算100ms」限制辨識時間）
         recognize_pattern = r'>辨識>(.+?)(?:,\s*T=(\d+)s(\d+))'
         match = re.match(recognize_pattern, command_line)
         if match:
             # 分離圖片名稱和選項
             content = match.group(1).strip()
+            content, time_budget = self._split_time_budget(content)
             seconds = int(match.group(2))
             millis = int(match.group(3))
             abs_time = start_time + seconds + millis / 1000.0
@@ -1912,6 +1969,8 @@ class TextCommandEditor(tk.Toplevel):
                     result["show_border"] = True
                 if region:
                     result["region"] = region
+                if time_budget is not None:
+                    result["time_budget_ms"] = time_budget
                 return result
             
             # 否則視為普通辨識指令
@@ -1927,11 +1986,14 @@ class TextCommandEditor(tk.Toplevel):
                 result["show_border"] = True
             if region:
                 result["region"] = region
+            if time_budget is not None:
+                result["time_budget_ms"] = time_budget
             return result        # 移動至圖片指令（>移動至>pic01, 邊框, 範圍(x1,y1,x2,y2), T=1s000）
         move_pattern = r'>移動至>(.+?)(?:,\s*T=(\d+)s(\d+))'
         match = re.match(move_pattern, command_line)
         if match:
             content = match.group(1).strip()
+            content, time_budget = self._split_time_budget(content)
             seconds = int(match.group(2))
             millis = int(match.group(3))
             abs_time = start_time + seconds + millis / 1000.0
@@ -1970,12 +2032,15 @@ class TextCommandEditor(tk.Toplevel):
                 result["show_border"] = True
             if region:
                 result["region"] = region
+            if time_budget is not None:
+                result["time_budget_ms"] = time_budget
             return result        # 點擊圖片指令（>左鍵點擊>pic01, 邊框, 範圍(x1,y1,x2,y2), T=1s200）
         click_pattern = r'>(左鍵|右鍵)點擊>(.+?)(?:,\s*T=(\d+)s(\d+))'
         match = re.match(click_pattern, command_line)
         if match:
             button = "left" if match.group(1) == "左鍵" else "right"
             content = match.group(2).strip()
+            content, time_budget = self._split_time_budget(content)
             seconds = int(match.group(3))
             millis = int(match.group(4))
             abs_time = start_time + seconds + millis / 1000.0
@@ -2016,11 +2081,14 @@ class TextCommandEditor(tk.Toplevel):
                 result["show_border"] = True
             if region:
                 result["region"] = region
+            if time_budget is not None:
+                result["time_budget_ms"] = time_budget
             return result        # 新格式條件判斷：>if>pic01, 邊框, 範圍(x1,y1,x2,y2), T=0s100
         if_simple_pattern = r'>if>(.+?)(?:,\s*T=(\d+)s(\d+))'
         match = re.match(if_simple_pattern, command_line)
         if match:
             content = match.group(1).strip()
+            content, time_budget = self._split_time_budget(content)
             seconds = int(match.group(2))
             millis = int(match.group(3))
             abs_time = start_time + seconds + millis / 1000.0
@@ -2070,6 +2138,8 @@ class TextCommandEditor(tk.Toplevel):
                 result["show_border"] = True
             if region:
                 result["region"] = region
+            if time_budget is not None:
+                result["time_budget_ms"] = time_budget
             return result
         
         # 新增：如果存在圖片（條件判斷）>如果存在>pic01, T=0s100
@@ -2099,6 +2169,11 @@ class TextCommandEditor(tk.Toplevel):
         
         # ==================== OCR 文字辨識指令 ====================
         
+        # OCR 前處理選項：>等待文字>HP, 最長5s, 前處理(small), T=0s000
+        ocr_pipeline = None
+        if command_line.startswith(('>if文字>', '>等待文字>', '>點擊文字>')):
+            command_line, ocr_pipeline = self._split_ocr_pipeline(command_line)
+        
         # OCR 條件判斷：>if文字>確認, T=0s000
         ocr_if_pattern = r'>if文字>(.+?)(?:,\s*T=(\d+)s(\d+))'
         match = re.match(ocr_if_pattern, command_line)
@@ -2117,7 +2192,7 @@ class TextCommandEditor(tk.Toplevel):
             if "failure" not in branches:
                 branches["failure"] = {"action": "continue"}
             
-            return {
+            result = {
                 "type": "if_text_exists",
                 "target_text": target_text,
                 "timeout": 10.0,  # 預設等待10秒
@@ -2126,6 +2201,9 @@ class TextCommandEditor(tk.Toplevel):
                 "on_failure": branches.get('failure'),
                 "time": abs_time
             }
+            if ocr_pipeline:
+                result["ocr_pipeline"] = ocr_pipeline
+            return result
         
         # 等待文字出現：>等待文字>確認, 最長10s, T=0s000
         ocr_wait_pattern = r'>等待文字>(.+?),\s*最長(\d+(?:\.\d+)?)[sS],\s*T=(\d+)s(\d+)'
@@ -2137,13 +2215,16 @@ class TextCommandEditor(tk.Toplevel):
             millis = int(match.group(4))
             abs_time = start_time + seconds + millis / 1000.0
             
-            return {
+            result = {
                 "type": "wait_text",
                 "target_text": target_text,
                 "timeout": timeout,
                 "match_mode": "contains",
                 "time": abs_time
             }
+            if ocr_pipeline:
+                result["ocr_pipeline"] = ocr_pipeline
+            return result
         
         # 點擊文字位置：>點擊文字>登入, T=0s000
         ocr_click_pattern = r'>點擊文字>(.+?)(?:,\s*T=(\d+)s(\d+))'
@@ -2154,12 +2235,15 @@ class TextCommandEditor(tk.Toplevel):
             millis = int(match.group(3))
             abs_time = start_time + seconds + millis / 1000.0
             
-            return {
+            result = {
                 "type": "click_text",
                 "target_text": target_text,
                 "timeout": 5.0,
                 "time": abs_time
             }
+            if ocr_pipeline:
+                result["ocr_pipeline"] = ocr_pipeline
+            return result
         
         # 延遲指令：>延遲1000ms, T=0s000
         delay_pattern = r'>延遲(\d+)ms,\s*T=(\d+)s(\d+)'
@@ -2444,6 +2528,113 @@ class TextCommandEditor(tk.Toplevel):
         if action == "繼續":
             return {"action": "continue"}
     
+    def _parse_pixel_probe(self, probe_str: str) -> dict:
+        """
+        解析顏色取樣點：(x,y)=#RRGGBB 或 (x1,y1,x2,y2)=#RRGGBB（矩形平均顏色）
+        :param probe_str: 取樣點字串
+        :return: 取樣點字典，格式錯誤時回傳 None
+        """
+        match = re.match(r'\(\s*(-?\d+(?:\s*,\s*-?\d+){1,3})\s*\)\s*=\s*#?([0-9A-Fa-f]{6})$', probe_str)
+        if not match:
+            return None
+        coords = [int(v) for v in match.group(1).split(',')]
+        color = "#" + match.group(2).upper()
+        if len(coords) == 2:
+            return {"x": coords[0], "y": coords[1], "color": color}
+        if len(coords) == 4:
+            return {"region": coords, "color": color}
+        return None
+    
+    def _split_time_budget(self, content: str) -> tuple:
+        """
+        從圖片指令的選項取出時間預算（預算100ms）
+        
+        Returns:
+            (移除預算選項後的內容, 預算毫秒數或 None)
+        """
+        budget_match = re.search(r',?\s*預算(\d+(?:\.\d+)?)ms', content)
+        if not budget_match:
+            return content, None
+        budget = float(budget_match.group(1))
+        content = (content[:budget_match.start()] + content[budget_match.end():]).strip()
+        return content, int(budget) if budget.is_integer() else budget
+    
+    def _format_time_budget(self, event: dict) -> str:
+        """格式化圖片指令的時間預算選項（_split_time_budget 的反向，未設定時為空字串）"""
+        budget = event.get("time_budget_ms")
+        if budget is None:
+            return ""
+        return f", 預算{budget:g}ms"
+    
+    def _split_ocr_pipeline(self, content: str) -> tuple:
+        """
+        從 OCR 指令取出前處理選項（前處理(text)，可用名稱見 ocr_preprocess.PIPELINES）
+        
+        Returns:
+            (移除前處理選項後的內容, 前處理名稱或 None)
+        """
+        pipeline_match = re.search(r',?\s*前處理\((\w+)\)', content)
+        if not pipeline_match:
+            return content, None
+        content = content[:pipeline_match.start()] + content[pipeline_match.end():]
+        return content, pipeline_match.group(1)
+    
+    def _format_ocr_pipeline(self, event: dict) -> str:
+        """格式化 OCR 指令的前處理選項（_split_ocr_pipeline 的反向，未設定時為空字串）"""
+        pipeline = event.get("ocr_pipeline")
+        if not pipeline:
+            return ""
+        return f", 前處理({pipeline})"
+    
+    def _parse_find_all_options(self, options: str) -> dict:
+        """
+        解析找全部圖片 / 逐一處理圖片的選項（依位置、信心度0.9、最多20個）
+        
+        Returns:
+            {"order", "confidence", "max_results"}
+        """
+        confidence_match = re.search(r'信心度([\d.]+)', options)
+        max_match = re.search(r'最多(\d+)個', options)
+        return {
+            "order": "position" if "依位置" in options else "score",
+            "confidence": float(confidence_match.group(1)) if confidence_match else 0.85,
+            "max_results": int(max_match.group(1)) if max_match else 100,
+        }
+    
+    def _format_find_all_options(self, event: dict, var_label: str, var_name: str) -> str:
+        """
+        格式化找全部圖片 / 逐一處理圖片的選項（_parse_find_all_options 的反向，預設值省略）
+        
+        Args:
+            event: 事件（或循環的 source）
+            var_label: "數量" 或 "變數"
+            var_name: 變數名稱，空字串時省略
+        """
+        options = f", {var_label}={var_name}" if var_name else ""
+        if event.get("order") == "position":
+            options += ", 依位置"
+        if event.get("confidence", 0.85) != 0.85:
+            options += f", 信心度{event['confidence']}"
+        if event.get("max_results", 100) != 100:
+            options += f", 最多{event['max_results']}個"
+        return options
+    
+    def _format_pixel_probe(self, probe: dict) -> str:
+        """
+        格式化顏色取樣點（_parse_pixel_probe 的反向）
+        :param probe: 取樣點字典
+        :return: 取樣點字串
+        """
+        color = probe.get("color", "#000000")
+        if not isinstance(color, str):
+            color = "#{:02X}{:02X}{:02X}".format(*color)
+        elif not color.startswith("#"):
+            color = "#" + color
+        if "region" in probe:
+            x1, y1, x2, y2 = probe["region"]
+            return f"({x1},{y1},{x2},{y2})={color.upper()}"
+        return f"({probe.get('x', 0)},{probe.get('y', 0)})={color.upper()}"
+    
     def _parse_advanced_command_to_json(self, command_line: str, next_lines: list, start_time: float) -> dict:
         """
         解析進階指令（v2.7.1+ 新增）
@@ -2584,6 +2775,27 @@ class TextCommandEditor(tk.Toplevel):
                 "time": abs_time
             }
         
+        # 逐一處理圖片：>逐一處理圖片>checkbox, 變數=hit, 依位置, T=0s000
+        # 開始時找出所有位置，每輪將目前位置存入 hit_x / hit_y / hit_index / hit_count
+        pattern = r'>逐一處理圖片>([^,]+)((?:,\s*(?:變數=\w+|依位置|依分數|信心度[\d.]+|最多\d+個))*)(?:,\s*T=(\d+)s(\d+))'
+        match = re.match(pattern, command_line)
+        if match:
+            options = match.group(2)
+            var_match = re.search(r'變數=(\w+)', options)
+            seconds = int(match.group(3))
+            millis = int(match.group(4))
+            abs_time = start_time + seconds + millis / 1000.0
+            
+            source = {"type": "image_all", "image": match.group(1).strip()}
+            source.update(self._parse_find_all_options(options))
+            return {
+                "type": "loop_start",
+                "loop_type": "foreach",
+                "source": source,
+                "var": var_match.group(1) if var_match else "hit",
+                "time": abs_time
+            }
+        
         # 循環結束：>循環結束, T=0s000 或 >重複結束, T=0s000
         if "循環結束" in command_line or "重複結束" in command_line:
             pattern = r'(?:,\s*T=(\d+)s(\d+))'
@@ -2600,6 +2812,52 @@ class TextCommandEditor(tk.Toplevel):
                 "time": abs_time
             }
         
+        # ==================== 找出所有位置 ====================
+        
+        # 找全部圖片：>找全部圖片>enemy, 數量=count, 依位置, 信心度0.9, T=0s000（找到至少一個為成功）
+        pattern = r'>找全部圖片>([^,]+)((?:,\s*(?:數量=\w+|依位置|依分數|信心度[\d.]+|最多\d+個))*)(?:,\s*T=(\d+)s(\d+))'
+        match = re.match(pattern, command_line)
+        if match:
+            options = match.group(2)
+            count_match = re.search(r'數量=(\w+)', options)
+            seconds = int(match.group(3))
+            millis = int(match.group(4))
+            abs_time = start_time + seconds + millis / 1000.0
+            
+            branches = self._parse_simple_condition_branches(next_lines)
+            if "success" not in branches:
+                branches["success"] = {"action": "continue"}
+            if "failure" not in branches:
+                branches["failure"] = {"action": "continue"}
+            
+            event = {
+                "type": "find_all_images",
+                "image": match.group(1).strip(),
+                "count_var": count_match.group(1) if count_match else "",
+            }
+            event.update(self._parse_find_all_options(options))
+            event.update({
+                "on_success": branches.get('success'),
+                "on_failure": branches.get('failure'),
+                "time": abs_time
+            })
+            return event
+        
+        # 點擊變數位置：>點擊變數位置>hit, 右鍵, T=0s000（點擊 hit_x, hit_y）
+        pattern = r'>點擊變數位置>(\w+)(,\s*(?:左鍵|右鍵))?(?:,\s*T=(\d+)s(\d+))'
+        match = re.match(pattern, command_line)
+        if match:
+            seconds = int(match.group(3))
+            millis = int(match.group(4))
+            abs_time = start_time + seconds + millis / 1000.0
+            
+            return {
+                "type": "click_variable_position",
+                "var": match.group(1),
+                "button": "right" if match.group(2) and "右鍵" in match.group(2) else "left",
+                "time": abs_time
+            }
+        
         # ==================== 多條件判斷 ====================
         
         # 全部圖片存在（AND）：>if全部存在>pic01,pic02,pic03, T=0s000
@@ -2652,6 +2910,38 @@ class TextCommandEditor(tk.Toplevel):
                 "time": abs_time
             }
         
+        # 像素顏色判斷：>if顏色>(100,200)=#FF0000|(10,10,30,14)=#00FF00, 容差10, 任一, T=0s000
+        pattern = r'>if顏色>(.+?)((?:,\s*(?:容差\d+|任一|全部))*)(?:,\s*T=(\d+)s(\d+))'
+        match = re.match(pattern, command_line)
+        if match:
+            probes = []
+            for probe_str in match.group(1).split('|'):
+                probe = self._parse_pixel_probe(probe_str.strip())
+                if probe is None:
+                    return None
+                probes.append(probe)
+            options = match.group(2)
+            tolerance_match = re.search(r'容差(\d+)', options)
+            seconds = int(match.group(3))
+            millis = int(match.group(4))
+            abs_time = start_time + seconds + millis / 1000.0
+            
+            branches = self._parse_simple_condition_branches(next_lines)
+            if "success" not in branches:
+                branches["success"] = {"action": "continue"}
+            if "failure" not in branches:
+                branches["failure"] = {"action": "continue"}
+            
+            return {
+                "type": "if_pixel_color",
+                "probes": probes,
+                "tolerance": int(tolerance_match.group(1)) if tolerance_match else 10,
+                "match": "any" if "任一" in options else "all",
+                "on_success": branches.get('success'),
+                "on_failure": branches.get('failure'),
+                "time": abs_time
+            }
+        
         # ==================== 隨機功能 ====================
         
         # 隨機延遲：>隨機延遲>100ms,500ms, T=0s000
@@ -3200,6 +3490,7 @@ class TextCommandEditor(tk.Toplevel):
             # 條件判斷 (橘色)
             patterns_condition = [
                 (r'if>', 'syntax_condition'),
+                (r'if顏色>', 'syntax_condition'),
                 (r'如果存在>', 'syntax_condition'),
             ]
             
@@ -3242,6 +3533,9 @@ class TextCommandEditor(tk.Toplevel):
                 (r'左鍵點擊>', 'syntax_image'),
                 (r'右鍵點擊>', 'syntax_image'),
                 (r'辨識任一>', 'syntax_image'),
+                (r'找全部圖片>', 'syntax_image'),
+                (r'逐一處理圖片>', 'syntax_image'),
+                (r'點擊變數位置>', 'syntax_image'),
             ]
             
             # 圖片名稱 (黃色) - pic + 數字
@@ -3713,8 +4007,8 @@ class TextCommandEditor(tk.Toplevel):
         try:
             x1, y1, x2, y2 = image_region
             
-            # ✅ 修正：在視窗仍然隱藏的狀態下截圖
-            screenshot = ImageGrab.grab(bbox=(x1, y1, x2, y2))
+            # ✅ 修正：在視窗仍然隱藏的狀態下截圖（共用截圖匯流排執行中時，等待視窗隱藏後的新畫面）
+            screenshot = capture_screen((x1, y1, x2, y2), max_age=0)
             
             # ✅ 修正：截圖完成後才恢復視窗
             self._restore_windows()
@@ -4021,7 +4315,7 @@ class TextCommandEditor(tk.Toplevel):
         
         try:
             x1, y1, x2, y2 = image_region
-            screenshot = ImageGrab.grab(bbox=(x1, y1, x2, y2))
+            screenshot = capture_screen((x1, y1, x2, y2), max_age=0)
             
             # 執行 OCR 辨識
             self._perform_ocr_and_show_result(screenshot)
@@ -0,0 +1,537 @@
+"""
+測試圖片匹配核心演算法（main/ 內的匹配、截圖與覆蓋視窗模組）
+以合成截圖驗證各模組的結果與原解析度匹配一致
+"""
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# 加入專案路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'main'))
+
+from image_matcher import PyramidMatcher, match_at_scale, match_all, non_max_suppression
+from match_engine import ParallelMatchEngine
+from roi_tracker import ROITracker
+from change_detector import ChangeDetector
+from feature_matcher import FeatureMatcher
+from match_verifier import FEATURE_RATIO, VERIFY_RATIO, MatchVerifier, combined_score
+from match_prefilter import MatchPrefilter, ScreenIntegrals
+from pixel_probe import normalize_probes, probes_bbox, evaluate_probes
+from frame_bus import FrameBus
+from screen_capture import ArrayBackend, FrameBusBackend, ImageGrabBackend, ScreenCapturer, create_backend
+from overlay_manager import OverlayManager
+from anytime_match import AnytimeMatcher
+from template_bank import CompiledTemplate
+
+
+def _make_screen(width=1280, height=720, seed=7):
+    """產生含隨機色塊的灰階合成截圖"""
+    rng = np.random.default_rng(seed)
+    screen = rng.integers(0, 40, (height, width), dtype=np.uint8)
+    for _ in range(80):
+        s = int(rng.integers(12, 60))
+        x, y = int(rng.integers(0, width - s)), int(rng.integers(0, height - s))
+        cv2.rectangle(screen, (x, y), (x + s, y + s), int(rng.integers(60, 255)), -1)
+        cv2.circle(screen, (x + s // 2, y + s // 2), s // 3, int(rng.integers(0, 255)), -1)
+    return cv2.GaussianBlur(screen, (3, 3), 0)
+
+
+def _make_texture(width=1280, height=720, seed=3):
+    """產生模糊隨機紋理的灰階截圖（特徵點多、任何位置都不重複）"""
+    rng = np.random.default_rng(seed)
+    return cv2.GaussianBlur(rng.integers(0, 255, (height, width), dtype=np.uint8), (5, 5), 0)
+
+
+def _make_entry(screen, x, y, w, h, name="pic01"):
+    """由截圖的一塊區域建立模板庫項目"""
+    return CompiledTemplate(name, f"{name}.png", cv2.cvtColor(screen[y:y + h, x:x + w], cv2.COLOR_GRAY2BGR))
+
+
+def test_pyramid_matches_full_resolution():
+    """金字塔匹配的中心點需與原解析度匹配一致（1 像素內）"""
+    screen = _make_screen()
+    matcher = PyramidMatcher(downscale=4, top_k=5)
+    for x, y, w, h in [(100, 80, 48, 48), (900, 500, 64, 40), (600, 300, 32, 32)]:
+        template = screen[y:y + h, x:x + w].copy()
+        score, (bx, by) = match_at_scale(screen, template)
+        hit = matcher.match(screen, template, threshold=0.9)
+        assert hit is not None
+        assert abs(hit[0] - (bx + w // 2)) <= 1 and abs(hit[1] - (by + h // 2)) <= 1
+        assert hit[2] >= score - 1e-3
+
+
+def test_pyramid_with_mask_and_threshold():
+    """支援透明遮罩，且分數不足閾值時回傳 None"""
+    screen = _make_screen(seed=3)
+    template = screen[200:264, 400:464].copy()
+    mask = np.zeros_like(template)
+    cv2.circle(mask, (32, 32), 30, 255, -1)
+
+    hit = PyramidMatcher(downscale=8).match(screen, template, mask=mask, threshold=0.9)
+    assert hit is not None
+    assert abs(hit[0] - 432) <= 1 and abs(hit[1] - 232) <= 1
+
+    noise = np.random.default_rng(1).integers(0, 255, (64, 64), dtype=np.uint8)
+    assert PyramidMatcher().match(screen, noise, threshold=0.9) is None
+
+
+def test_match_all_finds_every_instance():
+    """找出所有位置：每個實例只回傳一次、可依位置排序、重疊的框只保留分數最高者"""
+    screen = _make_screen(seed=5) // 4
+    icon = np.random.default_rng(9).integers(0, 255, (20, 30), dtype=np.uint8)
+    corners = [(700, 100), (100, 100), (400, 104), (50, 600)]
+    for x, y in corners:
+        screen[y:y + 20, x:x + 30] = icon
+
+    hits = match_all(screen, icon, threshold=0.9, order="position")
+    assert [(cx, cy) for cx, cy, _, _ in hits] == [(115, 110), (415, 114), (715, 110), (65, 610)]
+    assert len(match_all(screen, icon, threshold=0.9, max_results=2)) == 2
+    assert match_all(screen, icon[::-1].copy(), threshold=0.9) == []
+
+    boxes = np.array([[0, 0, 10, 10], [2, 1, 10, 10], [30, 30, 10, 10]])
+    keep = non_max_suppression(boxes, np.array([0.8, 0.95, 0.7]), overlap=0.3)
+    assert keep.tolist() == [1, 2]
+
+
+def test_parallel_engine_matches_serial():
+    """平行引擎的結果需與逐張匹配一致，first_hit 模式依列表順序回傳命中"""
+    screen = _make_screen(seed=11)
+    noise = np.random.default_rng(2).integers(0, 255, (40, 40), dtype=np.uint8)
+    jobs = [
+        ("a", screen[50:98, 60:108].copy(), None, 0.9, [1.0]),
+        ("b", screen[400:440, 700:760].copy(), None, 0.9, [0.9, 1.0, 1.1]),
+        ("noise", noise, None, 0.9, [1.0]),
+    ]
+    engine = ParallelMatchEngine(max_workers=4)
+    results = engine.match_templates(screen, jobs)
+    assert results["noise"] is None
+    for name, template, _, _, _ in jobs[:2]:
+        score, (x, y) = match_at_scale(screen, template)
+        h, w = template.shape
+        assert results[name][:2] == (x + w // 2, y + h // 2)
+
+    # first_hit：依列表順序回傳排在最前面的命中，與執行緒完成順序無關
+    ordered = [jobs[2], jobs[1], jobs[0]]
+    for _ in range(5):
+        first = engine.match_templates(screen, ordered, first_hit=True)
+        assert first["a"] is None and first["noise"] is None and first["b"] == results["b"]
+
+    def slow_b(screen, template, mask, threshold, scales):
+        if template.shape == (40, 60):
+            time.sleep(0.05)  # 排在前面的 b 比 a 晚完成
+        return None if template is noise else (0, 0, 1.0, template.shape[::-1])
+
+    first = engine.match_templates(screen, ordered, first_hit=True, match_func=slow_b)
+    assert first["b"] is not None and first["a"] is None
+    engine.shutdown()
+
+
+def test_roi_tracker_windows_expand_and_forget():
+    """位置記憶：視窗由小到大、裁切到搜尋範圍內，連續未找到後忘記位置"""
+    tracker = ROITracker(margins=(0.25, 1.0, 4.0), min_margin=8, forget_after=2)
+    bounds = (0, 0, 1280, 720)
+    assert tracker.windows("pic01", bounds) == []
+
+    tracker.record("pic01", (100, 100, 40, 20))
+    windows = tracker.windows("pic01", bounds)
+    assert windows[0] == (90, 90, 150, 130)
+    assert windows[1] == (60, 60, 180, 160)
+    assert windows[2] == (0, 0, 300, 280)  # 裁切到範圍內
+    for x1, y1, x2, y2 in windows:
+        assert x1 <= 100 and y1 <= 100 and x2 >= 140 and y2 >= 120
+
+    tracker.record("pic01", (100, 100, 40, 20), roi=True)
+    stats = tracker.stats("pic01")
+    assert stats['roi_hits'] == 1 and stats['full_hits'] == 1 and stats['roi_hit_rate'] == 0.5
+
+    tracker.record("pic01", None)
+    assert tracker.windows("pic01", bounds)
+    tracker.record("pic01", None)
+    assert tracker.windows("pic01", bounds) == []
+
+
+def test_change_detector_reuses_result_until_screen_changes():
+    """畫面未變化時沿用結果；1920x1080 畫面中 10x10 的小變化也會重新匹配"""
+    detector = ChangeDetector(tile=64)
+    screen = _make_screen(1920, 1080)
+
+    fingerprint = detector.fingerprint(screen)
+    assert detector.lookup("pic01", fingerprint) == (False, None)
+    detector.store("pic01", fingerprint, (100, 200))
+
+    assert detector.lookup("pic01", detector.fingerprint(screen.copy())) == (True, (100, 200))
+    assert detector.lookup("pic02", fingerprint)[0] is False
+
+    # 大範圍中的小圖示 / 勾選：只改變 10x10 像素、亮度只差 3
+    changed = screen.copy()
+    changed[500:510, 1200:1210] += 3
+    changed_fingerprint = detector.fingerprint(changed)
+    assert detector.lookup("pic01", changed_fingerprint)[0] is False
+    assert detector.changed_tiles(fingerprint, changed_fingerprint) == 1
+    assert detector.lookup("pic01", detector.fingerprint(changed[:, :1900]))[0] is False
+
+    stats = detector.stats()
+    assert stats['skipped'] == 1 and stats['evaluated'] == 4
+
+
+def test_feature_matcher_caches_template_and_limits_region():
+    """特徵匹配：模板描述子快取在 CompiledTemplate 上，限定範圍的結果與整張截圖一致"""
+    screen = _make_texture()
+    entry = _make_entry(screen, 300, 200, 220, 160)
+    matcher = FeatureMatcher()
+
+    x, y, count = matcher.match(entry, screen)
+    assert entry.features is not None
+    assert abs(x - 410) <= 3 and abs(y - 280) <= 3 and count >= 10
+
+    features = entry.features
+    rx, ry, _ = matcher.match(entry, screen, region=(200, 100, 620, 460))
+    assert entry.features is features
+    assert abs(rx - 410) <= 3 and abs(ry - 280) <= 3
+
+    assert matcher.match(entry, screen, region=(900, 500, 1000, 560))[0] is None
+
+
+def test_feature_matcher_full_screen_1080p():
+    """特徵匹配：不限定範圍時 1920x1080 整張截圖也能找到模板（螢幕特徵點數量依面積放大）"""
+    screen = _make_texture(1920, 1080)
+    matcher = FeatureMatcher()
+    assert matcher.screen_budget(420, 360) == matcher.nfeatures
+    assert matcher.nfeatures < matcher.screen_budget(1920, 1080) <= matcher.max_features
+
+    for x, y, w, h in [(300, 200, 220, 160), (1500, 800, 160, 120)]:
+        entry = _make_entry(screen, x, y, w, h)
+        cx, cy, count = matcher.match(entry, screen, region=None)
+        assert cx is not None and count >= 10
+        assert abs(cx - (x + w // 2)) <= 3 and abs(cy - (y + h // 2)) <= 3
+
+
+def test_verifier_scores_and_budget():
+    """驗證器：相同區域接近滿分、不同區域分數較低、時間預算用完時只做部分項目"""
+    screen = _make_screen()
+    entry = _make_entry(screen, 300, 200, 80, 60)
+    bgr = entry.bgr
+    verifier = MatchVerifier(budget_ms=None)
+
+    same = verifier.verify(entry, 1.0, screen[200:260, 300:380], bgr)
+    assert same.score > 0.99 and not same.partial
+    assert set(same.metrics) == {'hist', 'edge', 'ssim'}
+
+    other = verifier.verify(entry, 1.0, screen[400:460, 700:780])
+    assert other.score < same.score - 0.2
+
+    partial = verifier.verify(entry, 1.0, screen[200:260, 300:380], budget_ms=0)
+    assert partial.partial and list(partial.metrics) == ['hist']
+
+
+
+def test_combined_score_boundary():
+    """標準模式判斷邊界：以 0-1 的主要方法分數計分，完全相符時綜合分數可超過舊版上限 0.88"""
+    threshold = 0.92
+    # 主要方法 1.0 時驗證分數需達 (0.92 - 0.6) / 0.4 = 0.8
+    assert combined_score(1.0, 0.81) >= threshold
+    assert combined_score(1.0, 0.79) < threshold
+    assert combined_score(0.95, 0.88) >= threshold > combined_score(0.95, 0.87)
+    assert combined_score(1.0, 1.0) == 1.0 > 0.88
+    assert combined_score(0.93, None) == 0.93
+
+    # 進入驗證 / 特徵點匹配的門檻
+    assert abs(threshold * VERIFY_RATIO - 0.782) < 1e-9 and abs(threshold * FEATURE_RATIO - 0.644) < 1e-9
+    # 主要方法分數未達閾值時，即使驗證滿分也不足以通過（0.6 * p + 0.4 >= 0.92 需 p >= 0.8667）
+    assert combined_score(0.86, 1.0) < threshold <= combined_score(0.87, 1.0)
+
+    # 實際截圖：完全相同的區域通過、其他位置不通過
+    screen = _make_texture()
+    entry = _make_entry(screen, 300, 200, 80, 60)
+    verifier = MatchVerifier(budget_ms=None)
+    primary = cv2.minMaxLoc(cv2.matchTemplate(screen, entry.gray, cv2.TM_CCOEFF_NORMED))[1]
+    same = verifier.verify(entry, 1.0, screen[200:260, 300:380])
+    assert combined_score(primary, same.score) >= threshold
+    region = screen[400:460, 700:780]
+    other_primary = float(cv2.matchTemplate(region, entry.gray, cv2.TM_CCOEFF_NORMED)[0, 0])
+    assert combined_score(other_primary, verifier.verify(entry, 1.0, region).score) < threshold
+
+
+def test_prefilter_keeps_results_and_prunes_area():
+    """候選區域篩選：只略過平坦區域，位置與分數和全圖匹配相同（含亮度、對比改變的目標），且省略大部分搜尋面積"""
+    # 介面風格的截圖：單色背景上有幾塊有紋理的面板
+    screen = np.full((720, 1280), 90, dtype=np.uint8)
+    texture = _make_screen()
+    for x, y in [(250, 150), (850, 380), (1050, 80)]:
+        screen[y:y + 220, x:x + 200] = texture[y:y + 220, x:x + 200]
+    screen_bgr = cv2.applyColorMap(screen, cv2.COLORMAP_JET)
+    screen_rgb = cv2.cvtColor(screen_bgr, cv2.COLOR_BGR2RGB)
+    prefilter = MatchPrefilter()
+
+    cases = [(300, 200, 1.0, 0), (901, 433, 1.0, 0), (1077, 141, 1.0, 0),
+             (300, 200, 1.0, 30), (901, 433, 0.7, 40)]   # 變亮 +30、對比 x0.7 後變亮 +40
+    for x, y, gain, bias in cases:
+        template = screen[y:y + 50, x:x + 60].copy()
+        shifted = screen.copy()
+        shifted[y:y + 50, x:x + 60] = np.clip(template * gain + bias, 0, 255).astype(np.uint8)
+        integrals = ScreenIntegrals(shifted, screen_rgb)
+        expected_score, expected_loc = match_at_scale(shifted, template)
+        score, loc, report = prefilter.match(integrals, template, screen_rgb[y:y + 50, x:x + 60])
+        assert loc == expected_loc == (x, y)
+        assert expected_score > 0.99
+        # 區塊較小時 matchTemplate 的浮點誤差略有不同
+        assert abs(score - expected_score) < 1e-3
+        assert report.pruned_ratio > 0.5
+
+    # 漸層截圖的目標區域變亮 +30：TM_CCOEFF_NORMED 仍為 1.0，篩選不可排除（沒有平坦區域時等同全圖匹配）
+    base = _make_screen()
+    ramp = np.tile(np.linspace(0, 255, base.shape[1]), (base.shape[0], 1))
+    gradient_bgr = cv2.applyColorMap((base * 0.5 + ramp * 0.5).astype(np.uint8), cv2.COLORMAP_JET)
+    gradient_rgb = cv2.cvtColor(gradient_bgr, cv2.COLOR_BGR2RGB)
+    gradient = cv2.cvtColor(gradient_bgr, cv2.COLOR_BGR2GRAY)
+    template = gradient[657:707, 1217:1277].copy()
+    gradient[657:707, 1217:1277] = np.clip(template.astype(np.int16) + 30, 0, 255).astype(np.uint8)
+    score, loc, _ = prefilter.match(ScreenIntegrals(gradient, gradient_rgb), template, gradient_rgb[657:707, 1217:1277])
+    assert loc == match_at_scale(gradient, template)[1] == (1217, 657) and score > 0.99
+
+    # 完全平坦的截圖：所有位置都排除（matchTemplate 對平坦視窗一律給 0 分）
+    flat = np.full((200, 300), 90, dtype=np.uint8)
+    score, _, report = prefilter.match(ScreenIntegrals(flat), screen[200:250, 300:360].copy())
+    assert score < 0 and report.searched == 0
+    assert cv2.matchTemplate(flat, screen[200:250, 300:360], cv2.TM_CCOEFF_NORMED).max() == 0
+
+    assert prefilter.stats()['calls'] == len(cases) + 2
+
+def test_pixel_probes_share_one_bbox():
+    """顏色取樣：合併為最小外框，依容差判斷，矩形以平均顏色比較"""
+    screen = np.zeros((100, 200, 3), dtype=np.uint8)
+    screen[20, 30] = (250, 10, 10)
+    screen[50:54, 100:110] = (0, 200, 0)
+    screen[50:52, 100:110] = (0, 220, 0)  # 矩形平均 (0, 210, 0)
+
+    probes = normalize_probes([
+        {"x": 30, "y": 20, "color": "#FF0000"},
+        {"region": [100, 50, 110, 54], "color": [0, 210, 0]},
+    ])
+    bbox = probes_bbox(probes)
+    assert bbox == (30, 20, 110, 54)
+    crop = screen[bbox[1]:bbox[3], bbox[0]:bbox[2]]
+
+    matched, samples = evaluate_probes(crop, bbox[:2], probes, tolerance=10)
+    assert matched and samples[0][0] == (250, 10, 10) and samples[1][0] == (0, 210, 0)
+    assert not evaluate_probes(crop, bbox[:2], probes, tolerance=5)[0]
+    assert evaluate_probes(crop, bbox[:2], probes, tolerance=5, match='any')[0]
+
+
+def test_frame_bus_shares_frames_and_protects_borrowed_buffer():
+    """截圖匯流排：序號遞增、可等待新畫面、借用中的緩衝區不會被覆寫、畫面外的範圍改用其他後端"""
+    counter = {'n': 0}
+
+    def grabber():
+        counter['n'] += 1
+        return np.full((40, 60, 3), counter['n'] % 256, dtype=np.uint8)
+
+    bus = FrameBus(fps=200, grabber=grabber, buffers=3)
+    assert bus.grab() is None  # 尚未啟動
+    bus.start()
+    try:
+        first = bus.latest(timeout=2.0)
+        assert first is not None and first.array.shape == (40, 60, 3)
+
+        newer = bus.wait_for_newer(first.seq, timeout=2.0)
+        assert newer.seq > first.seq
+
+        with bus.borrow() as frame:
+            value = int(frame.array[0, 0, 0])
+            bus.wait_for_newer(frame.seq + 3, timeout=2.0)  # 借用期間繼續截圖
+            assert int(frame.array[0, 0, 0]) == value
+
+        assert bus.grab((10, 5, 30, 25)).shape == (20, 20, 3)
+        assert bus.stats()['captures'] >= 5
+
+        # 主螢幕左側 / 上方（負座標）或超出畫面的範圍不裁切，改用直接截圖的後端
+        assert bus.grab((-20, 5, 10, 25)) is None and bus.grab((50, 30, 70, 45)) is None
+        other = np.full((40, 60, 3), 255, dtype=np.uint8)
+        capturer = ScreenCapturer(FrameBusBackend(bus, ArrayBackend(other)))
+        assert capturer.grab((10, 5, 30, 25))[0, 0, 0] != 255
+        assert capturer.grab((-20, -10, 10, 10))[0, 0, 0] == 255
+    finally:
+        bus.stop()
+    assert not bus.running
+
+
+def test_screen_capturer_reuses_buffers():
+    """截圖緩衝區：只截取要求的範圍、灰階與 cvtColor 相同、重複截圖不再配置記憶體"""
+    screen_rgb = cv2.cvtColor(_make_screen(), cv2.COLOR_GRAY2RGB)
+    screen_rgb[:, :, 0] //= 2
+    capturer = ScreenCapturer(ArrayBackend(screen_rgb))
+
+    rgb, gray = capturer.grab_gray((100, 50, 300, 170))
+    assert rgb.shape == (120, 200, 3)
+    assert np.array_equal(rgb, screen_rgb[50:170, 100:300])
+    assert np.array_equal(gray, cv2.cvtColor(screen_rgb[50:170, 100:300], cv2.COLOR_RGB2GRAY))
+
+    full, _ = capturer.grab_gray()
+    allocations = capturer.stats()['allocations']
+    for region in [None, (0, 0, 640, 360), (10, 10, 50, 50)]:
+        capturer.grab_gray(region)
+    stats = capturer.stats()
+    assert stats['allocations'] == allocations and stats['captures'] == 5
+    assert full.shape == screen_rgb.shape
+
+    # 預設後端維持 ImageGrab（mss 的 DPI 與多螢幕原點不同，需明確指定）
+    assert isinstance(create_backend("auto"), ImageGrabBackend)
+    assert ScreenCapturer().stats()['backend'] == "imagegrab"
+    try:
+        create_backend("dxcam")
+        assert False, "未知的後端應拋出 ValueError"
+    except ValueError:
+        pass
+
+
+def test_overlay_coalesces_border_requests():
+    """覆蓋視窗：show() 只放入佇列，同一位置的重複請求合併，過期後移除，超過上限保留最新的"""
+    class FakeRoot:
+        def after(self, ms, callback):
+            pass
+
+    overlay = OverlayManager(max_borders=3)
+    overlay.attach(FakeRoot())  # 不建立視窗，由測試自行取出佇列
+    for _ in range(50):
+        overlay.show(10, 20, 30, 40, duration_ms=100)
+    overlay.show(100, 20, 30, 40, duration_ms=100)
+    assert overlay.stats()['pending'] == 51
+
+    assert overlay._drain(now=0.0)
+    stats = overlay.stats()
+    assert stats['pending'] == 0 and stats['visible'] == 2 and stats['coalesced'] == 49
+
+    overlay.show(10, 20, 30, 40)  # 同一位置：只延長時間，不需要重繪
+    assert not overlay._drain(now=0.0)
+    for x in range(200, 600, 100):
+        overlay.show(x, 0, 10, 10, duration_ms=5000)
+    overlay._drain(now=0.0)
+    assert overlay.stats()['visible'] == 3 and overlay.stats()['dropped'] == 3
+    assert overlay._drain(now=time.monotonic() + 10) and overlay.stats()['visible'] == 0
+
+
+
+def test_overlay_hands_own_root_over_to_app_root():
+    """覆蓋視窗：預告 attach 時不自建 Tk；自建的 Tk 在主程式 attach 後由自己的執行緒關閉，不會覆蓋主程式的 Tk"""
+    import types
+
+    class FakeRoot:
+        def __init__(self, on_create=None):
+            self.callbacks = []
+            self.destroyed = False
+            if on_create:
+                on_create()
+
+        def after(self, ms, callback):
+            self.callbacks.append(callback)
+
+        def run(self):
+            callbacks, self.callbacks = self.callbacks, []
+            for callback in callbacks:
+                callback()
+
+        def withdraw(self):
+            pass
+
+        def mainloop(self):
+            pass
+
+        def destroy(self):
+            self.destroyed = True
+
+    def run_own_root(overlay, on_create=None):
+        created = []
+        fake_tk = types.ModuleType("tkinter")
+        fake_tk.Tk = lambda: created.append(FakeRoot(on_create)) or created[-1]
+        saved = sys.modules.get("tkinter")
+        sys.modules["tkinter"] = fake_tk
+        try:
+            overlay._run_own_root()
+        finally:
+            if saved is not None:
+                sys.modules["tkinter"] = saved
+            else:
+                del sys.modules["tkinter"]
+        return created[0]
+
+    # 預告 attach：show() 不建立專用執行緒，請求留到 attach 後才處理
+    overlay = OverlayManager()
+    overlay.expect_attach()
+    overlay.show(10, 20, 30, 40)
+    assert overlay._thread is None and overlay.stats()['pending'] == 1
+    app = FakeRoot()
+    overlay.attach(app)
+    overlay._redraw = lambda: None
+    app.run()
+    assert overlay.stats()['pending'] == 0 and overlay.stats()['visible'] == 1
+
+    # 專用 Tk 已在執行：attach 後由主程式接手，專用 Tk 下一次更新時自行關閉
+    overlay = OverlayManager()
+    overlay._redraw = lambda: None
+    own = run_own_root(overlay)
+    assert overlay._root is own and overlay._owns_root
+    app = FakeRoot()
+    overlay.attach(app)
+    own.run()
+    assert own.destroyed and not own.callbacks
+    assert overlay._root is app and not overlay._owns_root
+    overlay.show(1, 2, 3, 4)
+    app.run()
+    assert overlay.stats()['visible'] == 1 and app.callbacks
+
+    # 專用 Tk 啟動期間主程式 attach：專用 Tk 直接關閉，不取代主程式的 Tk
+    overlay = OverlayManager()
+    app = FakeRoot()
+    own = run_own_root(overlay, on_create=lambda: overlay.attach(app))
+    assert own.destroyed and overlay._root is app
+
+def test_anytime_returns_best_so_far_within_budget():
+    """有時間預算的辨識：預算為 0 時只執行第一個階段並回傳目前最佳候選，不限制時找到放大的模板"""
+    screen = _make_texture()
+    entry = _make_entry(screen, 500, 300, 100, 60)
+    enlarged = cv2.resize(screen, None, fx=1.2, fy=1.2, interpolation=cv2.INTER_CUBIC)[:720, :1280]
+    matcher = AnytimeMatcher(feature_matcher=FeatureMatcher())
+    scales = [1.0, 1.1, 0.9, 1.2]
+
+    quick = matcher.match(entry, enlarged, threshold=0.9, budget_ms=0, scales=scales)
+    assert quick.stages == ['pyramid'] and quick.exhausted and not quick.found
+    assert quick.center is not None and quick.confidence < 0.9
+
+    full = matcher.match(entry, enlarged, threshold=0.9, budget_ms=None, scales=scales)
+    assert full.found and not full.exhausted and full.scale == 1.2 and full.stage == 'multiscale'
+    assert abs(full.center[0] - 660) <= 2 and abs(full.center[1] - 396) <= 2
+
+    # 記憶的最佳尺度 + 位置記憶視窗：第一個階段即命中
+    hinted = matcher.match(entry, enlarged, threshold=0.9, budget_ms=0, scales=[1.2, 1.0],
+                           windows=[(560, 320, 800, 500)])
+    assert hinted.found and hinted.stage == 'roi' and hinted.center == full.center
+
+    stats = matcher.stats()
+    assert stats['calls'] == 3 and stats['exhausted'] == 1
+    assert stats['wins']['multiscale'] == 1 and stats['wins']['roi'] == 1
+    assert matcher.estimate_ms('pyramid', 1280 * 720) > 0
+
+
+if __name__ == "__main__":
+    test_pyramid_matches_full_resolution()
+    test_pyramid_with_mask_and_threshold()
+    test_match_all_finds_every_instance()
+    test_parallel_engine_matches_serial()
+    test_roi_tracker_windows_expand_and_forget()
+    test_change_detector_reuses_result_until_screen_changes()
+    test_feature_matcher_caches_template_and_limits_region()
+    test_feature_matcher_full_screen_1080p()
+    test_verifier_scores_and_budget()
+    test_combined_score_boundary()
+    test_prefilter_keeps_results_and_prunes_area()
+    test_pixel_probes_share_one_bbox()
+    test_frame_bus_shares_frames_and_protects_borrowed_buffer()
+    test_screen_capturer_reuses_buffers()
+    test_overlay_coalesces_border_requests()
+    test_overlay_hands_own_root_over_to_app_root()
+    test_anytime_returns_best_so_far_within_budget()
+    print("✅ 全部通過")
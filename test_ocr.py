@@ -0,0 +1,346 @@
+"""
+測試 OCR 文字辨識（ocr_service.py、ocr_trigger.py、text_index.py、ocr_cache.py、ocr_tiling.py、ocr_preprocess.py）
+以假的 OCR 引擎驗證共用服務、工作執行緒與文字比對，不需要安裝 OCR 套件
+"""
+
+import os
+import sys
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# 加入專案路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'main'))
+
+from ocr_service import OCRService
+from ocr_cache import OCRResultCache, frame_hash
+from ocr_preprocess import get_pipeline
+from ocr_tiling import TiledOCR, tile_grid
+from ocr_trigger import OCRTrigger, text_matches
+from text_index import TextBox, TextIndex, boxes_from_tesseract
+
+
+class FakeTrigger:
+    """假的 OCRTrigger：依序回傳預先設定的辨識結果"""
+
+    created = 0
+
+    def __init__(self, engine, texts):
+        FakeTrigger.created += 1
+        self.engine = "fake" if engine == "auto" else engine
+        self.texts = texts
+        self.lock = threading.Lock()
+
+    def is_available(self):
+        return True
+
+    def get_engine_name(self):
+        return self.engine
+
+    def recognize_text(self, region=None, pipeline=None):
+        with self.lock:
+            return self.texts.pop(0) if len(self.texts) > 1 else self.texts[0]
+
+    def recognize_boxes(self, region=None, pipeline=None):
+        # 每個字一個方框，由左到右排列
+        text = self.recognize_text(region)
+        return TextIndex([TextBox(ch, 20 * i, 0, 20, 20, 0.9, 0) for i, ch in enumerate(text)], region)
+
+
+def test_text_matches_modes():
+    """文字比對：包含、完全相同、正則表達式與大小寫"""
+    assert text_matches("Press START to play", "start")
+    assert not text_matches("Press START to play", "start", case_sensitive=True)
+    assert text_matches("  OK ", "ok", match_mode="exact")
+    assert not text_matches("OK!", "ok", match_mode="exact")
+    assert text_matches("HP 120/300", r"HP \d+/\d+", match_mode="regex")
+
+
+def _tesseract_data(rows):
+    """產生 image_to_data 格式的資料：rows = [(文字, left, top, width, height, conf, line_num), ...]"""
+    data = {key: [] for key in ('text', 'left', 'top', 'width', 'height', 'conf', 'block_num', 'par_num', 'line_num')}
+    for text, left, top, width, height, conf, line in rows:
+        for key, value in zip(('text', 'left', 'top', 'width', 'height', 'conf', 'block_num', 'par_num', 'line_num'),
+                              (text, left, top, width, height, conf, 1, 1, line)):
+            data[key].append(value)
+    return data
+
+
+def test_text_index_answers_queries_with_boxes():
+    """文字索引：單字方框組成文字行，完全相同 / 包含 / 正則表達式查詢回傳螢幕座標"""
+    data = _tesseract_data([
+        ('', 0, 0, 500, 100, -1, 1),                  # 非單字項目
+        ('Start', 10, 10, 50, 20, 96, 1), ('Game', 70, 10, 50, 20, 91, 1),
+        ('請', 10, 50, 20, 20, 88, 2), ('按', 32, 50, 20, 20, 90, 2),
+        ('確', 54, 50, 20, 20, 93, 2), ('認', 76, 50, 20, 20, 95, 2),
+        ('HP', 200, 50, 30, 20, 80, 3), ('120/300', 235, 50, 70, 20, 85, 3),
+    ])
+    words = boxes_from_tesseract(data, offset=(100, 200))
+    index = TextIndex(words, region=(100, 200, 700, 400))
+    assert len(index) == 8
+    assert index.text.splitlines() == ['Start Game', '請按確認', 'HP 120/300']
+
+    # 跨多個單字的詞：方框為涵蓋的單字聯集
+    box = index.find_first('確認')
+    assert box.text == '確認' and box.box == (154, 250, 196, 270) and box.confidence == 0.93
+    assert index.find_first('start game').center == (165, 220)
+    assert index.find_first('start game', case_sensitive=True) is None
+
+    assert [b.text for b in index.find('Game', match_mode='exact')] == ['Game']
+    assert index.find('Gam', match_mode='exact') == []
+    hp = index.find_first(r'\d+/\d+', match_mode='regex')
+    assert hp.text == '120/300' and hp.x == 335
+
+    # 範圍查詢：只保留位於範圍內的單字
+    sub = index.within((100, 240, 250, 280))
+    assert sub.text == '請按確認' and index.covers((100, 240, 250, 280))
+
+
+def test_cache_skips_ocr_for_unchanged_region():
+    """OCR 結果快取：截圖內容相同時不重新辨識，內容改變、超過數量上限時重新辨識"""
+    pixels = np.zeros((40, 120, 3), dtype=np.uint8)
+    calls = []
+    trigger = OCRTrigger(ocr_engine="none", cache=OCRResultCache(max_entries=2))
+    trigger._ocr_available = True
+    trigger._ocr_function = lambda image: calls.append(image.size) or "確認"
+    trigger._boxes_function = lambda image, offset: calls.append(offset) or [TextBox("確認", offset[0], offset[1], 40, 20)]
+    trigger.capture_screen = lambda region: Image.fromarray(pixels)
+
+    assert trigger.recognize_text((0, 0, 120, 40)) == "確認"
+    assert trigger.recognize_text((0, 0, 120, 40)) == "確認"
+    assert len(calls) == 1
+
+    # 單字方框與純文字分開保存；命中時只更新截圖時間
+    first = trigger.recognize_boxes((10, 20, 130, 60))
+    again = trigger.recognize_boxes((10, 20, 130, 60))
+    assert len(calls) == 2 and again.words is first.words and again.captured_at >= first.captured_at
+    assert again.find_first("確認").box == (10, 20, 50, 40)
+
+    # 畫面改變一個像素：雜湊不同，重新辨識
+    pixels[5, 5] = 255
+    trigger.recognize_text((0, 0, 120, 40))
+    assert len(calls) == 3
+    assert frame_hash(pixels) != frame_hash(np.zeros_like(pixels))
+
+    stats = trigger.cache.stats()
+    assert stats['hits'] == 2 and stats['misses'] == 3
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert abs(stats['hit_ratio'] - 0.4) < 1e-9
+
+
+TILE_CALLS = []
+
+
+def _fake_tile_ocr(pixels, lang, tesseract_cmd):
+    """假的區塊辨識：每個白色方塊是一個單字，文字為方塊寬度"""
+    TILE_CALLS.append(pixels.shape)
+    gray = cv2.cvtColor(pixels, cv2.COLOR_RGB2GRAY)
+    contours, _ = cv2.findContours((gray > 128).astype(np.uint8), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    rows = [(str(w), x, y, w, h, 90, 1) for x, y, w, h in map(cv2.boundingRect, contours)]
+    return _tesseract_data(rows)
+
+
+def test_tiled_ocr_skips_blank_and_unchanged_tiles():
+    """分塊辨識：空白與未改變的區塊不辨識，接縫處的重複或被切斷的單字合併為一個"""
+    assert tile_grid(1000, 800, (400, 300), 60) == [
+        (x, y, x + 400, y + 300) for y in (0, 240, 480, 500) for x in (0, 340, 600)]
+
+    screen = np.zeros((800, 1000, 3), dtype=np.uint8)
+    for x, y, w in ((370, 100, 25), (420, 100, 26), (650, 100, 35),   # 同一列：前兩個同一行
+                    (390, 150, 30),                                     # 被 x=400 的接縫切斷
+                    (800, 700, 40)):                                    # 位於上下兩塊的重疊處
+        screen[y:y + 20, x:x + w] = 255
+
+    TILE_CALLS.clear()
+    tiler = TiledOCR(tile_size=(400, 300), overlap=60, max_workers=2, min_area=0,
+                     use_processes=False, tile_ocr=_fake_tile_ocr)
+    words = tiler.recognize(screen, offset=(100, 50))
+    assert TextIndex(words).text.splitlines() == ['25 26', '35', '30', '40']
+    assert TextIndex(words).find_first('30').box == (490, 200, 520, 220)
+    assert len(TILE_CALLS) == 5
+
+    # 畫面未改變：全部沿用；改變一個區塊：只重新辨識該區塊
+    assert [w.text for w in tiler.recognize(screen, offset=(100, 50))] == [w.text for w in words]
+    assert len(TILE_CALLS) == 5
+    screen[20:40, 20:60] = 255
+    assert '40' in [w.text for w in tiler.recognize(screen, offset=(100, 50))]
+    assert len(TILE_CALLS) == 6
+
+    stats = tiler.stats()
+    assert stats['calls'] == 3 and stats['tiles'] == 36
+    assert stats['recognized'] == 6 and stats['unchanged'] == 9 and stats['blank'] == 21
+
+    # OCRTrigger：Tesseract 的大範圍截圖交給分塊辨識
+    trigger = OCRTrigger(ocr_engine="none", tiler=tiler)
+    trigger.ocr_engine = "tesseract"
+    trigger._ocr_available = True
+    trigger.capture_screen = lambda region: Image.fromarray(screen)
+    assert trigger.recognize_text().splitlines()[0] == '40'
+    assert trigger.find_text_position('26') == (433, 110)
+    tiler.shutdown()
+
+
+def test_tiled_ocr_keeps_wide_seam_words_and_caches_per_region():
+    """分塊辨識：比重疊還寬的跨接縫單字保留較完整的片段；交替辨識不同範圍時各自沿用上次結果"""
+    auto = TiledOCR(tile_size=(400, 300))
+    assert auto.overlap == 75 and auto.overlap_for(2.0) == 150 and auto.overlap_for(4.0) == 150
+
+    screen = np.zeros((600, 740, 3), dtype=np.uint8)
+    screen[100:120, 330:480] = 255    # 寬 150，跨過 x=340~400 的重疊範圍，兩個區塊都只看到片段
+    screen[400:420, 100:140] = 255
+
+    TILE_CALLS.clear()
+    tiler = TiledOCR(tile_size=(400, 300), overlap=60, max_workers=2, min_area=0,
+                     use_processes=False, tile_ocr=_fake_tile_ocr)
+    words = tiler.recognize(screen, offset=(100, 50))
+    assert [(w.text, w.x) for w in words] == [('140', 440), ('40', 200)]
+    calls = len(TILE_CALLS)
+
+    # 兩個範圍交替辨識：互不清除對方的區塊記錄
+    tiler.recognize(screen, offset=(3000, 0))
+    assert len(TILE_CALLS) == 2 * calls
+    assert [w.text for w in tiler.recognize(screen, offset=(100, 50))] == ['140', '40']
+    assert [w.text for w in tiler.recognize(screen, offset=(3000, 0))] == ['140', '40']
+    assert len(TILE_CALLS) == 2 * calls
+
+    # 區塊記錄超過上限時淘汰最久未使用的區塊
+    small = TiledOCR(tile_size=(400, 300), overlap=60, max_workers=2, min_area=0, use_processes=False,
+                     tile_ocr=_fake_tile_ocr, max_cached_tiles=calls)
+    small.recognize(screen, offset=(0, 0))
+    small.recognize(screen, offset=(3000, 0))
+    small.recognize(screen, offset=(0, 0))
+    assert small.stats()['unchanged'] == 0
+    tiler.shutdown()
+    small.shutdown()
+
+def _crash_tile_ocr(pixels, lang, tesseract_cmd):
+    """模擬 Tesseract 子程序當掉"""
+    os._exit(1)
+
+
+def test_tiled_ocr_rebuilds_broken_pool_and_falls_back():
+    """分塊辨識：子程序當掉後下次呼叫重新建立程序池；觸發器改用整張辨識，不回傳空的索引"""
+    from concurrent.futures.process import BrokenProcessPool
+
+    screen = np.zeros((600, 800, 3), dtype=np.uint8)
+    screen[100:120, 100:140] = 255
+    tiler = TiledOCR(tile_size=(400, 300), overlap=60, max_workers=1, min_area=0,
+                     use_processes=True, tile_ocr=_crash_tile_ocr)
+    try:
+        tiler.recognize(screen)
+        assert False, "子程序當掉時應該丟出 BrokenProcessPool"
+    except BrokenProcessPool:
+        pass
+    assert tiler._executor is None
+
+    tiler.tile_ocr = _fake_tile_ocr
+    assert [w.text for w in tiler.recognize(screen)] == ['40']
+    tiler.shutdown()
+
+    # OCRTrigger：分塊辨識失敗時改用整張辨識
+    tiler = TiledOCR(tile_size=(400, 300), overlap=60, max_workers=1, min_area=0,
+                     use_processes=True, tile_ocr=_crash_tile_ocr)
+    trigger = OCRTrigger(ocr_engine="none", tiler=tiler)
+    trigger.ocr_engine = "tesseract"
+    trigger._ocr_available = True
+    trigger._boxes_function = lambda image, offset: [TextBox('整張', offset[0] + 5, offset[1] + 5, 40, 20, 0.9, 0)]
+    trigger.capture_screen = lambda region: Image.fromarray(screen)
+    assert trigger.find_text_position('整張') == (25, 15)
+    assert tiler._executor is None
+    tiler.shutdown()
+
+def test_preprocess_pipeline_binarizes_upscales_and_crops():
+    """前處理管線：深色背景反相為白底黑字、小範圍放大、裁切到文字，方框換算回螢幕座標並與結果一起快取"""
+    # 深色背景的淺色小字 + 一個雜點
+    pixels = np.full((60, 300, 3), 30, dtype=np.uint8)
+    cv2.putText(pixels, "HP 120", (100, 35), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (230, 230, 230), 1)
+    pixels[5, 5] = 230
+
+    pipeline = get_pipeline("text")
+    result = pipeline.run(pixels)
+    assert result.scale == 2.0 and not result.empty
+    assert result.image.ndim == 2 and set(np.unique(result.image)) <= {0, 255}
+    assert result.image.mean() > 128                  # 白底黑字
+    assert result.image.shape[1] < 300 and result.crop[0] > 150
+    assert get_pipeline("text").run(np.full((60, 300), 30, dtype=np.uint8)).empty
+    assert get_pipeline(None) is None and get_pipeline("none") is None
+
+    # OCRTrigger：引擎收到前處理後的影像，方框換算回螢幕座標
+    calls = []
+
+    def fake_boxes(image, offset):
+        calls.append(image.mode)
+        ink = np.asarray(image) < 128
+        ys, xs = np.nonzero(ink)
+        return [TextBox("HP120", xs.min() + offset[0], ys.min() + offset[1],
+                        xs.max() - xs.min() + 1, ys.max() - ys.min() + 1)]
+
+    trigger = OCRTrigger(ocr_engine="none")
+    trigger._ocr_available = True
+    trigger._boxes_function = fake_boxes
+    trigger._ocr_function = lambda image: calls.append(image.mode) or "HP120"
+    trigger.capture_screen = lambda region: Image.fromarray(pixels)
+
+    runs = pipeline.stats()['runs']
+    box = trigger.recognize_boxes((1000, 500, 1300, 560), pipeline="text").find_first("HP")
+    ys, xs = np.nonzero(pixels[:, :, 0] > 128)
+    assert calls == ['L']
+    assert abs(box.x - (1000 + xs[xs > 50].min())) <= 2 and abs(box.y - (500 + ys[ys > 10].min())) <= 2
+
+    # 純文字與單字方框共用同一次前處理；相同畫面再次辨識時不前處理也不辨識
+    assert trigger.recognize_text((1000, 500, 1300, 560), pipeline="text") == "HP120"
+    trigger.recognize_boxes((1000, 500, 1300, 560), pipeline="text")
+    assert pipeline.stats()['runs'] == runs + 1 and calls == ['L', 'L']
+
+    # 未指定管線時直接辨識原始截圖（結果分開快取）
+    trigger.recognize_text((1000, 500, 1300, 560))
+    assert calls == ['L', 'L', 'RGB']
+
+
+def test_service_reuses_warm_workers():
+    """共用服務：引擎只偵測一次，多次辨識重複使用工作執行緒的 OCRTrigger"""
+    FakeTrigger.created = 0
+    texts = ["載入中", "載入中", "請按確認"]
+    service = OCRService(max_workers=2, trigger_factory=lambda engine: FakeTrigger(engine, texts))
+    assert service.is_available() and service.get_engine_name() == "fake"
+
+    threads = [threading.Thread(target=service.recognize) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 偵測用 1 個 + 最多 max_workers 個常駐工作執行緒
+    assert FakeTrigger.created <= 1 + service.max_workers
+
+    texts[:] = ["載入中", "載入中", "請按確認"]
+    assert service.wait_for_text("確認", timeout=5, interval=0.01)
+    assert not service.wait_for_text("不存在", timeout=0.05, interval=0.01)
+    stopped = service.wait_for_text("不存在", timeout=5, interval=0.01, should_stop=lambda: True)
+    assert not stopped
+
+    # 索引沿用：時間內的多次查詢只辨識一次
+    texts[:] = ["開始 結束"]
+    service.recognize_boxes()
+    calls = service.stats()['calls']
+    assert service.find_text_position("開始", max_age=5) == (20, 10)
+    assert service.find_text_position("結束", max_age=5) == (80, 10)
+    assert service.stats()['calls'] == calls and service.stats()['index_hits'] == 2
+
+    stats = service.stats()
+    assert stats['errors'] == 0
+    assert stats['workers'] == FakeTrigger.created - 1
+    service.shutdown()
+
+
+if __name__ == "__main__":
+    test_text_matches_modes()
+    test_text_index_answers_queries_with_boxes()
+    test_cache_skips_ocr_for_unchanged_region()
+    test_tiled_ocr_skips_blank_and_unchanged_tiles()
+    test_tiled_ocr_keeps_wide_seam_words_and_caches_per_region()
+    test_tiled_ocr_rebuilds_broken_pool_and_falls_back()
+    test_preprocess_pipeline_binarizes_upscales_and_crops()
+    test_service_reuses_warm_workers()
+    print("✅ 全部通過")
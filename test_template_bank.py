@@ -0,0 +1,185 @@
+"""
+測試模板庫（template_bank.py、template_disk_cache.py）與圖片目錄索引（image_catalog.py）
+驗證載入時的前處理：灰階、遮罩有效性、各尺度版本，以及圖片名稱解析
+"""
+
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+# 加入專案路徑
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'main'))
+
+from image_matcher import DEFAULT_SCALES
+from image_catalog import ImageCatalog
+from scale_hints import ScaleHints
+from template_bank import CompiledTemplate, TemplateBank
+from template_disk_cache import TemplateDiskCache, cache_directory
+from feature_matcher import FeatureMatcher
+
+
+def _write_png(directory, name, image):
+    path = os.path.join(directory, name)
+    cv2.imwrite(path, image)
+    return path
+
+
+def test_compiled_template_precomputes_variants():
+    """載入時即完成灰階與所有尺度版本，取用時不再縮放"""
+    rng = np.random.default_rng(0)
+    bgr = rng.integers(0, 255, (40, 60, 3), dtype=np.uint8)
+    entry = CompiledTemplate("pic01", "pic01.png", bgr)
+
+    assert entry.gray.shape == (40, 60)
+    assert entry.mask is None
+    for scale in DEFAULT_SCALES:
+        gray, mask = entry.variant(scale)
+        assert gray.shape == (int(40 * scale), int(60 * scale))
+        assert mask is None
+        assert scale in entry.norms
+    # 同一尺度回傳同一份陣列（已快取）
+    assert entry.variant(1.1)[0] is entry.variant(1.1)[0]
+    assert entry.variant(1.0)[0] is entry.gray
+
+
+def test_bank_loads_alpha_mask():
+    """含透明區域的 PNG 保留遮罩，完全不透明的 PNG 視為無遮罩"""
+    with tempfile.TemporaryDirectory() as tmp:
+        bgra = np.full((32, 32, 4), 200, dtype=np.uint8)
+        bgra[:, :, 0] = 10  # B 通道
+        bgra[:8, :8, 3] = 0  # 左上角透明
+        masked_path = _write_png(tmp, "masked.png", bgra)
+
+        opaque = bgra.copy()
+        opaque[:, :, 3] = 255
+        opaque_path = _write_png(tmp, "opaque.png", opaque)
+
+        bank = TemplateBank()
+        masked = bank.load("masked", masked_path)
+        assert masked.has_mask
+        assert masked.bgr[0, 0, 0] == 10  # BGRA -> BGR 不可交換通道
+        assert masked.variant(1.2)[1] is not None
+
+        assert not bank.load("opaque", opaque_path).has_mask
+        assert "masked" in bank and len(bank) == 2
+        assert bank.load("missing", os.path.join(tmp, "none.png")) is None
+
+        bank.clear()
+        assert bank.get("masked") is None
+
+
+def test_disk_cache_restores_preprocessed_template():
+    """磁碟快取：第二次載入直接讀取快取，內容與重新前處理相同；圖片被覆寫後失效"""
+    # Windows 上 mmap 中的檔案無法刪除，清除暫存目錄失敗時忽略
+    with tempfile.TemporaryDirectory(ignore_cleanup_errors=True) as tmp:
+        rng = np.random.default_rng(4)
+        bgra = cv2.GaussianBlur(rng.integers(0, 255, (60, 80, 4), dtype=np.uint8), (5, 5), 0)
+        bgra[:, :, 3] = 255
+        bgra[:10, :10, 3] = 0
+        path = _write_png(tmp, "pic01.png", bgra)
+
+        first = TemplateBank(disk_cache=TemplateDiskCache(cache_directory(tmp)))
+        fresh = first.load("pic01", path)
+        FeatureMatcher().template_features(fresh)
+        assert first.flush_features() == 1
+
+        # 新的模板庫與快取物件（模擬重新啟動）
+        bank = TemplateBank(disk_cache=TemplateDiskCache(cache_directory(tmp)))
+        cached = bank.load("pic01", path)
+        assert bank.stats()['disk']['hits'] == 1
+        assert cached.name == "pic01" and cached.has_mask and cached.features_cached
+        for scale in DEFAULT_SCALES:
+            assert np.array_equal(cached.variant(scale)[0], fresh.variant(scale)[0])
+            assert np.array_equal(cached.variant(scale)[1], fresh.variant(scale)[1])
+        assert cached.norms == fresh.norms
+        assert np.array_equal(cached.features[1], fresh.features[1])
+        assert cached.downsampled(1.0, 4)[0].shape == (15, 20)
+
+        # 圖片內容改變：鍵不同，重新前處理
+        bgra[:, :, 0] = 255 - bgra[:, :, 0]
+        _write_png(tmp, "pic01.png", bgra)
+        assert TemplateDiskCache(cache_directory(tmp)).load("pic01", path) is None
+        del fresh, cached, first, bank
+
+
+def test_bank_evicts_lru_and_keeps_pinned():
+    """超過容量上限時淘汰最久未使用的模板，釘選的模板不淘汰"""
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = np.random.default_rng(1)
+        paths = {}
+        for name in ("a", "b", "c", "d"):
+            paths[name] = _write_png(tmp, f"{name}.png", rng.integers(0, 255, (40, 40, 3), dtype=np.uint8))
+
+        bank = TemplateBank()
+        size = bank.load("a", paths["a"]).nbytes
+        bank.clear()
+
+        bank.set_max_bytes(size * 2)
+        bank.pin(["a"])
+        bank.load("a", paths["a"])
+        bank.load("b", paths["b"])
+        bank.load("c", paths["c"])  # 超過上限：淘汰 b（a 已釘選）
+        assert "a" in bank and "b" not in bank and "c" in bank
+
+        assert bank.get("c") is not None
+        assert bank.get("b") is None
+        bank.unpin()
+        bank.load("d", paths["d"])  # a 最久未使用，取消釘選後被淘汰
+        assert "a" not in bank and "c" in bank and "d" in bank
+
+        stats = bank.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1
+        assert stats['evictions'] == 2
+        assert stats['bytes'] <= size * 2
+
+
+def test_catalog_resolves_names_deterministically():
+    """名稱解析固定：完全相同優先，前綴必須接分隔符號（pic1 不可誤配 pic10）"""
+    with tempfile.TemporaryDirectory() as tmp:
+        image = np.zeros((4, 4, 3), dtype=np.uint8)
+        for name in ("pic10.png", "pic1_確定.png", "pic王01.png", "pic02.png", "pic02.jpg"):
+            _write_png(tmp, name, image)
+        open(os.path.join(tmp, "notes.txt"), "w").close()
+
+        catalog = ImageCatalog(tmp)
+        assert catalog.resolve("pic10") == os.path.join(tmp, "pic10.png")
+        assert catalog.resolve("pic1") == os.path.join(tmp, "pic1_確定.png")
+        assert catalog.resolve("pic王01") == os.path.join(tmp, "pic王01.png")
+        assert catalog.resolve("pic02") == os.path.join(tmp, "pic02.png")
+        assert catalog.resolve("pic02.jpg") == os.path.join(tmp, "pic02.jpg")
+        assert catalog.resolve("pic王") is None
+        assert catalog.resolve("notes") is None
+
+        # 新增檔案後目錄 mtime 改變，索引自動更新
+        _write_png(tmp, "pic03.png", image)
+        os.utime(tmp, ns=(0, 0))
+        assert catalog.resolve("pic03") == os.path.join(tmp, "pic03.png")
+
+
+def test_scale_hints_order_and_persist():
+    """最佳尺度由近到遠排序，並保存在圖片目錄中供下次啟動使用"""
+    with tempfile.TemporaryDirectory() as tmp:
+        hints = ScaleHints(tmp)
+        assert hints.order("pic01", DEFAULT_SCALES)[:3] == [1.0, 0.95, 1.05]
+
+        hints.update("pic01", 1.1)
+        assert hints.order("pic01", DEFAULT_SCALES)[:3] == [1.1, 1.05, 1.15]
+
+        reloaded = ScaleHints(tmp)
+        assert reloaded.get("pic01") == 1.1
+        assert reloaded.get("pic02") == 1.0
+        # 索引只收錄圖片，記錄檔不會被當成圖片
+        assert ImageCatalog(tmp).names() == []
+
+
+if __name__ == "__main__":
+    test_compiled_template_precomputes_variants()
+    test_bank_loads_alpha_mask()
+    test_disk_cache_restores_preprocessed_template()
+    test_bank_evicts_lru_and_keeps_pinned()
+    test_catalog_resolves_names_deterministically()
+    test_scale_hints_order_and_persist()
+    print("✅ 全部通過")